@@ -105,7 +105,7 @@ class TeacherPaymentAdmin(admin.ModelAdmin):
 
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
-    list_display = ("student", "course", "amount", "discount", "due_date", "status")
+    list_display = ("student", "course", "amount", "discount", "paid_total", "due_date", "status")
     list_filter = ("status", "due_date")
     search_fields = ("student__first_name", "student__last_name", "course__group__group_name")
     autocomplete_fields = ("student", "course")
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AdministrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.administration'
+
+    def ready(self):
+        import app.administration.signals  # noqa: F401
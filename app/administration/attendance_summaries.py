@@ -0,0 +1,108 @@
+import datetime
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from app.administration.models import Attendance, AttendanceSummary, Lesson
+
+
+RECENT_DAYS = 30
+ATTENDED_STATUSES = ('1', 'online')
+ABSENT_STATUS = '0'
+
+SUMMARY_FIELDS = [
+    'total_lessons', 'attended_lessons', 'recent_lessons', 'recent_attended',
+    'absence_streak', 'last_lesson_date', 'updated_at',
+]
+
+
+def _attendance_rows(queryset):
+    """(student_id, group_id, дата урока, статус), упорядочено для groupby по паре"""
+    return queryset.values_list(
+        'student_id', 'lesson__month__course__group_id', 'lesson__date', 'status'
+    ).order_by(
+        'student_id', 'lesson__month__course__group_id',
+        F('lesson__date').asc(nulls_first=True), 'lesson_id'
+    )
+
+
+def summarize(student_id, group_id, rows, since, now):
+    """Сводка по отметкам одной пары (студент, группа) в порядке дат уроков"""
+    summary = AttendanceSummary(student_id=student_id, group_id=group_id, updated_at=now)
+    for _, _, date, status in rows:
+        attended = status in ATTENDED_STATUSES
+        summary.total_lessons += 1
+        summary.attended_lessons += attended
+        if date and date >= since:
+            summary.recent_lessons += 1
+            summary.recent_attended += attended
+        # Серия пропусков считается от последнего урока назад
+        summary.absence_streak = summary.absence_streak + 1 if status == ABSENT_STATUS else 0
+        summary.last_lesson_date = date or summary.last_lesson_date
+    return summary
+
+
+def iter_summaries(queryset):
+    now = timezone.now()
+    since = now - datetime.timedelta(days=RECENT_DAYS)
+    for (student_id, group_id), rows in groupby(_attendance_rows(queryset).iterator(), key=lambda row: row[:2]):
+        if group_id is not None:
+            yield summarize(student_id, group_id, rows, since, now)
+
+
+def refresh_summaries(pairs):
+    """Пересчитывает сводки для пар (student_id, group_id) после изменения отметок"""
+    pairs = {(student_id, group_id) for student_id, group_id in pairs if student_id and group_id}
+    if not pairs:
+        return
+
+    queryset = Attendance.objects.filter(
+        student_id__in={student_id for student_id, _ in pairs},
+        lesson__month__course__group_id__in={group_id for _, group_id in pairs},
+    )
+    summaries = [
+        summary for summary in iter_summaries(queryset)
+        if (summary.student_id, summary.group_id) in pairs
+    ]
+
+    # Без savepoint: внутри bulk-отметки посещаемости это часть её транзакции
+    with transaction.atomic(savepoint=False):
+        AttendanceSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['student', 'group'],
+            update_fields=SUMMARY_FIELDS,
+        )
+        # Пары, у которых не осталось отметок
+        emptied = pairs - {(summary.student_id, summary.group_id) for summary in summaries}
+        if emptied:
+            condition = Q()
+            for student_id, group_id in emptied:
+                condition |= Q(student_id=student_id, group_id=group_id)
+            AttendanceSummary.objects.filter(condition).delete()
+
+
+def refresh_for_lessons(student_lessons):
+    """То же по парам (student_id, lesson_id): группа урока берётся одним запросом"""
+    student_lessons = {(student_id, lesson_id) for student_id, lesson_id in student_lessons if lesson_id}
+    groups = dict(Lesson.objects.filter(
+        id__in={lesson_id for _, lesson_id in student_lessons}
+    ).values_list('id', 'month__course__group_id'))
+    refresh_summaries((student_id, groups.get(lesson_id)) for student_id, lesson_id in student_lessons)
+
+
+def rebuild_summaries(batch_size=1000):
+    """Полная перестройка сводок; возвращает число записей"""
+    count, batch = 0, []
+    with transaction.atomic():
+        AttendanceSummary.objects.all().delete()
+        for summary in iter_summaries(Attendance.objects.all()):
+            batch.append(summary)
+            if len(batch) >= batch_size:
+                AttendanceSummary.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        AttendanceSummary.objects.bulk_create(batch)
+    return count + len(batch)
@@ -0,0 +1,67 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+# Дашборд содержит окна "за 24 часа" и "ближайшие занятия", поэтому TTL короткий
+DASHBOARD_CACHE_TIMEOUT = 60
+
+
+def dashboard_cache_key(day=None):
+    """Ключ кэша дашборда администратора на день"""
+    day = day or timezone.localdate()
+    return f'administration:admin-dashboard:{day.isoformat()}'
+
+
+def invalidate_dashboard():
+    cache.delete(dashboard_cache_key())
+
+
+# Фильтры таблиц (направления, группы, преподаватели). Ключ содержит версию,
+# которую сигналы увеличивают при изменении Direction, Group и CustomUser.
+FACETS_VERSION_KEY = 'administration:facets:version'
+FACETS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _version(key):
+    # Стартовая версия от времени, чтобы после перезапуска не совпасть со старым ETag
+    cache.add(key, int(time.time() * 1000), None)
+    return cache.get(key)
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        _version(key)
+
+
+def facets_version():
+    return _version(FACETS_VERSION_KEY)
+
+
+def bump_facets_version():
+    _bump_version(FACETS_VERSION_KEY)
+
+
+def facets_cache_key(version):
+    return f'administration:facets:{version}'
+
+
+# Аналитика популярных направлений: версия растёт при записи платежей
+# и изменении состава групп, TTL страхует от пропущенных сигналов
+ANALYTICS_VERSION_KEY = 'administration:analytics:version'
+ANALYTICS_CACHE_TIMEOUT = 60 * 60
+
+
+def analytics_version():
+    return _version(ANALYTICS_VERSION_KEY)
+
+
+def bump_analytics_version():
+    _bump_version(ANALYTICS_VERSION_KEY)
+
+
+def popular_courses_cache_key(version, start_date, end_date, top):
+    return f'administration:popular-courses:{version}:{start_date}:{end_date}:{top}'
@@ -0,0 +1,178 @@
+import csv
+import datetime
+import io
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import action
+
+from app.administration.models import Expense, Income, Invoice, Payment
+
+
+EXPORT_CHUNK_SIZE = 2000
+# Сколько строк CSV собирается в один кусок ответа
+ROWS_PER_WRITE = 500
+# Excel/LibreOffice считают такие ячейки формулами
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _full_name(prefix):
+    def full_name(row):
+        return f"{row[prefix + '__last_name'] or ''} {row[prefix + '__first_name'] or ''}".strip()
+    return full_name
+
+
+def _display(field, choices):
+    choices = dict(choices)
+    return lambda row: choices.get(row[field], row[field])
+
+
+# Колонки выгрузки: (заголовок, ключ из values() или функция от строки).
+# Каждая выгрузка читает только перечисленные поля, без экземпляров моделей.
+EXPORTS = {
+    'payments': {
+        'filename': 'payments',
+        'fields': ['id', 'date', 'amount', 'payment_type', 'invoice_id', 'comment',
+                   'invoice__student__last_name', 'invoice__student__first_name'],
+        'columns': [
+            ('ID', 'id'),
+            ('Дата', 'date'),
+            ('Студент', _full_name('invoice__student')),
+            ('Счёт', 'invoice_id'),
+            ('Сумма', 'amount'),
+            ('Тип оплаты', _display('payment_type', Payment.PAYMENT_TYPES)),
+            ('Комментарий', 'comment'),
+        ],
+    },
+    'invoices': {
+        'filename': 'invoices',
+        # Оплачено — поддерживаемый Payment.save/delete paid_total, без агрегатов по строкам
+        'fields': ['id', 'date_created', 'due_date', 'amount', 'discount', 'paid_total', 'status',
+                   'course__course_number', 'course__group__group_name',
+                   'student__last_name', 'student__first_name', 'comment'],
+        'columns': [
+            ('ID', 'id'),
+            ('Дата создания', 'date_created'),
+            ('Срок оплаты', 'due_date'),
+            ('Студент', _full_name('student')),
+            ('Группа', 'course__group__group_name'),
+            ('Курс', 'course__course_number'),
+            ('Сумма', 'amount'),
+            ('Скидка', 'discount'),
+            ('Оплачено', 'paid_total'),
+            ('Остаток', lambda row: row['amount'] - row['discount'] - row['paid_total']),
+            ('Статус', _display('status', Invoice.STATUS_CHOICES)),
+            ('Комментарий', 'comment'),
+        ],
+    },
+    'incomes': {
+        'filename': 'incomes',
+        'fields': ['id', 'date', 'amount', 'discount', 'payment_method', 'is_full_payment', 'comment',
+                   'direction__name', 'group__group_name', 'student__last_name', 'student__first_name'],
+        'columns': [
+            ('ID', 'id'),
+            ('Дата', 'date'),
+            ('Направление', 'direction__name'),
+            ('Группа', 'group__group_name'),
+            ('Студент', _full_name('student')),
+            ('Сумма', 'amount'),
+            ('Скидка', 'discount'),
+            ('Способ оплаты', _display('payment_method', Income.PAYMENT_METHODS)),
+            ('Полная оплата', lambda row: 'да' if row['is_full_payment'] else 'нет'),
+            ('Комментарий', 'comment'),
+        ],
+    },
+    'expenses': {
+        'filename': 'expenses',
+        'fields': ['id', 'date', 'category', 'description', 'amount', 'comment',
+                   'teacher__last_name', 'teacher__first_name'],
+        'columns': [
+            ('ID', 'id'),
+            ('Дата', 'date'),
+            ('Категория', _display('category', Expense.CATEGORIES)),
+            ('Статья расхода', 'description'),
+            ('Преподаватель', _full_name('teacher')),
+            ('Сумма', 'amount'),
+            ('Комментарий', 'comment'),
+        ],
+    },
+    'teacher-payments': {
+        'filename': 'teacher_payments',
+        'fields': ['id', 'date', 'lessons_count', 'rate', 'payment', 'bonus', 'paid_amount', 'is_paid',
+                   'teacher__last_name', 'teacher__first_name'],
+        'columns': [
+            ('ID', 'id'),
+            ('Дата расчета', 'date'),
+            ('Преподаватель', _full_name('teacher')),
+            ('Занятий', 'lessons_count'),
+            ('Ставка', 'rate'),
+            ('Выплата', 'payment'),
+            ('Бонус', 'bonus'),
+            ('Выплачено', 'paid_amount'),
+            ('Остаток', lambda row: row['payment'] + row['bonus'] - row['paid_amount']),
+            ('Оплачено', lambda row: 'да' if row['is_paid'] else 'нет'),
+        ],
+    },
+}
+
+
+def _format(value):
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+        return value.strftime('%Y-%m-%d %H:%M')
+    if value is None:
+        return ''
+    # Свободный текст (комментарии, имена) экранируется апострофом; числа не трогаем
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(queryset, spec):
+    """
+    Строки CSV кусками по ROWS_PER_WRITE.
+
+    queryset читается через iterator(), поэтому в памяти одновременно только
+    один кусок результата базы и один кусок CSV, независимо от периода выгрузки.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл UTF-8 с кириллицей
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _ in spec['columns']])
+
+    rows = queryset.values(*spec['fields']).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([
+            _format(column(row) if callable(column) else row[column])
+            for _, column in spec['columns']
+        ])
+        if count % ROWS_PER_WRITE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_response(queryset, name):
+    spec = EXPORTS[name]
+    response = StreamingHttpResponse(iter_csv(queryset, spec), content_type='text/csv; charset=utf-8')
+    filename = f"{spec['filename']}_{timezone.localdate():%Y-%m-%d}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class CsvExportMixin:
+    """
+    Добавляет viewset'у export/: CSV с теми же фильтрами, что и список.
+    export_name — ключ EXPORTS; порядок строк тот же, что у курсорной пагинации.
+    """
+    export_name = None
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self, 'cursor_ordering', None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return csv_response(queryset, self.export_name)
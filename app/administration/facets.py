@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.db.models import Q
+
+from app.administration.caching import FACETS_CACHE_TIMEOUT, facets_cache_key, facets_version
+from app.administration.models import Direction, Group
+from app.users.models import CustomUser
+
+
+def build_facets():
+    """Списки значений для фильтров таблиц учеников, преподавателей и групп"""
+    teachers = CustomUser.objects.filter(
+        role='Teacher'
+    ).exclude(
+        Q(last_name__isnull=True) | Q(last_name='') |
+        Q(first_name__isnull=True) | Q(first_name='')
+    ).values_list('last_name', 'first_name').distinct()
+
+    return {
+        'directions': list(Direction.objects.values_list('name', flat=True).distinct()),
+        'groups': list(Group.objects.values_list('group_name', flat=True).distinct()),
+        'teachers': [f"{last} {first}" for last, first in teachers],
+    }
+
+
+def get_facets():
+    """Фильтры из кэша текущей версии; возвращает (facets, version)"""
+    version = facets_version()
+    key = facets_cache_key(version)
+    facets = cache.get(key)
+    if facets is None:
+        facets = build_facets()
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets, version
+
+
+def facets_requested(request):
+    """Таблицы отдают фильтры, пока клиент не попросит ?facets=0"""
+    return request.query_params.get('facets', '1').lower() not in ('0', 'false', 'no')
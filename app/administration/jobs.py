@@ -0,0 +1,242 @@
+"""
+Фоновые задачи: очередь в таблице BackgroundJob.
+
+Тяжёлые операции (расчёт выплат, генерация отчётов, пакетный PDF) ставятся
+в очередь через enqueue() и выполняются командой run_jobs. Задача
+захватывается воркером условным UPDATE по статусу, поэтому несколько
+воркеров не берут одну и ту же задачу — это работает и в SQLite, и в PostgreSQL.
+"""
+import datetime
+import json
+import os
+import socket
+import threading
+import traceback
+
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from app.administration.models import BackgroundJob
+
+
+# Пауза перед повтором: RETRY_DELAY * 2 ** (попытка - 1)
+RETRY_DELAY = datetime.timedelta(seconds=30)
+# Пока обработчик работает, воркер раз в HEARTBEAT_INTERVAL продлевает locked_at.
+# Задача без продления дольше STALE_AFTER считается брошенной (воркер упал)
+HEARTBEAT_INTERVAL = datetime.timedelta(minutes=1)
+STALE_AFTER = datetime.timedelta(minutes=10)
+
+HANDLERS = {}
+
+
+def register(kind):
+    """Регистрирует обработчик задачи: handler(job, payload) -> результат (JSON)"""
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+class IdempotencyConflict(Exception):
+    """Ключ идемпотентности уже использован для задачи с другими параметрами"""
+
+
+def _existing(kind, user, idempotency_key, payload):
+    job = BackgroundJob.objects.filter(
+        kind=kind, created_by=user, idempotency_key=idempotency_key
+    ).first()
+    if job is not None and job.payload != payload:
+        raise IdempotencyConflict(
+            f'Ключ {idempotency_key} уже использован для задачи #{job.id} с другими параметрами'
+        )
+    return job
+
+
+def enqueue(kind, payload=None, user=None, idempotency_key=None, max_attempts=3):
+    """
+    Ставит задачу в очередь. Повторный вызов того же пользователя с тем же
+    типом и idempotency_key возвращает уже созданную задачу, если параметры
+    совпадают, иначе — IdempotencyConflict. Возвращает (job, created).
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f'Неизвестный тип задачи: {kind}')
+    # Параметры в том виде, в каком они лягут в JSONField, — для сравнения с сохранёнными
+    payload = json.loads(json.dumps(payload or {}, cls=DjangoJSONEncoder))
+    user = user if user is not None and user.is_authenticated else None
+
+    if idempotency_key:
+        existing = _existing(kind, user, idempotency_key, payload)
+        if existing:
+            return existing, False
+    try:
+        with transaction.atomic():
+            job = BackgroundJob.objects.create(
+                kind=kind, payload=payload, created_by=user,
+                idempotency_key=idempotency_key or None, max_attempts=max_attempts
+            )
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел раньше
+        return _existing(kind, user, idempotency_key, payload), False
+    return job, True
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale():
+    """
+    Возвращает в очередь задачи упавших воркеров. Упавший запуск считается
+    попыткой: задача, которая раз за разом роняет воркер, завершается с ошибкой.
+    """
+    now = timezone.now()
+    stale = BackgroundJob.objects.filter(status='running', locked_at__lt=now - STALE_AFTER)
+    failed = stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status='failed', attempts=F('attempts') + 1, locked_by='', locked_at=None,
+        finished_at=now, error='Воркер перестал отвечать во время выполнения'
+    )
+    requeued = stale.update(
+        status='queued', attempts=F('attempts') + 1, locked_by='', locked_at=None, run_after=now
+    )
+    return failed + requeued
+
+
+class Heartbeat:
+    """Фоновый поток, продлевающий захват задачи, пока работает обработчик"""
+
+    def __init__(self, job, interval=HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval.total_seconds()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                if not self.job.heartbeat():
+                    return
+        finally:
+            # У потока своё соединение с базой
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def claim_next(worker, kinds=None):
+    """Захватывает старейшую готовую задачу; None, если очередь пуста"""
+    while True:
+        now = timezone.now()
+        queued = BackgroundJob.objects.filter(status='queued', run_after__lte=now)
+        if kinds:
+            queued = queued.filter(kind__in=kinds)
+        job_id = queued.order_by('run_after', 'id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+
+        # Условный UPDATE: если другой воркер успел первым, пробуем следующую
+        claimed = BackgroundJob.objects.filter(id=job_id, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, started_at=now
+        )
+        if claimed:
+            return job_id
+
+
+def run_job(job_id):
+    """
+    Выполняет захваченную задачу; при ошибке планирует повтор или помечает failed.
+    Итог записывается, только если задача всё ещё за этим воркером.
+    """
+    job = BackgroundJob.objects.get(id=job_id)
+    owner = job.locked_by
+    job.attempts += 1
+    try:
+        with Heartbeat(job):
+            result = HANDLERS[job.kind](job, job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+    else:
+        job.status = 'succeeded'
+        job.result = result
+        job.error = ''
+        job.progress = 100
+        job.finished_at = timezone.now()
+
+    fields = [
+        'attempts', 'status', 'result', 'error', 'progress', 'run_after',
+        'finished_at', 'locked_by', 'locked_at'
+    ]
+    job.locked_by = ''
+    job.locked_at = None
+    # Условный UPDATE: задачу, перехваченную после потери захвата, не перезаписываем
+    saved = BackgroundJob.objects.filter(id=job.id, status='running', locked_by=owner).update(
+        **{field: getattr(job, field) for field in fields}
+    )
+    if not saved:
+        job.refresh_from_db()
+    return job
+
+
+# ----------------------------------------------------------------- обработчики
+
+@register('teacher_payments')
+def teacher_payments_job(job, payload):
+    from app.administration.payroll import calculate_teacher_payments
+
+    job.set_progress(10, 'Расчёт выплат')
+    reports = calculate_teacher_payments(
+        payload['year'], payload['month'],
+        end_year=payload.get('end_year'), end_month=payload.get('end_month'),
+        dry_run=payload.get('dry_run', False)
+    )
+    if len(reports) == 1:
+        return {'status': 'success', 'dry_run': payload.get('dry_run', False), **reports[0]}
+    return {'status': 'success', 'dry_run': payload.get('dry_run', False), 'periods': reports}
+
+
+@register('financial_report')
+def financial_report_job(job, payload):
+    from app.administration.rollups import create_report
+    from app.administration.serializers import FinancialReportSerializer
+
+    job.set_progress(10, 'Формирование отчёта')
+    report = create_report(
+        payload.get('report_type', 'monthly'), payload.get('start_date'), payload.get('end_date'),
+        freeze=payload.get('freeze', False)
+    )
+    return FinancialReportSerializer(report).data
+
+
+@register('pdf_batch')
+def pdf_batch_job(job, payload):
+    """
+    payload: {"documents": [[имя файла, шаблон, контекст], ...], "combine": false}.
+    Готовый ZIP или PDF сохраняется в default_storage, в результате — путь и URL.
+    """
+    from app.pdf import render_many
+
+    job.set_progress(5, f"Рендеринг {len(payload['documents'])} документов")
+    combine = payload.get('combine', False)
+    content = render_many(
+        [tuple(document) for document in payload['documents']],
+        combine=combine, workers=payload.get('workers')
+    )
+    name = default_storage.save(
+        f"jobs/{job.id}.{'pdf' if combine else 'zip'}", ContentFile(content)
+    )
+    return {'file': name, 'url': default_storage.url(name), 'size': len(content)}
@@ -0,0 +1,138 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from app.users.models import CustomUser
+
+
+PREFIX = '/api/v1/administration/'
+
+# Горячие эндпоинты: название -> путь относительно PREFIX
+ENDPOINTS = {
+    'AdminDashboardView': 'admin-dashboard/',
+    'StudentTableViewSet.list': 'student-table/',
+    'GroupTableViewSet.list': 'group-table/',
+    'TeacherWorkloadAnalytics': 'teacher-workload/',
+    'PopularCoursesAnalytics': 'popular-courses/',
+    'FinancialReportSerializer': 'financial-reports/',
+}
+
+
+def percentile(values, pct):
+    """Перцентиль с линейной интерполяцией по отсортированной выборке"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет p50/p95/p99 времени ответа и количество SQL-запросов горячих эндпоинтов "
+        "и сохраняет результат в JSON для сравнения между коммитами"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS),
+                            help="Замерить только указанные эндпоинты (можно повторять)")
+        parser.add_argument('--output', default='benchmark.json', help="Куда записать результат")
+        parser.add_argument('--compare', help="JSON предыдущего запуска для сравнения")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations должно быть больше нуля")
+
+        admin = CustomUser.objects.filter(role='Administrator', is_active=True).first()
+        if admin is None:
+            raise CommandError("Нет активного пользователя с ролью Administrator")
+
+        client = APIClient()
+        client.force_authenticate(user=admin)
+
+        results = {}
+        for name in options['endpoint'] or ENDPOINTS:
+            results[name] = self.measure(client, PREFIX + ENDPOINTS[name], options['iterations'], options['warmup'])
+            self.stdout.write(
+                f"{name}: p50 {results[name]['p50_ms']} мс, p95 {results[name]['p95_ms']} мс, "
+                f"p99 {results[name]['p99_ms']} мс, запросов {results[name]['queries']}"
+            )
+
+        report = {
+            'revision': git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'endpoints': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Результат сохранён в {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def measure(self, client, url, iterations, warmup):
+        for _ in range(warmup):
+            self.request(client, url)
+
+        timings, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                self.request(client, url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(ctx.captured_queries))
+
+        return {
+            'url': url,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries': max(queries),
+        }
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.status_code >= 400:
+            raise CommandError(f"{url} вернул {response.status_code}")
+        return response
+
+    def compare(self, path, results):
+        try:
+            with open(path, encoding='utf-8') as f:
+                previous = json.load(f)['endpoints']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Не удалось прочитать {path}: {e}")
+
+        self.stdout.write(f"Сравнение с {path}:")
+        for name, current in results.items():
+            before = previous.get(name)
+            if not before:
+                continue
+            delta = current['p95_ms'] - before['p95_ms']
+            self.stdout.write(
+                f"  {name}: p95 {before['p95_ms']} -> {current['p95_ms']} мс ({delta:+.2f}), "
+                f"запросов {before['queries']} -> {current['queries']}"
+            )
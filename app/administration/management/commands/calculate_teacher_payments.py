@@ -0,0 +1,50 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.administration.payroll import calculate_teacher_payments
+
+
+def parse_month(value):
+    try:
+        parsed = datetime.datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        raise CommandError(f"Неверный формат месяца: {value}. Используйте YYYY-MM")
+    return parsed.year, parsed.month
+
+
+class Command(BaseCommand):
+    help = "Рассчитывает выплаты преподавателям за месяц или диапазон месяцев"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Начальный месяц в формате YYYY-MM (по умолчанию текущий)")
+        parser.add_argument('--to', dest='end', help="Конечный месяц в формате YYYY-MM")
+        parser.add_argument('--dry-run', action='store_true', help="Только рассчитать, без записи в базу")
+
+    def handle(self, *args, **options):
+        if options['month']:
+            year, month = parse_month(options['month'])
+        else:
+            today = timezone.localdate()
+            year, month = today.year, today.month
+
+        end_year = end_month = None
+        if options['end']:
+            end_year, end_month = parse_month(options['end'])
+
+        try:
+            reports = calculate_teacher_payments(
+                year, month, end_year=end_year, end_month=end_month, dry_run=options['dry_run']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for report in reports:
+            total = sum(r['payment'] for r in report['results'] if 'payment' in r)
+            self.stdout.write(
+                f"{report['period']}: преподавателей {report['teachers_processed']}, сумма {total}"
+            )
+
+        suffix = " (dry run)" if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"Рассчитано периодов: {len(reports)}{suffix}"))
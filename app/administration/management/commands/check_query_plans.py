@@ -0,0 +1,144 @@
+import datetime
+import re
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from app.administration.models import Group
+from app.users.models import CustomUser
+
+
+PREFIX = '/api/v1/administration/'
+
+# Горячие эндпоинты с типичными фильтрами; {student}/{group} подставляются из базы
+ENDPOINTS = [
+    'admin-dashboard/',
+    'student-table/',
+    'group-table/',
+    'teacher-table/',
+    'groups/{group}/dashboard/',
+    'students/{student}/attendance/',
+    'students/{student}/payments/',
+    'daily-schedule/',
+    'daily-schedule/?start_date={week_ago}&end_date={today}',
+    'teacher-workload/?period=month',
+    'active-students/',
+    'popular-courses/',
+    'monthly-income/',
+    'payments/',
+    'payments/?payment_type=cash',
+    'invoices/',
+    'invoices/?status=pending',
+    'leads/',
+    'leads/?status=new',
+    'leads/?date_from={week_ago}&date_to={today}',
+    'leads/stats/',
+    'search/?q=ivan',
+]
+
+# Справочники, которые эндпоинты читают целиком (фильтры, сетка кабинетов, таблица групп):
+# полный скан здесь и есть план, при любом числе строк
+FULLY_READ_TABLES = {'administration_direction', 'administration_group', 'administration_classroom'}
+
+# Алиасы подзапросов Django: "administration_payment" U0
+ALIAS_RE = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)"?')
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет горячие эндпоинты, прогоняет их SQL через EXPLAIN QUERY PLAN (EXPLAIN в PostgreSQL) "
+        "и завершается с ошибкой, если какой-то запрос полностью сканирует большую таблицу"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help="Таблица считается большой начиная с этого числа строк")
+        parser.add_argument('--verbose-plans', action='store_true', help="Печатать планы всех запросов")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"План запросов для {connection.vendor} не поддерживается")
+
+        admin = CustomUser.objects.filter(role='Administrator', is_active=True).first()
+        student = CustomUser.objects.filter(role='Student', attendances__isnull=False).first()
+        group = Group.objects.first()
+        if admin is None or student is None or group is None:
+            raise CommandError("Нужны администратор, студент с посещаемостью и группа: запустите generate_school")
+
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        today = timezone.localdate()
+        params = {
+            'student': student.id, 'group': group.id,
+            'today': today.isoformat(), 'week_ago': (today - datetime.timedelta(days=7)).isoformat(),
+        }
+
+        self.row_counts = {}
+        # Производные таблицы (подзапросы во FROM) в отчёт не попадают
+        self.tables = set(connection.introspection.table_names())
+        problems = []
+        for endpoint in ENDPOINTS:
+            url = PREFIX + endpoint.format(**params)
+            queries = self.capture(client, url)
+            for sql, sql_params in queries:
+                plan = self.explain(sql, sql_params)
+                if options['verbose_plans']:
+                    self.stdout.write(f"{url}\n  {sql}\n  " + '\n  '.join(plan))
+                for table in self.full_scans(sql, plan):
+                    if table not in self.tables or table in FULLY_READ_TABLES:
+                        continue
+                    rows = self.rows(table)
+                    if rows >= options['min_rows']:
+                        problems.append((url, table, rows, sql, plan))
+            self.stdout.write(f"{url}: запросов {len(queries)}")
+
+        if problems:
+            for url, table, rows, sql, plan in problems:
+                self.stderr.write(f"\n{url}: полный скан {table} ({rows} строк)\n  {sql}\n  " + '\n  '.join(plan))
+            raise CommandError(f"Полных сканов больших таблиц: {len(problems)}")
+        self.stdout.write(self.style.SUCCESS("Полных сканов больших таблиц нет"))
+
+    def capture(self, client, url):
+        """SELECT-запросы эндпоинта вместе с параметрами"""
+        queries = []
+
+        def collect(execute, sql, sql_params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(collect):
+            response = client.get(url)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        if response.status_code >= 400:
+            raise CommandError(f"{url} вернул {response.status_code}")
+        return queries
+
+    def explain(self, sql, sql_params):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, sql_params)
+            # SQLite: (id, parent, notused, detail); PostgreSQL: одна колонка с текстом
+            return [row[-1] for row in cursor.fetchall()]
+
+    def full_scans(self, sql, plan):
+        aliases = defaultdict(lambda: None, {alias: table for table, alias in ALIAS_RE.findall(sql)})
+        for line in plan:
+            if connection.vendor == 'sqlite':
+                # "SCAN t" без индекса; "SCAN t USING [COVERING] INDEX" — обход индекса, не таблицы
+                match = re.search(r'\bSCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$', line.strip())
+            else:
+                match = re.search(r'Seq Scan on "?(\w+)"?', line)
+            if match:
+                yield aliases[match.group(1)] or match.group(1)
+
+    def rows(self, table):
+        if table not in self.row_counts:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                self.row_counts[table] = cursor.fetchone()[0]
+        return self.row_counts[table]
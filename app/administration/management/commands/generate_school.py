@@ -0,0 +1,322 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from app.administration.attendance_summaries import rebuild_summaries
+from app.administration.models import (
+    Attendance, Classroom, Course, Direction, Expense, FinancialReport, Group, Invoice, Lead, Lesson,
+    Months, Payment, Schedule, Student, Teacher
+)
+from app.administration.payroll import month_end, next_month
+from app.administration.rollups import ledger_bounds, rebuild_all
+from app.administration.search import rebuild_index
+from app.users.models import CustomUser
+
+
+# Часы начала занятий: группы занимаются в одни и те же дни, поэтому слот группы —
+# это час; шаг 2 часа покрывает самые длинные занятия, последнее заканчивается к 21:00
+LESSON_HOURS = range(9, 21, 2)
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует синтетическую школу для нагрузочного тестирования: направления, группы, "
+        "преподаватели, ученики, уроки, посещаемость, счета, платежи и расписание"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directions', type=int, default=5)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--years', type=int, default=1, help="Сколько лет истории уроков и оплат")
+        parser.add_argument('--classrooms', type=int, default=10)
+        parser.add_argument('--leads', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help="Seed генератора случайных чисел")
+        parser.add_argument('--prefix', default='gen', help="Префикс username, чтобы запуски не пересекались")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.password = make_password('password')
+        self.today = timezone.localdate()
+        self.start = self.today - datetime.timedelta(days=365 * options['years'])
+
+        # Администратор нужен benchmark_endpoints для авторизации
+        CustomUser.objects.get_or_create(
+            username=f'{self.prefix}-admin',
+            defaults={'password': self.password, 'role': 'Administrator', 'age': 30, 'is_staff': True}
+        )
+        directions = self.create_directions(options['directions'])
+        classrooms = self.create_classrooms(options['classrooms'])
+        teachers = self.create_teachers(max(1, options['groups'] // 3), directions)
+        groups = self.create_groups(options['groups'], directions, teachers)
+        slots = self.assign_slots(groups, classrooms)
+        self.create_students(options['students'], groups)
+        self.create_history(groups, slots, options['years'])
+        self.create_reports()
+        self.create_leads(options['leads'], directions)
+
+        # bulk_create не вызывает сигналы — агрегаты отчётов, сводки посещаемости
+        # и поисковый индекс пересчитываем целиком
+        first, last = ledger_bounds()
+        if first:
+            rebuild_all(first, last)
+        rebuild_summaries()
+        rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS("Генерация завершена"))
+
+    # ---------------------------------------------------------------- helpers
+
+    def progress(self, label, done, total):
+        self.stdout.write(f"\r{label}: {done}/{total}", ending='')
+        if done >= total:
+            self.stdout.write('')
+        self.stdout.flush()
+
+    def bulk(self, model, objects, label=None):
+        """bulk_create пачками; возвращает объекты с первичными ключами"""
+        created = []
+        total = len(objects)
+        for start in range(0, total, self.batch_size):
+            created.extend(model.objects.bulk_create(objects[start:start + self.batch_size]))
+            if label:
+                self.progress(label, min(start + self.batch_size, total), total)
+        return created
+
+    def flush(self, model, buffer):
+        if buffer:
+            model.objects.bulk_create(buffer, batch_size=self.batch_size)
+            buffer.clear()
+
+    def make_users(self, role, count, first_name):
+        now = timezone.now()
+        return [
+            CustomUser(
+                username=f'{self.prefix}-{role.lower()}-{i}',
+                password=self.password,
+                role=role,
+                first_name=f'{first_name}{i}',
+                last_name=f'{role}ov{i % 97}',
+                age=self.random.randint(16, 45) if role == 'Student' else self.random.randint(25, 60),
+                date_joined=now - datetime.timedelta(days=self.random.randint(0, (self.today - self.start).days)),
+            )
+            for i in range(count)
+        ]
+
+    # --------------------------------------------------------------- entities
+
+    @transaction.atomic
+    def create_directions(self, count):
+        return self.bulk(
+            Direction, [Direction(name=f'{self.prefix} Направление {i}') for i in range(count)], 'Направления'
+        )
+
+    @transaction.atomic
+    def create_classrooms(self, count):
+        return self.bulk(
+            Classroom,
+            [Classroom(number=f'{self.prefix[:3]}{i}', capacity=self.random.randint(8, 30)) for i in range(count)],
+            'Кабинеты'
+        )
+
+    @transaction.atomic
+    def create_teachers(self, count, directions):
+        users = self.bulk(CustomUser, self.make_users('Teacher', count, 'Преподаватель'), 'Преподаватели')
+        profiles = self.bulk(Teacher, [
+            Teacher(
+                user=user,
+                payment_type=self.random.choice(['fixed', 'hourly']),
+                payment_amount=Decimal(self.random.choice([500, 800, 1000, 30000])),
+                payment_period=self.random.choice(['month', 'per_lesson']),
+            )
+            for user in users
+        ])
+        Teacher.directions.through.objects.bulk_create([
+            Teacher.directions.through(teacher_id=profile.id, direction_id=self.random.choice(directions).id)
+            for profile in profiles
+        ], batch_size=self.batch_size)
+        return profiles
+
+    @transaction.atomic
+    def create_groups(self, count, directions, teachers):
+        groups = self.bulk(Group, [
+            Group(
+                group_name=f'{self.prefix} Группа {i}',
+                direction=self.random.choice(directions),
+                age_group=self.random.choice(['7-10', '11-14', '15-18', '18+']),
+                format=self.random.choice(['online', 'offline']),
+                duration_months=12,
+                planned_start=self.start,
+                lessons_per_month=8,
+                lesson_duration=self.random.choice([1, 2]),
+                lessons_per_week=2,
+                schedule_days='Пн, Ср' if i % 2 else 'Вт, Чт',
+                teacher_id=teachers[i % len(teachers)].user_id,
+            )
+            for i in range(count)
+        ], 'Группы')
+        Teacher.groups.through.objects.bulk_create([
+            Teacher.groups.through(teacher_id=teachers[i % len(teachers)].id, group_id=group.id)
+            for i, group in enumerate(groups)
+        ], batch_size=self.batch_size)
+        return groups
+
+    def assign_slots(self, groups, classrooms):
+        """
+        Кабинет и час начала для каждой группы: в один час кабинет и преподаватель
+        заняты не более чем одной группой
+        """
+        busy_rooms, busy_teachers, slots = set(), set(), {}
+        for group in groups:
+            for hour in LESSON_HOURS:
+                if (group.teacher_id, hour) in busy_teachers:
+                    continue
+                classroom = next((room for room in classrooms if (room.id, hour) not in busy_rooms), None)
+                if classroom is not None:
+                    break
+            else:
+                raise CommandError(
+                    f"Кабинетов не хватает на {len(groups)} групп: "
+                    f"до {len(classrooms) * len(LESSON_HOURS)} групп, увеличьте --classrooms"
+                )
+            busy_rooms.add((classroom.id, hour))
+            busy_teachers.add((group.teacher_id, hour))
+            slots[group.id] = (classroom, hour)
+        return slots
+
+    @transaction.atomic
+    def create_students(self, count, groups):
+        users = self.bulk(CustomUser, self.make_users('Student', count, 'Ученик'), 'Ученики')
+        profiles = self.bulk(Student, [Student(user=user) for user in users])
+
+        # Каждый ученик попадает в одну группу; состав группы нужен для посещаемости
+        self.members = {group.id: [] for group in groups}
+        group_links, profile_groups, profile_directions = [], [], []
+        for i, (user, profile) in enumerate(zip(users, profiles)):
+            group = groups[i % len(groups)]
+            self.members[group.id].append(user.id)
+            group_links.append(Group.students.through(group_id=group.id, customuser_id=user.id))
+            profile_groups.append(Student.groups.through(student_id=profile.id, group_id=group.id))
+            profile_directions.append(Student.directions.through(student_id=profile.id, direction_id=group.direction_id))
+
+        for model, rows in (
+            (Group.students.through, group_links),
+            (Student.groups.through, profile_groups),
+            (Student.directions.through, profile_directions),
+        ):
+            model.objects.bulk_create(rows, batch_size=self.batch_size)
+        return users
+
+    def create_history(self, groups, slots, years):
+        """Курсы, месяцы, уроки, посещаемость, счета, платежи и расписание по группам"""
+        attendance, payments, schedule = [], [], []
+        tz = timezone.get_current_timezone()
+
+        for index, group in enumerate(groups, start=1):
+            classroom, hour = slots[group.id]
+            with transaction.atomic():
+                courses = Course.objects.bulk_create([
+                    Course(group=group, course_number=number) for number in range(1, years + 1)
+                ])
+                months = Months.objects.bulk_create([
+                    Months(course=course, month_number=m, title=f'Месяц {m}', description='')
+                    for course in courses for m in range(1, 13)
+                ])
+
+                lessons = []
+                for position, month in enumerate(months):
+                    month_start = self.start + datetime.timedelta(days=30 * position)
+                    for order in range(1, group.lessons_per_month + 1):
+                        day = month_start + datetime.timedelta(days=(order - 1) * 30 // group.lessons_per_month)
+                        if day > self.today:
+                            break
+                        lessons.append(Lesson(
+                            month=month, title=f'Урок {order}', description='', order=order,
+                            date=datetime.datetime.combine(day, datetime.time(hour), tzinfo=tz),
+                        ))
+                lessons = Lesson.objects.bulk_create(lessons)
+
+                members = self.members[group.id]
+                for lesson in lessons:
+                    for student_id in members:
+                        attendance.append(Attendance(
+                            lesson=lesson, student_id=student_id,
+                            status=self.random.choices(['1', '0', 'online'], weights=[7, 2, 1])[0],
+                        ))
+                    start_hour = lesson.date.astimezone(tz).hour
+                    schedule.append(Schedule(
+                        classroom=classroom, group=group, teacher_id=group.teacher_id,
+                        start_time=datetime.time(start_hour), end_time=datetime.time(start_hour + group.lesson_duration),
+                        date=lesson.date.astimezone(tz).date(),
+                    ))
+                    if len(attendance) >= self.batch_size:
+                        self.flush(Attendance, attendance)
+
+                # Счёт за каждый месяц курса; paid_total и статус считаем сразу, т.к. bulk_create
+                # не вызывает Payment.save
+                invoices = []
+                for position, month in enumerate(months):
+                    due = self.start + datetime.timedelta(days=30 * position + 5)
+                    if due > self.today:
+                        break
+                    for student_id in members:
+                        invoices.append(Invoice(
+                            student_id=student_id, course_id=month.course_id, amount=Decimal('5000'),
+                            date_created=datetime.datetime.combine(due - datetime.timedelta(days=5), datetime.time(9), tzinfo=tz),
+                            due_date=due,
+                        ))
+                for invoice in invoices:
+                    paid = self.random.choice([Decimal('0'), Decimal('2500'), Decimal('5000'), Decimal('5000')])
+                    invoice.paid_total = paid
+                    invoice.status = 'paid' if paid >= invoice.amount else ('partial' if paid else 'pending')
+                invoices = self.bulk(Invoice, invoices)
+                for invoice in invoices:
+                    if invoice.paid_total:
+                        payments.append(Payment(
+                            invoice=invoice, amount=invoice.paid_total,
+                            payment_type=self.random.choice(['cash', 'transfer', 'online']),
+                            date=invoice.date_created + datetime.timedelta(days=self.random.randint(0, 10)),
+                        ))
+
+                self.flush(Attendance, attendance)
+                self.flush(Payment, payments)
+                self.flush(Schedule, schedule)
+
+            self.progress('История групп', index, len(groups))
+
+        Expense.objects.bulk_create([
+            Expense(
+                category=self.random.choice(['salary', 'rent', 'marketing', 'office', 'other']),
+                description='Синтетический расход', amount=Decimal(self.random.randint(1000, 50000)),
+                date=self.start + datetime.timedelta(days=day),
+            )
+            for day in range(0, (self.today - self.start).days + 1, 3)
+        ], batch_size=self.batch_size)
+
+    @transaction.atomic
+    def create_reports(self):
+        reports, current = [], self.start.replace(day=1)
+        while current <= self.today:
+            reports.append(FinancialReport(report_type='monthly', start_date=current, end_date=month_end(current)))
+            current = next_month(current)
+        self.bulk(FinancialReport, reports, 'Отчёты')
+
+    @transaction.atomic
+    def create_leads(self, count, directions):
+        statuses = [choice for choice, _ in Lead.STATUS_CHOICES]
+        self.bulk(Lead, [
+            Lead(
+                name=f'Заявка {i}', phone=f'+996700{i:06d}', course=self.random.choice(directions).name,
+                status=self.random.choice(statuses),
+                created_at=timezone.now() - datetime.timedelta(days=self.random.randint(0, 365)),
+            )
+            for i in range(count)
+        ], 'Заявки')
@@ -0,0 +1,50 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Приводит возраст пользователей к числу перед миграцией age CharField -> PositiveSmallIntegerField: "
+        "'14 лет' -> 14. Запускается до migrate — миграция приводит колонку через CAST и падает на тексте"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать найденные значения")
+        parser.add_argument('--default', type=int, help="Возраст для значений без цифр")
+
+    def handle(self, *args, **options):
+        table = connection.ops.quote_name(CustomUser._meta.db_table)
+        # Сырой SQL: модель уже описывает колонку как число, а в базе ещё текст
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id, age FROM {table}')
+            rows = cursor.fetchall()
+
+        updates, unparsed = [], []
+        for user_id, age in rows:
+            value = str(age if age is not None else '').strip()
+            if value.isdigit():
+                continue
+            match = re.search(r'\d+', value)
+            if match:
+                updates.append((int(match.group()), user_id))
+            elif options['default'] is not None:
+                updates.append((options['default'], user_id))
+            else:
+                unparsed.append((user_id, value))
+
+        for age, user_id in updates:
+            self.stdout.write(f"Пользователь #{user_id}: {age}")
+        if unparsed:
+            listed = ', '.join(f'#{user_id} ({value!r})' for user_id, value in unparsed)
+            raise CommandError(f"Нет числа в возрасте: {listed}. Исправьте вручную или укажите --default")
+        if options['dry_run']:
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f'UPDATE {table} SET age = %s WHERE id = %s', updates)
+
+        self.stdout.write(self.style.SUCCESS(f"Исправлено значений: {len(updates)}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.administration.attendance_summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает сводки посещаемости студентов по группам. Запускается раз в сутки, "
+        "чтобы сдвинуть окно за 30 дней, и после bulk-загрузок в обход моделей"
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано сводок: {count}"))
@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.administration.rollups import ledger_bounds, rebuild_all
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Неверный формат даты: {value}. Используйте YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает дневные агрегаты оплат, расходов и счетов для финансовых отчётов. "
+        "Нужен после bulk-загрузок и правок в обход моделей"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="Начало периода YYYY-MM-DD (по умолчанию первая запись)")
+        parser.add_argument('--to', dest='end', help="Конец периода YYYY-MM-DD (по умолчанию последняя запись)")
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start']) if options['start'] else None
+        end = parse_date(options['end']) if options['end'] else None
+        if start and end and end < start:
+            raise CommandError("Конец периода раньше начала")
+
+        if not (start and end):
+            first, last = ledger_bounds()
+            if first is None:
+                self.stdout.write("Нет данных для пересчёта")
+                return
+            start, end = start or first, end or last
+
+        rebuild_all(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Агрегаты пересчитаны за {start} - {end}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.administration.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Перестраивает поисковый индекс учеников, преподавателей, групп и заявок"
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано объектов: {count}"))
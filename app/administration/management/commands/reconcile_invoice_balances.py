@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from app.administration.models import Invoice, Payment
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает Invoice.paid_total и статусы счетов по таблице платежей"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать количество расхождений")
+
+    def handle(self, *args, **options):
+        payments_total = Coalesce(
+            Subquery(
+                Payment.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice').annotate(
+                    total=Sum('amount')
+                ).values('total'),
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            ),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        )
+
+        mismatched = Invoice.objects.annotate(actual=payments_total).exclude(paid_total=F('actual')).count()
+        self.stdout.write(f"Счетов с расхождением: {mismatched}")
+
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            Invoice.objects.update(paid_total=payments_total)
+            Invoice.objects.update(status=Case(
+                When(Q(paid_total__gte=F('amount') - F('discount')), then=Value('paid')),
+                When(paid_total__gt=0, then=Value('partial')),
+                default=Value('pending'),
+            ))
+
+        self.stdout.write(self.style.SUCCESS("Балансы счетов пересчитаны"))
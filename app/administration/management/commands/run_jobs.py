@@ -0,0 +1,96 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+# Модели и задачи импортируются внутри функций: процесс пула (spawn) импортирует
+# этот модуль до django.setup()
+
+
+def setup_worker():
+    # spawn: процесс пула стартует с чистым интерпретатором и своими соединениями с базой
+    django.setup()
+
+
+def run_in_worker(job_id):
+    from app.administration.jobs import run_job
+    return run_job(job_id).status
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет фоновые задачи из очереди BackgroundJob: расчёт выплат, отчёты, пакетный PDF. "
+        "С --processes N задачи выполняются параллельно в пуле процессов"
+    )
+
+    def add_arguments(self, parser):
+        from app.administration.models import BackgroundJob
+
+        parser.add_argument('--processes', type=int, default=1, help="Размер пула процессов")
+        parser.add_argument('--once', action='store_true', help="Разобрать очередь и выйти")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Пауза при пустой очереди, с")
+        parser.add_argument('--kind', action='append', choices=[kind for kind, _ in BackgroundJob.KINDS],
+                            help="Выполнять только задачи указанного типа (можно повторять)")
+
+    def handle(self, *args, **options):
+        from app.administration.jobs import requeue_stale, worker_name
+
+        if options['processes'] < 1:
+            raise CommandError("--processes должно быть больше нуля")
+
+        self.worker = worker_name()
+        self.kinds = options['kind']
+        requeue_stale()
+
+        if options['processes'] == 1:
+            self.run_inline(options)
+        else:
+            self.run_pool(options)
+
+    def report(self, job_id, status):
+        self.stdout.write(f"Задача #{job_id}: {status}")
+
+    def run_inline(self, options):
+        from app.administration.jobs import claim_next, requeue_stale, run_job
+
+        while True:
+            job_id = claim_next(self.worker, self.kinds)
+            if job_id is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                requeue_stale()
+                continue
+            self.report(job_id, run_job(job_id).status)
+
+    def run_pool(self, options):
+        from app.administration.jobs import claim_next, requeue_stale
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(options['processes'], mp_context=context, initializer=setup_worker) as pool:
+            running = {}
+            while True:
+                # Задачи захватывает родитель, процессы пула только выполняют их
+                while len(running) < options['processes']:
+                    job_id = claim_next(self.worker, self.kinds)
+                    if job_id is None:
+                        break
+                    running[pool.submit(run_in_worker, job_id)] = job_id
+
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    requeue_stale()
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.report(job_id, future.result())
+                    except Exception as e:
+                        # Процесс пула упал: задача вернётся в очередь через requeue_stale
+                        self.stderr.write(f"Задача #{job_id}: воркер завершился с ошибкой: {e}")
@@ -1,10 +1,33 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.forms import ValidationError
 from app.users.models import CustomUser
 from django.utils import timezone
 from django.db.models import Sum
 
 
+class LoadedValuesMixin:
+    """
+    Запоминает значения полей, прочитанные из базы (from_db), без работы на каждый
+    экземпляр. Сигналы сравнивают с ними при сохранении и обновляют после него.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def loaded_value(self, attname):
+        """Значение поля при загрузке или после последнего сохранения; None у новой записи"""
+        return self.__dict__.get('_loaded_values', {}).get(attname)
+
+    def remember_values(self, *attnames):
+        self.__dict__.setdefault('_loaded_values', {}).update(
+            {attname: self.__dict__.get(attname) for attname in attnames}
+        )
+
+
 class Direction(models.Model):
     name = models.CharField(max_length=255, verbose_name="Название направления")
 
@@ -15,7 +38,7 @@ class Direction(models.Model):
     def __str__(self):
         return self.name
 
-class Group(models.Model):
+class Group(LoadedValuesMixin, models.Model):
     FORMAT_CHOICES = [
         ('online', 'Онлайн'),
         ('offline', 'Оффлайн'),
@@ -61,7 +84,7 @@ class Group(models.Model):
         if not self.creation_date:
             return 1
             
-        today = timezone.now().date()
+        today = timezone.localdate()
         months_passed = (today.year - self.creation_date.year) * 12 + (today.month - self.creation_date.month)
         current_course = (months_passed // self.duration_months) + 1
         return current_course
@@ -72,7 +95,7 @@ class Group(models.Model):
         if not self.creation_date:
             return 1
             
-        today = timezone.now().date()
+        today = timezone.localdate()
         months_passed = (today.year - self.creation_date.year) * 12 + (today.month - self.creation_date.month)
         current_month = (months_passed % self.duration_months) + 1
         return current_month
@@ -179,7 +202,7 @@ class Student(models.Model):
 
 
 # models.py
-class Course(models.Model):
+class Course(LoadedValuesMixin, models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='courses')
     course_number = models.PositiveIntegerField(verbose_name="Номер курса")
     
@@ -206,12 +229,13 @@ class Months(models.Model):
     def __str__(self):
         return f"{self.course} - Месяц {self.month_number}"
 
-class Lesson(models.Model):
+class Lesson(LoadedValuesMixin, models.Model):
     month = models.ForeignKey(Months, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=255, verbose_name="Название урока")
     description = models.TextField(verbose_name="Описание урока")
     order = models.PositiveIntegerField(verbose_name="Порядковый номер")
-    date = models.DateTimeField(verbose_name="Дата", null=True, blank=True)
+    # Индекс для фильтров по диапазону дат (аналитика, история посещаемости)
+    date = models.DateTimeField(verbose_name="Дата", null=True, blank=True, db_index=True)
     lesson_links = models.URLField(blank=True, verbose_name="Ссылки урока")
     homework_links = models.URLField(blank=True, verbose_name="Ссылки ДЗ")
     lesson_recording = models.FileField(
@@ -279,12 +303,17 @@ class HomeworkSubmission(models.Model):
         verbose_name_plural = "Домашние задания"
         unique_together = ('lesson', 'student')
         ordering = ['-submitted_at']
+        # Курсорная пагинация: общий список ДЗ и "мои работы" студента
+        indexes = [
+            models.Index(fields=['-submitted_at', '-id'], name='homework_submitted_idx'),
+            models.Index(fields=['student', '-submitted_at', '-id'], name='homework_student_submitted_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.lesson}"
 
 
-class Attendance(models.Model):
+class Attendance(LoadedValuesMixin, models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='attendances')
     student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='attendances')
     STATUS_CHOICES = [
@@ -298,6 +327,38 @@ class Attendance(models.Model):
         verbose_name = "Посещаемость"
         verbose_name_plural = "Посещаемости"
         unique_together = ('lesson', 'student')
+        # unique_together покрывает поиск по уроку; история студента идёт от student
+        indexes = [models.Index(fields=['student', 'lesson'], name='attendance_student_idx')]
+
+
+class AttendanceSummary(models.Model):
+    """
+    Посещаемость студента в группе, пересчитывается при изменении Attendance
+    (см. attendance_summaries.py). Окно "за 30 дней" сдвигается со временем,
+    поэтому полная перестройка (rebuild_attendance_summaries) запускается раз в сутки.
+    """
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='attendance_summaries')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='attendance_summaries')
+    total_lessons = models.PositiveIntegerField(default=0, verbose_name="Отмеченных уроков")
+    attended_lessons = models.PositiveIntegerField(default=0, verbose_name="Посещено")
+    recent_lessons = models.PositiveIntegerField(default=0, verbose_name="Уроков за 30 дней")
+    recent_attended = models.PositiveIntegerField(default=0, verbose_name="Посещено за 30 дней")
+    absence_streak = models.PositiveIntegerField(default=0, verbose_name="Пропусков подряд")
+    last_lesson_date = models.DateTimeField(null=True, blank=True, verbose_name="Последний урок")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Сводка посещаемости"
+        verbose_name_plural = "Сводки посещаемости"
+        unique_together = ('student', 'group')
+
+    @property
+    def attendance_percent(self):
+        return round(self.attended_lessons / self.total_lessons * 100) if self.total_lessons else 0
+
+    @property
+    def recent_percent(self):
+        return round(self.recent_attended / self.recent_lessons * 100) if self.recent_lessons else 0
 
     
 
@@ -331,11 +392,12 @@ class Income(models.Model):
         verbose_name = "Доход"
         verbose_name_plural = "Доходы"
         ordering = ['-date']
+        indexes = [models.Index(fields=['-date', '-id'], name='income_date_idx')]
     
     def __str__(self):
         return f"{self.direction.name} - {self.amount} сом ({self.date})"
 
-class Expense(models.Model):
+class Expense(LoadedValuesMixin, models.Model):
     """Модель для учета расходов"""
     CATEGORIES = [
         ('salary', 'Зарплата'),
@@ -357,6 +419,7 @@ class Expense(models.Model):
         verbose_name = "Расход"
         verbose_name_plural = "Расходы"
         ordering = ['-date']
+        indexes = [models.Index(fields=['-date', '-id'], name='expense_date_idx')]
     
     def __str__(self):
         return f"{self.get_category_display()} - {self.amount} сом ({self.date})"
@@ -378,6 +441,7 @@ class TeacherPayment(models.Model):
         verbose_name = "Выплата преподавателю"
         verbose_name_plural = "Выплаты преподавателям"
         ordering = ['-date']
+        unique_together = ('teacher', 'date')
     
     def __str__(self):
         return f"{self.teacher.get_full_name()} - {self.payment} сом"
@@ -390,7 +454,7 @@ class TeacherPayment(models.Model):
 
 
 
-class Invoice(models.Model):
+class Invoice(LoadedValuesMixin, models.Model):
     PAYMENT_TYPES = [
         ('cash', 'Наличные'),
         ('transfer', 'Перевод'),
@@ -415,6 +479,8 @@ class Invoice(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES,
                             default='pending', verbose_name="Статус")
     comment = models.TextField(blank=True, verbose_name="Комментарий")
+    paid_total = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                   editable=False, verbose_name="Оплачено")
 
     def __str__(self):
         return f"{self.student.get_full_name()} ({self.course})"
@@ -423,6 +489,12 @@ class Invoice(models.Model):
         verbose_name = "Счёт"
         verbose_name_plural = "Счета"
         ordering = ['-date_created']
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='invoice_created_idx'),
+            # Фильтр списка счетов и напоминания: статус + срок оплаты
+            models.Index(fields=['status', 'due_date'], name='invoice_status_due_idx'),
+            models.Index(fields=['due_date'], name='invoice_due_idx'),
+        ]
 
     @property
     def final_amount(self):
@@ -430,20 +502,23 @@ class Invoice(models.Model):
 
     @property
     def paid_amount(self):
-        return self.payments.aggregate(total=Sum('amount'))['total'] or 0
+        # Сумма платежей хранится в paid_total и поддерживается Payment.save/delete
+        return self.paid_total
 
     @property
     def balance(self):
         return self.final_amount - self.paid_amount
 
     def update_status(self):
-        if self.paid_amount >= self.final_amount:
+        """Пересчитывает paid_total по платежам и обновляет статус счёта"""
+        self.paid_total = self.payments.aggregate(total=Sum('amount'))['total'] or 0
+        if self.paid_total >= self.final_amount:
             self.status = 'paid'
-        elif self.paid_amount > 0:
+        elif self.paid_total > 0:
             self.status = 'partial'
         else:
             self.status = 'pending'
-        self.save()
+        self.save(update_fields=['paid_total', 'status'])
     
     def clean(self):
         if not self.student_id:
@@ -455,7 +530,7 @@ class Invoice(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
 
-class Payment(models.Model):
+class Payment(LoadedValuesMixin, models.Model):
     PAYMENT_TYPES = [
         ('cash', 'Наличные'),
         ('transfer', 'Перевод'),
@@ -476,13 +551,31 @@ class Payment(models.Model):
         verbose_name = "Платеж"
         verbose_name_plural = "Платежи"
         ordering = ['-date']
+        indexes = [models.Index(fields=['-date', '-id'], name='payment_date_idx')]
 
     def __str__(self):
         return f"{self.amount} - {self.get_payment_type_display()}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.invoice.update_status()
+        with transaction.atomic():
+            previous_invoice_id = None
+            if self.pk:
+                previous_invoice_id = Payment.objects.filter(
+                    pk=self.pk
+                ).values_list('invoice_id', flat=True).first()
+
+            super().save(*args, **kwargs)
+            self.invoice.update_status()
+
+            # Платеж перенесли на другой счёт — пересчитываем и старый
+            if previous_invoice_id and previous_invoice_id != self.invoice_id:
+                Invoice.objects.get(pk=previous_invoice_id).update_status()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.invoice.update_status()
+        return result
 
 # class PaymentReminder(models.Model):
 #     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE,
@@ -512,6 +605,12 @@ class FinancialReport(models.Model):
     end_date = models.DateField(verbose_name="Конец периода")
     generated_at = models.DateTimeField(auto_now_add=True,
                                      verbose_name="Сгенерирован")
+    # Живой отчёт пересчитывается при каждом чтении; замороженный отдаёт snapshot
+    is_live = models.BooleanField(default=True, verbose_name="Живой отчёт")
+    snapshot = models.JSONField(null=True, blank=True, editable=False, encoder=DjangoJSONEncoder,
+                              verbose_name="Зафиксированные показатели")
+    frozen_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                   verbose_name="Зафиксирован")
 
     class Meta:
         verbose_name = "Финансовый отчёт"
@@ -519,6 +618,47 @@ class FinancialReport(models.Model):
         ordering = ['-generated_at']
 
 
+# Дневные агрегаты для финансовых отчётов. Пересчитываются сигналами
+# (app/administration/rollups.py) и командой rebuild_finance_rollups.
+
+class DailyPaymentRollup(models.Model):
+    date = models.DateField(verbose_name="Дата")
+    payment_type = models.CharField(max_length=10, choices=Payment.PAYMENT_TYPES,
+                                  verbose_name="Тип оплаты")
+    direction = models.ForeignKey(Direction, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='+', verbose_name="Направление")
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Сумма")
+    payments_count = models.PositiveIntegerField(default=0, verbose_name="Платежей")
+
+    class Meta:
+        verbose_name = "Оплаты за день"
+        verbose_name_plural = "Оплаты по дням"
+        unique_together = ('date', 'payment_type', 'direction')
+
+
+class DailyExpenseRollup(models.Model):
+    date = models.DateField(verbose_name="Дата")
+    category = models.CharField(max_length=10, choices=Expense.CATEGORIES, verbose_name="Категория")
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Сумма")
+
+    class Meta:
+        verbose_name = "Расходы за день"
+        verbose_name_plural = "Расходы по дням"
+        unique_together = ('date', 'category')
+
+
+class DailyInvoiceRollup(models.Model):
+    date = models.DateField(verbose_name="Дата")
+    direction = models.ForeignKey(Direction, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='+', verbose_name="Направление")
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Сумма")
+
+    class Meta:
+        verbose_name = "Счета за день"
+        verbose_name_plural = "Счета по дням"
+        unique_together = ('date', 'direction')
+
+
 class Classroom(models.Model):
     number = models.CharField(max_length=10, unique=True, verbose_name="Номер кабинета")
     capacity = models.PositiveIntegerField(verbose_name="Вместимость")
@@ -545,6 +685,12 @@ class Schedule(models.Model):
         verbose_name = "Занятие в расписании"
         verbose_name_plural = "Расписание занятий"
         ordering = ['date', 'start_time']
+        indexes = [
+            # Сетка дня по кабинетам и проверка пересечений
+            models.Index(fields=['date', 'classroom', 'start_time'], name='schedule_date_classroom_idx'),
+            # Нагрузка и пересечения преподавателя
+            models.Index(fields=['date', 'teacher'], name='schedule_date_teacher_idx'),
+        ]
     
     def __str__(self):
         return f"{self.group} - {self.get_teacher_name()} - {self.date} {self.start_time}-{self.end_time}"
@@ -555,7 +701,7 @@ class Schedule(models.Model):
 
 
 
-class Lead(models.Model):
+class Lead(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = [
         ('new', 'Новые'),
         ('in_progress', 'В работе'),
@@ -583,6 +729,11 @@ class Lead(models.Model):
         verbose_name = "Заявка"
         verbose_name_plural = "Заявки"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='lead_created_idx'),
+            # Воронка и фильтр по статусу в порядке списка
+            models.Index(fields=['status', '-created_at'], name='lead_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.course} ({self.get_status_display()})"
@@ -609,3 +760,107 @@ class PaymentNotification(models.Model):
 
 
 
+
+
+# Поисковый индекс: нормализованный текст объекта и его триграммы.
+# Поддерживается сигналами (app/administration/search.py) и командой rebuild_search_index.
+
+class SearchEntry(models.Model):
+    KINDS = [
+        ('student', 'Ученик'),
+        ('teacher', 'Преподаватель'),
+        ('group', 'Группа'),
+        ('lead', 'Заявка'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS, verbose_name="Тип объекта")
+    object_id = models.PositiveIntegerField(verbose_name="ID объекта")
+    label = models.CharField(max_length=255, verbose_name="Заголовок")
+    text = models.TextField(verbose_name="Нормализованный текст")
+
+    class Meta:
+        verbose_name = "Запись поискового индекса"
+        verbose_name_plural = "Поисковый индекс"
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.label}"
+
+
+class SearchTrigram(models.Model):
+    entry = models.ForeignKey(SearchEntry, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        verbose_name = "Триграмма"
+        verbose_name_plural = "Триграммы"
+        indexes = [models.Index(fields=['trigram', 'entry'], name='search_trigram_idx')]
+
+
+# Очередь фоновых задач (app/administration/jobs.py, команда run_jobs)
+
+class BackgroundJob(models.Model):
+    KINDS = [
+        ('teacher_payments', 'Расчёт выплат преподавателям'),
+        ('financial_report', 'Финансовый отчёт'),
+        ('pdf_batch', 'Пакетный рендеринг PDF'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('succeeded', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KINDS, verbose_name="Тип задачи")
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Параметры")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name="Статус")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Прогресс, %")
+    progress_message = models.CharField(max_length=255, blank=True, verbose_name="Этап")
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name="Результат")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name="Максимум попыток")
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True,
+                                       verbose_name="Ключ идемпотентности")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Не раньше")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Воркер")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='background_jobs', verbose_name="Автор")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
+        # Воркер выбирает старейшую готовую задачу из очереди
+        indexes = [models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx')]
+        # Ключ идемпотентности действует в пределах автора и типа задачи
+        constraints = [
+            models.UniqueConstraint(
+                fields=['created_by', 'kind', 'idempotency_key'], name='job_idempotency_uniq',
+                condition=models.Q(idempotency_key__isnull=False)
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.get_status_display()})"
+
+    def set_progress(self, percent, message=''):
+        """Обновляет прогресс из обработчика; заодно продлевает захват задачи"""
+        self.progress = max(0, min(100, int(percent)))
+        self.progress_message = message[:255]
+        self.locked_at = timezone.now()
+        # Только пока задача за этим воркером: после перехвата прогресс пишет новый владелец
+        BackgroundJob.objects.filter(id=self.id, locked_by=self.locked_by).update(
+            progress=self.progress, progress_message=self.progress_message, locked_at=self.locked_at
+        )
+
+    def heartbeat(self):
+        """Продлевает захват; False, если задачу уже перехватил другой воркер"""
+        return bool(BackgroundJob.objects.filter(
+            id=self.id, status='running', locked_by=self.locked_by
+        ).update(locked_at=timezone.now()))
@@ -0,0 +1,31 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class HistoryPagination(PageNumberPagination):
+    """Страницы длинных историй (посещаемость студента и т.п.): ?page=2&page_size=100"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    @classmethod
+    def requested(cls, request):
+        # Пагинация включается явно, чтобы клиенты без неё по-прежнему получали список
+        return 'page' in request.query_params or cls.page_size_query_param in request.query_params
+
+
+class LedgerCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация журналов (оплаты, счета, доходы, расходы, заявки, ДЗ).
+
+    Страница выбирается условием по полю сортировки, а не OFFSET, поэтому
+    дальние страницы стоят столько же, сколько первая. Поле сортировки
+    задаётся у view в cursor_ordering; id в конце делает порядок однозначным.
+    Под каждую сортировку в Meta.indexes модели есть составной индекс.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
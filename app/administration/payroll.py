@@ -0,0 +1,155 @@
+import calendar
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from app.administration.models import Group, Lesson, Teacher, TeacherPayment
+from app.users.models import CustomUser
+
+
+def month_range(year, month, end_year=None, end_month=None):
+    """Возвращает список первых чисел месяцев от начального до конечного включительно"""
+    end_year = end_year or year
+    end_month = end_month or month
+
+    start = datetime.date(year, month, 1)
+    end = datetime.date(end_year, end_month, 1)
+    if end < start:
+        raise ValueError("Конец периода раньше начала")
+
+    periods = []
+    current = start
+    while current <= end:
+        periods.append(current)
+        current = next_month(current)
+    return periods
+
+
+def next_month(day):
+    if day.month == 12:
+        return datetime.date(day.year + 1, 1, 1)
+    return datetime.date(day.year, day.month + 1, 1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def calculate_payment(profile, lessons_count, lesson_duration):
+    """Выплата за одну группу по правилам fixed / per_lesson / hourly"""
+    rate = profile.payment_amount or Decimal('0')
+    if profile.payment_type == 'fixed':
+        if profile.payment_period == 'month':
+            return rate
+        return rate * lessons_count  # per_lesson
+    return rate * lessons_count * lesson_duration  # hourly
+
+
+def calculate_teacher_payments(year, month, end_year=None, end_month=None, dry_run=False):
+    """
+    Рассчитывает выплаты всем активным преподавателям за месяц или диапазон месяцев.
+
+    Количество занятий считается одним сгруппированным запросом по Lesson,
+    ставки применяются в памяти, а записи TeacherPayment сохраняются одним
+    bulk upsert в транзакции. При dry_run=True ничего не записывается.
+    """
+    periods = month_range(year, month, end_year, end_month)
+    start_dt = _aware(periods[0])
+    end_dt = _aware(next_month(periods[-1]))
+
+    teachers = list(
+        CustomUser.objects.filter(role='Teacher', is_active=True).select_related('teacher_add')
+    )
+
+    groups_by_teacher = defaultdict(list)
+    for group_id, teacher_id, lesson_duration in Group.objects.filter(
+        teacher__role='Teacher', teacher__is_active=True
+    ).values_list('id', 'teacher_id', 'lesson_duration'):
+        groups_by_teacher[teacher_id].append((group_id, lesson_duration))
+
+    # Один запрос: количество занятий по (месяц, группа) за весь диапазон
+    lesson_counts = {
+        (row['period'], row['month__course__group']): row['lessons']
+        for row in Lesson.objects.filter(
+            date__gte=start_dt,
+            date__lt=end_dt,
+            month__course__group__teacher__isnull=False,
+        ).annotate(
+            period=TruncMonth('date', output_field=DateField())
+        ).values('period', 'month__course__group').annotate(
+            lessons=Count('id')
+        ).order_by()
+    }
+
+    existing = set(
+        TeacherPayment.objects.filter(
+            teacher__in=teachers,
+            date__in=[month_end(period) for period in periods],
+        ).values_list('teacher_id', 'date')
+    )
+
+    reports = []
+    rows = []
+    for period in periods:
+        end_date = month_end(period)
+        results = []
+
+        for teacher in teachers:
+            try:
+                profile = teacher.teacher_add
+            except Teacher.DoesNotExist:
+                results.append({
+                    'teacher_id': teacher.id,
+                    'error': 'Teacher profile not found'
+                })
+                continue
+
+            total_lessons = 0
+            total_payment = Decimal('0')
+            for group_id, lesson_duration in groups_by_teacher[teacher.id]:
+                lessons_count = lesson_counts.get((period, group_id), 0)
+                total_lessons += lessons_count
+                total_payment += calculate_payment(profile, lessons_count, lesson_duration)
+
+            rows.append(TeacherPayment(
+                teacher=teacher,
+                date=end_date,
+                lessons_count=total_lessons,
+                rate=profile.payment_amount or Decimal('0'),
+                payment=total_payment,
+                bonus=0,
+                is_paid=False,
+            ))
+            results.append({
+                'teacher_id': teacher.id,
+                'teacher_name': teacher.get_full_name(),
+                'lessons_count': total_lessons,
+                'payment': total_payment,
+                'status': 'updated' if (teacher.id, end_date) in existing else 'created'
+            })
+
+        reports.append({
+            'period': f"{period} - {end_date}",
+            'teachers_processed': len(results),
+            'results': results,
+        })
+
+    if not dry_run and rows:
+        with transaction.atomic():
+            TeacherPayment.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['teacher', 'date'],
+                update_fields=['lessons_count', 'rate', 'payment', 'bonus', 'is_paid'],
+            )
+
+    return reports
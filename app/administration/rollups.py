@@ -0,0 +1,235 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from app.administration.models import (
+    DailyExpenseRollup, DailyInvoiceRollup, DailyPaymentRollup, Expense, FinancialReport, Invoice, Payment
+)
+
+
+def local_date(value):
+    """Дата DateTimeField в текущем часовом поясе (как date__date в запросах)"""
+    if isinstance(value, str):
+        value = parse_datetime(value) or parse_date(value)
+    if isinstance(value, datetime.datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def day_bounds(start, end):
+    """Aware-границы [start 00:00, end+1 00:00) для фильтра по DateTimeField"""
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.datetime.combine(start, datetime.time.min, tzinfo=tz),
+        datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz),
+    )
+
+
+def rebuild_payments(start, end):
+    lower, upper = day_bounds(start, end)
+    rows = Payment.objects.filter(date__gte=lower, date__lt=upper).annotate(
+        day=TruncDate('date')
+    ).values('day', 'payment_type', 'invoice__course__group__direction').annotate(
+        total=Sum('amount'), payments_count=Count('id')
+    ).order_by()
+
+    DailyPaymentRollup.objects.filter(date__range=(start, end)).delete()
+    DailyPaymentRollup.objects.bulk_create([
+        DailyPaymentRollup(
+            date=row['day'], payment_type=row['payment_type'],
+            direction_id=row['invoice__course__group__direction'],
+            total=row['total'], payments_count=row['payments_count'],
+        )
+        for row in rows
+    ])
+
+
+def rebuild_expenses(start, end):
+    rows = Expense.objects.filter(date__range=(start, end)).values('date', 'category').annotate(
+        total=Sum('amount')
+    ).order_by()
+
+    DailyExpenseRollup.objects.filter(date__range=(start, end)).delete()
+    DailyExpenseRollup.objects.bulk_create([
+        DailyExpenseRollup(date=row['date'], category=row['category'], total=row['total'])
+        for row in rows
+    ])
+
+
+def rebuild_invoices(start, end):
+    lower, upper = day_bounds(start, end)
+    rows = Invoice.objects.filter(date_created__gte=lower, date_created__lt=upper).annotate(
+        day=TruncDate('date_created')
+    ).values('day', 'course__group__direction').annotate(
+        total=Sum('amount')
+    ).order_by()
+
+    DailyInvoiceRollup.objects.filter(date__range=(start, end)).delete()
+    DailyInvoiceRollup.objects.bulk_create([
+        DailyInvoiceRollup(date=row['day'], direction_id=row['course__group__direction'], total=row['total'])
+        for row in rows
+    ])
+
+
+REBUILDERS = {
+    'payments': rebuild_payments,
+    'expenses': rebuild_expenses,
+    'invoices': rebuild_invoices,
+}
+
+
+def refresh_days(kind, days):
+    """Пересчитывает агрегаты указанных дней (вызывается сигналами после записи)"""
+    with transaction.atomic():
+        for day in {day for day in days if day}:
+            REBUILDERS[kind](day, day)
+
+
+def rebuild_all(start, end):
+    """Полный пересчёт агрегатов за период"""
+    with transaction.atomic():
+        for rebuild in REBUILDERS.values():
+            rebuild(start, end)
+
+
+def ledger_bounds():
+    """Первая и последняя дата среди оплат, счетов и расходов"""
+    dates = []
+    for queryset, field in (
+        (Payment.objects.all(), 'date'),
+        (Invoice.objects.all(), 'date_created'),
+        (Expense.objects.all(), 'date'),
+    ):
+        bounds = queryset.order_by().aggregate(first=Min(field), last=Max(field))
+        dates.extend(local_date(value) for value in bounds.values() if value)
+    if not dates:
+        return None, None
+    return min(dates), max(dates)
+
+
+def report_totals(start, end):
+    """Итоги финансового отчёта за период по дневным агрегатам: три запроса"""
+    income_by_type = {
+        row['payment_type']: row['amount']
+        for row in DailyPaymentRollup.objects.filter(date__range=(start, end)).values(
+            'payment_type'
+        ).annotate(amount=Sum('total')).order_by()
+    }
+    expenses_by_category = {
+        row['category']: row['amount']
+        for row in DailyExpenseRollup.objects.filter(date__range=(start, end)).values(
+            'category'
+        ).annotate(amount=Sum('total')).order_by()
+    }
+    top_courses = DailyInvoiceRollup.objects.filter(date__range=(start, end)).values_list(
+        'direction__name'
+    ).annotate(amount=Sum('total')).order_by('-amount')[:5]
+    return _totals(income_by_type, expenses_by_category, top_courses)
+
+
+def period_totals(periods):
+    """
+    Итоги нескольких отчётов теми же тремя запросами: {key: (start, end)} -> {key: итоги}.
+    Дневные агрегаты читаются один раз за общий диапазон и суммируются по периодам в памяти.
+    """
+    if not periods:
+        return {}
+    start = min(period_start for period_start, _ in periods.values())
+    end = max(period_end for _, period_end in periods.values())
+    payments = list(DailyPaymentRollup.objects.filter(date__range=(start, end)).values_list(
+        'date', 'payment_type'
+    ).annotate(amount=Sum('total')).order_by())
+    expenses = list(DailyExpenseRollup.objects.filter(date__range=(start, end)).values_list(
+        'date', 'category'
+    ).annotate(amount=Sum('total')).order_by())
+    courses = list(DailyInvoiceRollup.objects.filter(date__range=(start, end)).values_list(
+        'date', 'direction__name'
+    ).annotate(amount=Sum('total')).order_by())
+
+    def collect(rows, period_start, period_end):
+        sums = defaultdict(Decimal)
+        for day, key, amount in rows:
+            if period_start <= day <= period_end:
+                sums[key] += amount
+        return sums
+
+    return {
+        key: _totals(
+            collect(payments, period_start, period_end),
+            collect(expenses, period_start, period_end),
+            sorted(collect(courses, period_start, period_end).items(), key=lambda row: row[1], reverse=True)[:5],
+        )
+        for key, (period_start, period_end) in periods.items()
+    }
+
+
+def _totals(income_by_type, expenses_by_category, top_courses):
+    total_income = sum(income_by_type.values(), Decimal('0'))
+    total_expenses = sum(expenses_by_category.values(), Decimal('0'))
+    return {
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net_profit': total_income - total_expenses,
+        'income_by_type': {key: float(value) for key, value in income_by_type.items()},
+        'expenses_by_category': {key: float(value) for key, value in expenses_by_category.items()},
+        # top_courses — пары (направление, сумма) по убыванию суммы
+        'top_courses': {name: float(amount) for name, amount in top_courses if name},
+    }
+
+
+SNAPSHOT_DECIMALS = ('total_income', 'total_expenses', 'net_profit')
+
+
+def freeze_report(report):
+    """Фиксирует текущие показатели отчёта в snapshot; дальше отчёт читается без агрегатов"""
+    report.snapshot = report_totals(report.start_date, report.end_date)
+    report.is_live = False
+    report.frozen_at = timezone.now()
+    report.save(update_fields=['snapshot', 'is_live', 'frozen_at'])
+    return report
+
+
+def snapshot_totals(snapshot):
+    """Показатели из snapshot в том же виде, что и report_totals"""
+    totals = dict(snapshot)
+    for key in SNAPSHOT_DECIMALS:
+        totals[key] = Decimal(str(totals[key]))
+    return totals
+
+
+def report_period(report_type, today, start_date=None, end_date=None):
+    """Границы отчёта по типу; для custom даты передаются явно"""
+    if report_type == 'daily':
+        return today, today
+    if report_type == 'weekly':
+        start = today - datetime.timedelta(days=today.weekday())
+        return start, start + datetime.timedelta(days=6)
+    if report_type == 'monthly':
+        start = today.replace(day=1)
+        return start, (start + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+    if report_type == 'yearly':
+        return today.replace(month=1, day=1), today.replace(month=12, day=31)
+    if report_type == 'custom':
+        if not start_date or not end_date:
+            raise ValueError('Для custom отчета нужны start_date и end_date')
+        return start_date, end_date
+    raise ValueError(f'Неизвестный тип отчёта: {report_type}')
+
+
+def create_report(report_type, start_date=None, end_date=None, freeze=False):
+    """Создаёт финансовый отчёт; freeze сразу фиксирует показатели в snapshot"""
+    start_date, end_date = report_period(report_type, timezone.localdate(), start_date, end_date)
+    report = FinancialReport.objects.create(
+        report_type=report_type,
+        start_date=start_date,
+        end_date=end_date
+    )
+    if freeze:
+        freeze_report(report)
+    return report
@@ -0,0 +1,210 @@
+import bisect
+import datetime
+import re
+from collections import defaultdict
+
+from django.db.models import Q
+
+from app.administration.models import Schedule
+
+
+DAY_START_HOUR = 9
+DAY_END_HOUR = 21  # не включительно: последний слот начинается до 21:00
+SLOT_CHOICES = (15, 30, 60)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_labels(slot=60):
+    """Подписи слотов сетки: '9:00', '9:30', ..."""
+    return [
+        f"{minute // 60}:{minute % 60:02d}"
+        for minute in range(DAY_START_HOUR * 60, DAY_END_HOUR * 60, slot)
+    ]
+
+
+def lesson_payload(lesson):
+    return {
+        'id': lesson.id,
+        'group': lesson.group.group_name,
+        'teacher': lesson.get_teacher_name(),
+        'note': lesson.note
+    }
+
+
+def build_day_grid(classrooms, lessons, slot=60):
+    """
+    Сетка дня: для каждого кабинета список слотов с занятием или None.
+
+    Занятия сначала раскладываются по classroom_id, затем каждое занятие
+    заполняет только свои слоты, поэтому сложность линейна по числу
+    кабинетов, слотов и занятий. Если занятия пересекаются, слот остаётся
+    за первым по порядку (как в исходной сетке).
+    """
+    labels = slot_labels(slot)
+    day_start = DAY_START_HOUR * 60
+
+    by_classroom = defaultdict(list)
+    for lesson in lessons:
+        by_classroom[lesson.classroom_id].append(lesson)
+
+    result = []
+    for classroom in classrooms:
+        cells = [None] * len(labels)
+        for lesson in by_classroom.get(classroom['id'], ()):
+            first = max(0, (_minutes(lesson.start_time) - day_start) // slot)
+            last = min(len(labels), -(-(_minutes(lesson.end_time) - day_start) // slot))
+            payload = None
+            for index in range(first, last):
+                if cells[index] is None:
+                    payload = payload or lesson_payload(lesson)
+                    cells[index] = payload
+
+        result.append({
+            **classroom,
+            'schedule': [{'time': label, 'lesson': cell} for label, cell in zip(labels, cells)]
+        })
+    return result
+
+
+def schedules_by_group_day(keys):
+    """
+    Первое по времени занятие для каждой пары (group_id, дата) одним запросом.
+    Читается расписание групп за весь диапазон дат, лишние пары отбрасываются.
+    """
+    keys = {(group_id, day) for group_id, day in keys if day}
+    if not keys:
+        return {}
+
+    days = [day for _, day in keys]
+    index = {}
+    for lesson in Schedule.objects.filter(
+        group_id__in={group_id for group_id, _ in keys},
+        date__range=(min(days), max(days)),
+    ).select_related('teacher').order_by('date', 'start_time'):
+        key = (lesson.group_id, lesson.date)
+        if key in keys:
+            index.setdefault(key, lesson)
+    return index
+
+
+# Дни недели в Group.schedule_days: "Пн, Ср", "понедельник/среда", "Mon Wed" и т.п.
+WEEKDAY_ALIASES = {
+    0: ('пн', 'пон', 'понедельник', 'mo', 'mon', 'monday'),
+    1: ('вт', 'вто', 'вторник', 'tu', 'tue', 'tuesday'),
+    2: ('ср', 'сре', 'среда', 'we', 'wed', 'wednesday'),
+    3: ('чт', 'чет', 'четверг', 'th', 'thu', 'thursday'),
+    4: ('пт', 'пят', 'пятница', 'fr', 'fri', 'friday'),
+    5: ('сб', 'суб', 'суббота', 'sa', 'sat', 'saturday'),
+    6: ('вс', 'вос', 'воскресенье', 'su', 'sun', 'sunday'),
+}
+WEEKDAYS = {alias: day for day, aliases in WEEKDAY_ALIASES.items() for alias in aliases}
+
+
+def parse_schedule_days(value):
+    """Номера дней недели (0 = понедельник) из строки Group.schedule_days, без повторов"""
+    days = []
+    for token in re.split(r'[^\w]+', (value or '').casefold()):
+        day = WEEKDAYS.get(token.replace('ё', 'е'))
+        if day is not None and day not in days:
+            days.append(day)
+    return days
+
+
+def recurring_dates(start_date, end_date, weekdays):
+    """Все даты диапазона, попадающие на указанные дни недели"""
+    dates = []
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in weekdays:
+            dates.append(day)
+        day += datetime.timedelta(days=1)
+    return dates
+
+
+class IntervalIndex:
+    """
+    Индекс занятых интервалов по ключу (ресурс, дата).
+
+    Интервалы ключа хранятся отсортированными по началу; поиск пересечений —
+    bisect по началу плюс обратный проход, ограниченный самым длинным
+    интервалом ключа, т.е. O(log n + k) вместо полного перебора.
+    """
+
+    def __init__(self):
+        self.starts = defaultdict(list)
+        self.items = defaultdict(list)
+        self.longest = defaultdict(int)
+
+    def add(self, key, start, end, value):
+        start, end = _minutes(start), _minutes(end)
+        position = bisect.bisect_right(self.starts[key], start)
+        self.starts[key].insert(position, start)
+        self.items[key].insert(position, (start, end, value))
+        self.longest[key] = max(self.longest[key], end - start)
+
+    def overlaps(self, key, start, end):
+        start, end = _minutes(start), _minutes(end)
+        starts, items = self.starts.get(key), self.items.get(key)
+        if not starts:
+            return []
+
+        found = []
+        lower_bound = start - self.longest[key]
+        position = bisect.bisect_left(starts, end) - 1
+        while position >= 0 and starts[position] > lower_bound:
+            item_start, item_end, value = items[position]
+            if item_end > start:
+                found.append(value)
+            position -= 1
+        return found
+
+
+def plan_recurring_schedule(group, classroom, teacher, dates, start_time, end_time, note=''):
+    """
+    Раскладывает повторяющиеся занятия по датам.
+
+    Существующее расписание кабинета и преподавателя за весь диапазон читается
+    одним запросом, пересечения проверяются по IntervalIndex. Возвращает
+    (несохранённые Schedule без конфликтов, список конфликтов).
+    """
+    index = IntervalIndex()
+    if dates:
+        for row in Schedule.objects.filter(
+            Q(classroom=classroom) | Q(teacher=teacher),
+            date__range=(dates[0], dates[-1]),
+        ).values('id', 'classroom_id', 'teacher_id', 'date', 'start_time', 'end_time'):
+            index.add(('classroom', row['classroom_id'], row['date']), row['start_time'], row['end_time'], row['id'])
+            index.add(('teacher', row['teacher_id'], row['date']), row['start_time'], row['end_time'], row['id'])
+
+    planned, conflicts = [], []
+    for day in dates:
+        problems = []
+        for resource, resource_id, message in (
+            ('classroom', classroom.id, "Кабинет уже занят в это время"),
+            ('teacher', teacher.id, "Преподаватель уже занят в это время"),
+        ):
+            busy = index.overlaps((resource, resource_id, day), start_time, end_time)
+            if busy:
+                problems.append({'reason': message, 'schedule_ids': sorted(i for i in busy if i is not None)})
+
+        if problems:
+            conflicts.append({
+                'date': day,
+                'start_time': start_time,
+                'end_time': end_time,
+                'conflicts': problems,
+            })
+            continue
+
+        lesson = Schedule(
+            classroom=classroom, group=group, teacher=teacher, date=day,
+            start_time=start_time, end_time=end_time, note=note
+        )
+        planned.append(lesson)
+        index.add(('classroom', classroom.id, day), start_time, end_time, None)
+        index.add(('teacher', teacher.id, day), start_time, end_time, None)
+
+    return planned, conflicts
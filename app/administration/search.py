@@ -0,0 +1,219 @@
+import math
+import re
+
+from django.db import transaction
+from django.db.models import Count
+
+from app.administration.models import Group, Lead, SearchEntry, SearchTrigram
+from app.users.models import CustomUser
+
+
+# Кириллица (русский и кыргызский алфавит) -> латиница: "Иванов" и "Ivanov" дают одни триграммы
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'ң': 'n', 'о': 'o', 'ө': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ү': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+TRANSLIT_TABLE = str.maketrans(TRANSLIT)
+
+# Минимальная доля совпавших триграмм запроса для глобального поиска (допуск опечаток)
+SIMILARITY_THRESHOLD = 0.4
+# Таблицы переходят на индекс с этой длины запроса; короче — обычный icontains
+MIN_INDEXED_QUERY = 3
+
+USER_KINDS = {'Student': 'student', 'Teacher': 'teacher'}
+
+
+def normalize(text):
+    """casefold, ё -> е, транслитерация в латиницу; возвращает список слов"""
+    text = (text or '').casefold().translate(TRANSLIT_TABLE)
+    return re.findall(r'[^\W_]+', text)
+
+
+def word_trigrams(word, prefix_only=False):
+    """
+    Триграммы слова в стиле pg_trgm: слово дополняется двумя пробелами слева
+    и одним справа. prefix_only не добавляет правый пробел — для поиска по
+    началу слова, пока пользователь ещё печатает.
+    """
+    padded = f'  {word}' if prefix_only else f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def document_trigrams(words):
+    trigrams = set()
+    for word in words:
+        trigrams |= word_trigrams(word)
+    return trigrams
+
+
+def query_trigrams(query):
+    """Триграммы запроса для ранжированного поиска: последнее слово — как префикс"""
+    words = normalize(query)
+    trigrams = set()
+    for position, word in enumerate(words):
+        trigrams |= word_trigrams(word, prefix_only=position == len(words) - 1)
+    return trigrams
+
+
+def substring_trigrams(query):
+    """
+    Триграммы, которые обязательно есть в тексте, содержащем слова запроса:
+    внутренние триграммы длинных слов и начало слова для коротких.
+    """
+    trigrams = set()
+    for word in normalize(query):
+        if len(word) >= 3:
+            trigrams |= {word[i:i + 3] for i in range(len(word) - 2)}
+        else:
+            trigrams |= word_trigrams(word, prefix_only=True)
+    return trigrams
+
+
+# ---------------------------------------------------------------- индексация
+
+def user_document(user):
+    return f"{user.last_name} {user.first_name}".strip() or user.username, [
+        user.first_name, user.last_name, user.username,
+    ]
+
+
+def group_document(group):
+    return group.group_name, [group.group_name, group.direction.name if group.direction_id else '']
+
+
+def lead_document(lead):
+    phone = re.sub(r'\D', '', lead.phone or '')
+    return lead.name, [lead.name, phone, lead.email or '', lead.course]
+
+
+def build_entry(kind, object_id, label, parts):
+    words = normalize(' '.join(part for part in parts if part))
+    entry = SearchEntry(kind=kind, object_id=object_id, label=label[:255], text=' '.join(words))
+    return entry, document_trigrams(words)
+
+
+def write_entries(documents):
+    """Сохраняет записи индекса и их триграммы пачкой"""
+    pairs = [build_entry(*document) for document in documents]
+    entries = SearchEntry.objects.bulk_create([entry for entry, _ in pairs], batch_size=1000)
+    SearchTrigram.objects.bulk_create([
+        SearchTrigram(entry=entry, trigram=trigram)
+        for entry, (_, trigrams) in zip(entries, pairs)
+        for trigram in trigrams
+    ], batch_size=5000)
+
+
+def remove(kinds, object_ids):
+    SearchEntry.objects.filter(kind__in=kinds, object_id__in=object_ids).delete()
+
+
+def index_user(user):
+    with transaction.atomic():
+        remove(USER_KINDS.values(), [user.id])
+        kind = USER_KINDS.get(user.role)
+        if kind:
+            write_entries([(kind, user.id, *user_document(user))])
+
+
+def index_groups(groups):
+    groups = list(groups)
+    with transaction.atomic():
+        remove(['group'], [group.id for group in groups])
+        write_entries([('group', group.id, *group_document(group)) for group in groups])
+
+
+def index_lead(lead):
+    with transaction.atomic():
+        remove(['lead'], [lead.id])
+        write_entries([('lead', lead.id, *lead_document(lead))])
+
+
+def rebuild_index():
+    """Полная перестройка индекса; возвращает число проиндексированных объектов"""
+    documents = [
+        (USER_KINDS[user.role], user.id, *user_document(user))
+        for user in CustomUser.objects.filter(role__in=USER_KINDS)
+    ]
+    documents += [('group', group.id, *group_document(group)) for group in Group.objects.select_related('direction')]
+    documents += [('lead', lead.id, *lead_document(lead)) for lead in Lead.objects.all()]
+
+    with transaction.atomic():
+        SearchTrigram.objects.all().delete()
+        SearchEntry.objects.all().delete()
+        write_entries(documents)
+    return len(documents)
+
+
+def ensure_index():
+    """
+    Строит индекс, если он пуст, а индексируемые объекты уже есть: сигналы
+    видят только новые записи, строки, созданные до индекса, иначе не ищутся.
+    Возвращает число проиндексированных объектов (0, если индекс уже был).
+    """
+    if SearchEntry.objects.exists():
+        return 0
+    if not (
+        CustomUser.objects.filter(role__in=USER_KINDS).exists()
+        or Group.objects.exists() or Lead.objects.exists()
+    ):
+        return 0
+    return rebuild_index()
+
+
+# ---------------------------------------------------------------------- поиск
+
+def is_indexed_query(query):
+    return len(''.join(normalize(query))) >= MIN_INDEXED_QUERY
+
+
+def matching_ids(kind, query):
+    """
+    Подзапрос с id объектов, в тексте которых есть все слова запроса.
+    Используется таблицами вместо icontains по нескольким колонкам.
+    """
+    trigrams = substring_trigrams(query)
+    return SearchTrigram.objects.filter(
+        entry__kind=kind, trigram__in=trigrams
+    ).values('entry__object_id').annotate(
+        hits=Count('trigram', distinct=True)
+    ).filter(hits=len(trigrams)).values('entry__object_id')
+
+
+def search(query, kinds=None, limit=20):
+    """
+    Ранжированный глобальный поиск с допуском опечаток.
+
+    Оценка — доля триграмм запроса, найденных в записи, плюс бонус, если
+    слово записи начинается с последнего слова запроса.
+    """
+    trigrams = query_trigrams(query)
+    if not trigrams:
+        return []
+
+    candidates = SearchTrigram.objects.filter(trigram__in=trigrams)
+    if kinds:
+        candidates = candidates.filter(entry__kind__in=kinds)
+    minimum = max(1, math.ceil(len(trigrams) * SIMILARITY_THRESHOLD))
+    hits = dict(
+        candidates.values('entry').annotate(
+            hits=Count('trigram', distinct=True)
+        ).filter(hits__gte=minimum).order_by('-hits').values_list('entry', 'hits')[:limit * 5]
+    )
+
+    last_word = normalize(query)[-1]
+    results = []
+    for entry in SearchEntry.objects.filter(id__in=hits):
+        score = hits[entry.id] / len(trigrams)
+        if any(word.startswith(last_word) for word in entry.text.split()):
+            score += 0.5
+        results.append({
+            'kind': entry.kind,
+            'id': entry.object_id,
+            'label': entry.label,
+            'score': round(score, 3),
+        })
+
+    results.sort(key=lambda item: (-item['score'], item['label']))
+    return results[:limit]
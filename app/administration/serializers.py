@@ -1,5 +1,6 @@
 from rest_framework import serializers
 import datetime
+from collections import defaultdict
 from django.utils import timezone
 from django.db.models import Sum, Avg
 
@@ -7,8 +8,10 @@ from app.administration.models import (
     Direction, Group, Teacher, Student, Lesson, Attendance, Payment, 
     Months, TeacherPayment, Income, Expense, Invoice,
     FinancialReport, Course, Schedule, Classroom, Lead, HomeworkSubmission, 
-    PaymentNotification
+    PaymentNotification, AttendanceSummary, BackgroundJob
     )
+from app.administration.rollups import period_totals, report_totals, snapshot_totals
+from app.administration.scheduling import build_day_grid, parse_schedule_days
 from app.users.models import CustomUser
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -76,18 +79,22 @@ class HomeworkListSerializer(serializers.ModelSerializer):
             'has_submission', 'submission_status'
         ]
     
-    def get_has_submission(self, obj):
+    def get_submission(self, obj):
+        # Работы пользователя предзагружены в user_submissions (см. HomeworkListView.get_queryset)
+        submissions = getattr(obj, 'user_submissions', None)
+        if submissions is not None:
+            return submissions[0] if submissions else None
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.homework_submissions.filter(student=request.user).exists()
-        return False
+            return obj.homework_submissions.filter(student=request.user).first()
+        return None
+
+    def get_has_submission(self, obj):
+        return self.get_submission(obj) is not None
     
     def get_submission_status(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            submission = obj.homework_submissions.filter(student=request.user).first()
-            return submission.status if submission else 'not_submitted'
-        return 'not_submitted'
+        submission = self.get_submission(obj)
+        return submission.status if submission else 'not_submitted'
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -167,7 +174,7 @@ class TeacherCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     first_name = serializers.CharField(write_only=True)
     last_name = serializers.CharField(write_only=True)
-    age = serializers.CharField(write_only=True, required=True)
+    age = serializers.IntegerField(write_only=True, required=True, min_value=1, max_value=120)
     phone = serializers.CharField(write_only=True, required=False)
     telegram = serializers.CharField(write_only=True, required=False)
     
@@ -272,7 +279,7 @@ class StudentCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     first_name = serializers.CharField(write_only=True)
     last_name = serializers.CharField(write_only=True)
-    age = serializers.CharField(write_only=True, required=True)
+    age = serializers.IntegerField(write_only=True, required=True, min_value=1, max_value=120)
     phone = serializers.CharField(write_only=True, required=False)
     telegram = serializers.CharField(write_only=True, required=False)
 
@@ -343,7 +350,7 @@ class StudentCreateSerializer(serializers.ModelSerializer):
 
 # serializers.py
 class AttendanceSerializer(serializers.ModelSerializer):
-    student_id = serializers.IntegerField(source='student.id', read_only=True)
+    student_id = serializers.IntegerField(read_only=True)
     student = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all(), write_only=True)
     course_number = serializers.SerializerMethodField()
     month_number = serializers.SerializerMethodField()
@@ -359,6 +366,51 @@ class AttendanceSerializer(serializers.ModelSerializer):
         return obj.lesson.month.month_number
 
 
+class AttendanceSummarySerializer(serializers.ModelSerializer):
+    attendance_percent = serializers.ReadOnlyField()
+    recent_percent = serializers.ReadOnlyField()
+
+    class Meta:
+        model = AttendanceSummary
+        fields = [
+            'group', 'total_lessons', 'attended_lessons', 'attendance_percent',
+            'recent_lessons', 'recent_attended', 'recent_percent',
+            'absence_streak', 'last_lesson_date'
+        ]
+
+
+class AttendanceBulkSerializer(serializers.Serializer):
+    """Отметки всей группы за урок: {"lesson": id, "statuses": {student_id: status}}"""
+    lesson = serializers.PrimaryKeyRelatedField(
+        queryset=Lesson.objects.select_related('month__course__group')
+    )
+    statuses = serializers.DictField(
+        child=serializers.ChoiceField(choices=Attendance.STATUS_CHOICES),
+        allow_empty=False
+    )
+
+    def validate(self, data):
+        try:
+            statuses = {int(student_id): value for student_id, value in data['statuses'].items()}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({'statuses': "Ключи должны быть id студентов"})
+
+        # Состав группы читается одним запросом и нужен ещё для ответа
+        group = data['lesson'].month.course.group
+        roster = list(group.students.order_by('last_name', 'first_name', 'id').values(
+            'id', 'first_name', 'last_name'
+        ))
+        unknown = sorted(set(statuses) - {student['id'] for student in roster})
+        if unknown:
+            raise serializers.ValidationError(
+                {'statuses': f"Студенты не состоят в группе {group.group_name}: {unknown}"}
+            )
+
+        data['statuses'] = statuses
+        data['roster'] = roster
+        return data
+
+
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -382,14 +434,25 @@ class PaymentSerializer(serializers.ModelSerializer):
 # serializers.py
 class StudentDetailSerializer(serializers.ModelSerializer):
     attendances = serializers.SerializerMethodField()
+    attendance_summary = serializers.SerializerMethodField()
     payments = serializers.SerializerMethodField()
     
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'first_name', 'last_name', 'age', 'is_active', 
-                 'attendances', 'payments']
+                 'attendances', 'attendance_summary', 'payments']
+
+    def get_attendance_summary(self, obj):
+        # Сводки группы передаются GroupDashboardSerializer'ом, без прохода по истории отметок
+        summary = self.context.get('summaries_by_student', {}).get(obj.id)
+        return AttendanceSummarySerializer(summary).data if summary else None
     
     def get_attendances(self, obj):
+            # Посещаемость заранее загружена GroupDashboardSerializer'ом для всей группы
+            buckets = self.context.get('attendances_by_student')
+            if buckets is not None:
+                return AttendanceSerializer(buckets.get(obj.id, []), many=True).data
+
             group = self.context.get('group')
             if not group:
                 return []
@@ -407,6 +470,10 @@ class StudentDetailSerializer(serializers.ModelSerializer):
     
 
     def get_payments(self, obj):
+            buckets = self.context.get('payments_by_student')
+            if buckets is not None:
+                return GroupPaymentSerializer(buckets.get(obj.id, []), many=True).data
+
             try:
                 group = self.context.get('group')
                 if not group:
@@ -437,18 +504,42 @@ class GroupDashboardSerializer(serializers.ModelSerializer):
         fields = ['id', 'group_name', 'direction', 'teacher', 'courses', 'students']
     
     def get_students(self, obj):
-        students = obj.students.all()
+        students = list(obj.students.all())
+        student_ids = [student.id for student in students]
+        course_ids = [course.id for course in obj.courses.all()]
+
+        # Два запроса на всю группу вместо двух запросов на каждого студента
+        attendances_by_student = defaultdict(list)
+        for attendance in Attendance.objects.filter(
+            student_id__in=student_ids,
+            lesson__month__course_id__in=course_ids
+        ).select_related('lesson__month__course'):
+            attendances_by_student[attendance.student_id].append(attendance)
+
+        payments_by_student = defaultdict(list)
+        for payment in Payment.objects.filter(
+            invoice__student_id__in=student_ids,
+            invoice__course_id__in=course_ids
+        ).select_related('invoice', 'invoice__student'):
+            payments_by_student[payment.invoice.student_id].append(payment)
+
         serializer = StudentDetailSerializer(
             students,
             many=True,
-            context={'group': obj}
+            context={
+                'group': obj,
+                'summaries_by_student': {
+                    summary.student_id: summary for summary in obj.attendance_summaries.all()
+                },
+                'attendances_by_student': attendances_by_student,
+                'payments_by_student': payments_by_student,
+            }
         )
         return serializer.data
 
 
     
 
-
 class GroupTableSerializer(serializers.ModelSerializer):
     direction = serializers.CharField(source='direction.name')
     group = serializers.CharField(source='group_name')
@@ -459,39 +550,16 @@ class GroupTableSerializer(serializers.ModelSerializer):
         model = Group
         fields = ['id', 'direction', 'group', 'course', 'lesson']
 
+    # first_course, last_dated_course и last_lesson_order — аннотации GroupTableViewSet.get_queryset
     def get_course(self, obj):
-        """Определить текущий курс группы"""
-        # Если курсов нет — возвращаем 1
-        if not obj.courses.exists():
-            return 1
-
-        # Логика определения курса — берём максимальный номер курса,
-        # по которому уже есть уроки с датой
-        last_course_with_lesson = (
-            Course.objects.filter(group=obj, months__lessons__date__isnull=False)
-            .order_by('-course_number')
-            .first()
-        )
-
-        if last_course_with_lesson:
-            return last_course_with_lesson.course_number
-
-        # Если уроков с датой нет, берём первый курс
-        return obj.courses.order_by('course_number').first().course_number
+        """Текущий курс: последний курс с датированными уроками, иначе первый; без курсов — 1"""
+        if obj.last_dated_course is not None:
+            return obj.last_dated_course
+        return obj.first_course if obj.first_course is not None else 1
 
     def get_lesson(self, obj):
-        """Получить номер последнего пройденного урока"""
-        try:
-            course_ids = obj.courses.values_list('id', flat=True)
-
-            last_lesson = Lesson.objects.filter(
-                month__course_id__in=course_ids
-            ).order_by('-date', '-order').first()
-
-            return last_lesson.order if last_lesson else 0
-        except Exception as e:
-            print(f"Error getting last lesson: {e}")
-            return 0
+        """Номер последнего пройденного урока"""
+        return obj.last_lesson_order or 0
 
 
 
@@ -503,34 +571,42 @@ class StudentTableSerializer(serializers.ModelSerializer):
     group = serializers.SerializerMethodField()
     direction = serializers.SerializerMethodField()
     teacher = serializers.SerializerMethodField()
+    attendance = serializers.SerializerMethodField()
 
     class Meta:
         model = Student 
-        fields = ['id', 'full_name', 'group', 'direction', 'teacher']
+        fields = ['id', 'full_name', 'group', 'direction', 'teacher', 'attendance']
 
     def get_full_name(self, obj):
         return obj.user.get_full_name() or "-"
 
+    # Группы предзагружены вместе с direction и teacher (см. StudentTableViewSet.get_queryset),
+    # поэтому здесь только проход по списку без запросов
     def get_group(self, obj):
-        groups = obj.groups.all()
-        if groups.exists():
-            return ", ".join([g.group_name for g in groups])
-        return "-"
+        groups = [g.group_name for g in obj.groups.all()]
+        return ", ".join(groups) if groups else "-"
 
     def get_direction(self, obj):
-        directions = set()
-        for group in obj.groups.all():
-            if group.direction:
-                directions.add(group.direction.name)
+        directions = dict.fromkeys(
+            group.direction.name for group in obj.groups.all() if group.direction
+        )
         return ", ".join(directions) if directions else "-"
 
     def get_teacher(self, obj):
-        teachers = set()
-        for group in obj.groups.all():
-            if group.teacher:
-                teachers.add(f"{group.teacher.last_name} {group.teacher.first_name}")
+        teachers = dict.fromkeys(
+            f"{group.teacher.last_name} {group.teacher.first_name}"
+            for group in obj.groups.all() if group.teacher
+        )
         return ", ".join(teachers) if teachers else "-"
 
+    def get_attendance(self, obj):
+        # Сводки по текущим группам студента из user__attendance_summaries
+        group_ids = {group.id for group in obj.groups.all()}
+        return AttendanceSummarySerializer(
+            [summary for summary in obj.user.attendance_summaries.all() if summary.group_id in group_ids],
+            many=True
+        ).data
+
 
 
 # serializers.py
@@ -547,32 +623,26 @@ class TeacherTableSerializer(serializers.ModelSerializer):
     def get_full_name(self, obj):
         return f"{obj.last_name} {obj.first_name}"
 
-    def get_groups(self, obj):
+    # Данные читаются из select_related/prefetch_related и аннотации student_count
+    # (см. TeacherTableViewSet.get_queryset)
+    def get_teacher(self, obj):
         try:
-            # Получаем объект Teacher через обратное отношение
-            teacher = Teacher.objects.get(user=obj)
-            groups = teacher.groups.all()
-            return ", ".join([g.group_name for g in groups]) if groups.exists() else "-"
+            return obj.teacher_add
         except Teacher.DoesNotExist:
-            return "-"
+            return None
+
+    def get_groups(self, obj):
+        teacher = self.get_teacher(obj)
+        groups = [g.group_name for g in teacher.groups.all()] if teacher else []
+        return ", ".join(groups) if groups else "-"
 
     def get_directions(self, obj):
-        try:
-            teacher = Teacher.objects.get(user=obj)
-            directions = teacher.directions.all()
-            return ", ".join([d.name for d in directions]) if directions.exists() else "-"
-        except Teacher.DoesNotExist:
-            return "-"
+        teacher = self.get_teacher(obj)
+        directions = [d.name for d in teacher.directions.all()] if teacher else []
+        return ", ".join(directions) if directions else "-"
 
     def get_student_count(self, obj):
-        try:
-            teacher = Teacher.objects.get(user=obj)
-            count = 0
-            for group in teacher.groups.all():
-                count += group.students.count()
-            return count
-        except Teacher.DoesNotExist:
-            return 0
+        return getattr(obj, 'student_count', 0) if self.get_teacher(obj) else 0
         
 
 
@@ -673,6 +743,20 @@ class TeacherPaymentSerializer(serializers.ModelSerializer):
     def get_balance(self, obj):
         return obj.balance
 
+class FinancialReportListSerializer(serializers.ListSerializer):
+    """Итоги всех живых отчётов списка считаются вместе — три запроса на страницу"""
+
+    def to_representation(self, data):
+        reports = list(data.all() if hasattr(data, 'all') else data)
+        periods = {
+            report.pk: (report.start_date, report.end_date)
+            for report in reports if report.is_live or report.snapshot is None
+        }
+        # Итоги передаются дочернему сериализатору через общий context
+        self.child.context['report_totals'] = period_totals(periods)
+        return super().to_representation(reports)
+
+
 class FinancialReportSerializer(serializers.ModelSerializer):
     report_type_display = serializers.CharField(source='get_report_type_display', read_only=True)
     income_by_type = serializers.SerializerMethodField()
@@ -688,56 +772,47 @@ class FinancialReportSerializer(serializers.ModelSerializer):
         model = FinancialReport
         fields = [
             'id', 'report_type', 'report_type_display', 'start_date', 'end_date',
-            'generated_at', 'total_income', 'total_expenses', 'net_profit',
+            'generated_at', 'is_live', 'frozen_at', 'total_income', 'total_expenses', 'net_profit',
             'income_by_type', 'expenses_by_category', 'top_courses'
         ]
+        read_only_fields = ['is_live', 'frozen_at']
+        list_serializer_class = FinancialReportListSerializer
+
+    def get_totals(self, obj):
+        """
+        Замороженный отчёт отдаёт snapshot, живой — итоги из context['report_totals'],
+        которые заполняет список; одиночный отчёт считается один раз по дневным агрегатам
+        """
+        if not obj.is_live and obj.snapshot is not None:
+            return snapshot_totals(obj.snapshot)
+
+        cache = self.context.setdefault('report_totals', {})
+        if obj.pk not in cache:
+            cache[obj.pk] = report_totals(obj.start_date, obj.end_date)
+        return cache[obj.pk]
 
     def get_total_income(self, obj):
-        """Динамически рассчитываем общий доход за период"""
-        return Payment.objects.filter(
-            date__date__range=[obj.start_date, obj.end_date]
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        return self.get_totals(obj)['total_income']
 
     def get_total_expenses(self, obj):
-        """Динамически рассчитываем общие расходы за период"""
-        return Expense.objects.filter(
-            date__range=[obj.start_date, obj.end_date]
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        return self.get_totals(obj)['total_expenses']
 
     def get_net_profit(self, obj):
-        """Динамически рассчитываем чистую прибыль"""
-        return self.get_total_income(obj) - self.get_total_expenses(obj)
-
-    # Остальные методы (income_by_type, expenses_by_category, top_courses) остаются без изменений
-    # ...
+        return self.get_totals(obj)['net_profit']
 
     def get_income_by_type(self, obj):
-        payments = Payment.objects.filter(
-            date__date__range=[obj.start_date, obj.end_date]
-        ).values('payment_type').annotate(total=Sum('amount'))
-        return {p['payment_type']: float(p['total']) for p in payments}
+        return self.get_totals(obj)['income_by_type']
 
     def get_expenses_by_category(self, obj):
-        expenses = Expense.objects.filter(
-            date__range=[obj.start_date, obj.end_date]
-        ).values('category').annotate(total=Sum('amount'))
-        return {e['category']: float(e['total']) for e in expenses}
+        return self.get_totals(obj)['expenses_by_category']
 
     def get_top_courses(self, obj):
-        from django.db.models import Sum
-        courses = Invoice.objects.filter(
-            date_created__date__range=[obj.start_date, obj.end_date]
-        ).values('course__group__direction__name').annotate(
-            total=Sum('amount')
-        ).order_by('-total')[:5]
-        
-        return {c['course__group__direction__name']: float(c['total']) 
-                for c in courses if c['course__group__direction__name']}
+        return self.get_totals(obj)['top_courses']
 
 # serializers.py
 class GroupPaymentSerializer(serializers.ModelSerializer):
     final_amount = serializers.DecimalField(source='invoice.final_amount', max_digits=10, decimal_places=2)
-    paid_amount = serializers.DecimalField(source='invoice.paid_amount', max_digits=10, decimal_places=2)
+    paid_amount = serializers.DecimalField(source='invoice.paid_total', max_digits=10, decimal_places=2)
     balance = serializers.DecimalField(source='invoice.balance', max_digits=10, decimal_places=2)
     payment_type_display = serializers.CharField(source='get_payment_type_display', read_only=True)
     student_name = serializers.CharField(source='invoice.student.get_full_name', read_only=True)
@@ -796,46 +871,104 @@ class ScheduleSerializer(serializers.ModelSerializer):
         
         return data
 
+class InvoicePdfSerializer(serializers.Serializer):
+    """Счета для пакетного PDF: {"ids": [id, ...], "combine": false}"""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    combine = serializers.BooleanField(default=False)
+
+
+class ScheduleBulkSerializer(serializers.Serializer):
+    """Повторяющиеся занятия группы по дням из Group.schedule_days"""
+    group = serializers.PrimaryKeyRelatedField(queryset=Group.objects.all())
+    classroom_id = serializers.PrimaryKeyRelatedField(
+        queryset=Classroom.objects.all(),
+        source='classroom'
+    )
+    teacher = serializers.PrimaryKeyRelatedField(
+        queryset=CustomUser.objects.filter(role='Teacher'),
+        required=False
+    )
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField(required=False)
+    note = serializers.CharField(required=False, allow_blank=True, default='')
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+    max_days = 366
+
+    def validate(self, data):
+        group = data['group']
+
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("Дата окончания раньше даты начала")
+        if (data['end_date'] - data['start_date']).days >= self.max_days:
+            raise serializers.ValidationError(f"Диапазон не может превышать {self.max_days} дней")
+
+        data.setdefault('teacher', group.teacher)
+        if data['teacher'] is None:
+            raise serializers.ValidationError({'teacher': "У группы не назначен преподаватель"})
+
+        if 'end_time' not in data:
+            start = datetime.datetime.combine(data['start_date'], data['start_time'])
+            data['end_time'] = (start + datetime.timedelta(hours=group.lesson_duration)).time()
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("Время окончания должно быть позже времени начала")
+
+        # Дни недели берутся из schedule_days, но не больше lessons_per_week
+        weekdays = parse_schedule_days(group.schedule_days)
+        if group.lessons_per_week:
+            weekdays = weekdays[:group.lessons_per_week]
+        if not weekdays:
+            raise serializers.ValidationError(
+                {'group': f"Не удалось определить дни занятий из '{group.schedule_days}'"}
+            )
+        data['weekdays'] = weekdays
+        return data
+
+
 class DailyScheduleSerializer(serializers.Serializer):
     date = serializers.DateField()
     classrooms = serializers.SerializerMethodField()
     
     def get_classrooms(self, obj):
-        date = obj['date']
-        classrooms = Classroom.objects.all()
-        schedule = Schedule.objects.filter(date=date).select_related('classroom', 'group', 'teacher')
-        
-        result = []
-        for classroom in classrooms:
-            classroom_data = ClassroomSerializer(classroom).data
-            classroom_data['schedule'] = []
-            
-            for hour in range(9, 21):  # С 9:00 до 20:00
-                time_slot = {
-                    'time': f"{hour}:00",
-                    'lesson': None
-                }
-                
-                for lesson in schedule:
-                    if lesson.classroom == classroom:
-                        lesson_start = lesson.start_time.hour
-                        lesson_end = lesson.end_time.hour
-                        
-                        if hour >= lesson_start and hour < lesson_end:
-                            time_slot['lesson'] = {
-                                'id': lesson.id,
-                                'group': lesson.group.group_name,
-                                'teacher': lesson.get_teacher_name(),
-                                'note': lesson.note
-                            }
-                            break
-                
-                classroom_data['schedule'].append(time_slot)
-            
-            result.append(classroom_data)
-        
-        return result
-    
+        # Кабинеты и занятия можно передать готовыми (режим диапазона дат)
+        classrooms = obj.get('classrooms')
+        if classrooms is None:
+            classrooms = ClassroomSerializer(Classroom.objects.all(), many=True).data
+        schedule = obj.get('schedule')
+        if schedule is None:
+            schedule = Schedule.objects.filter(date=obj['date']).select_related('group', 'teacher')
+        return build_day_grid(classrooms, schedule, obj.get('slot', 60))
+
+
+class ScheduleRangeSerializer(serializers.Serializer):
+    """Сетка расписания всех кабинетов за диапазон дат, собранная из двух запросов"""
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    slot = serializers.IntegerField()
+    days = serializers.SerializerMethodField()
+
+    def get_days(self, obj):
+        classrooms = ClassroomSerializer(Classroom.objects.all(), many=True).data
+
+        by_date = defaultdict(list)
+        for lesson in Schedule.objects.filter(
+            date__range=(obj['start_date'], obj['end_date'])
+        ).select_related('group', 'teacher'):
+            by_date[lesson.date].append(lesson)
+
+        days = []
+        day = obj['start_date']
+        while day <= obj['end_date']:
+            days.append(DailyScheduleSerializer({
+                'date': day,
+                'classrooms': classrooms,
+                'schedule': by_date.get(day, []),
+                'slot': obj['slot'],
+            }).data)
+            day += datetime.timedelta(days=1)
+        return days
 
 
 class ScheduleListSerializer(serializers.ModelSerializer):
@@ -1026,8 +1159,8 @@ class DashboardStatsSerializer(serializers.Serializer):
 
 
 class HomeworkSubmissionSerializer(serializers.ModelSerializer):
-    lesson_title = serializers.CharField(source='lesson.title')
-    lesson_number = serializers.IntegerField(source='lesson.order')
+    lesson_title = serializers.CharField(source='lesson.title', read_only=True)
+    lesson_number = serializers.IntegerField(source='lesson.order', read_only=True)
     course_number = serializers.SerializerMethodField()
     month_number = serializers.SerializerMethodField()
     month_title = serializers.SerializerMethodField()
@@ -1056,6 +1189,8 @@ class HomeworkSubmissionSerializer(serializers.ModelSerializer):
             'feedback'
         ]
         ref_name = "TeacherHomeworkSubmissionSerializer"
+        # Урок и студента задаёт HomeworkSubmissionView из URL и пользователя
+        read_only_fields = ['lesson', 'student']
 
     def get_course_number(self, obj):
         return obj.lesson.month.course.course_number if hasattr(obj.lesson, 'month') else None
@@ -1079,4 +1214,18 @@ class HomeworkSubmissionSerializer(serializers.ModelSerializer):
 class PaymentNotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaymentNotification
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class BackgroundJobSerializer(serializers.ModelSerializer):
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = BackgroundJob
+        fields = [
+            'id', 'kind', 'kind_display', 'status', 'status_display', 'progress', 'progress_message',
+            'payload', 'result', 'error', 'attempts', 'max_attempts', 'run_after',
+            'created_by', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
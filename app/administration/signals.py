@@ -0,0 +1,174 @@
+from django.core.management import call_command
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from app.administration import search
+from app.administration.attendance_summaries import refresh_for_lessons
+from app.administration.caching import bump_analytics_version, bump_facets_version, invalidate_dashboard
+from app.administration.models import (
+    Attendance, Course, Direction, Expense, Group, Invoice, Lead, Lesson, Payment, Schedule
+)
+from app.administration.rollups import local_date, refresh_days
+from app.users.models import CustomUser
+
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=Attendance)
+@receiver([post_save, post_delete], sender=CustomUser)
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=Schedule)
+def reset_admin_dashboard(sender, update_fields=None, **kwargs):
+    """Сбрасывает кэш дашборда при изменении данных, из которых он собирается"""
+    # Вход пользователя обновляет только last_login — на дашборд это не влияет
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_dashboard()
+
+
+# Дневные агрегаты финансов: пересчитываются дни до и после изменения записи
+
+ROLLUP_FIELDS = {
+    Payment: ('payments', 'date'),
+    Expense: ('expenses', 'date'),
+    Invoice: ('invoices', 'date_created'),
+}
+
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=Expense)
+@receiver([post_save, post_delete], sender=Invoice)
+def refresh_finance_rollups(sender, instance, update_fields=None, **kwargs):
+    # update_status() меняет только оплаченную сумму и статус — на агрегаты это не влияет
+    if update_fields and not set(update_fields) & {'date_created', 'amount', 'course'}:
+        return
+
+    # Прежние значения — из from_db или прошлого сохранения (LoadedValuesMixin)
+    kind, field = ROLLUP_FIELDS[sender]
+    refresh_days(kind, [local_date(instance.loaded_value(field)), local_date(getattr(instance, field))])
+
+    # Смена курса счёта меняет направление его платежей
+    if sender is Invoice and instance.loaded_value('course_id') not in (None, instance.course_id):
+        refresh_days('payments', [
+            local_date(value) for value in instance.payments.values_list('date', flat=True)
+        ])
+
+    instance.remember_values(field, 'course_id')
+
+
+# Направление, к которому агрегаты относят счёт и платёж: курс -> группа -> направление
+DIRECTION_PATHS = {
+    Group: ('direction_id', 'course__group'),
+    Course: ('group_id', 'course'),
+}
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=Course)
+def refresh_rollup_directions(sender, instance, **kwargs):
+    """Смена направления группы или группы курса переносит её счета и платежи в другое направление"""
+    field, lookup = DIRECTION_PATHS[sender]
+    if instance.loaded_value(field) not in (None, getattr(instance, field)):
+        invoices = Invoice.objects.filter(**{lookup: instance})
+        refresh_days('invoices', [
+            local_date(value) for value in invoices.values_list('date_created', flat=True)
+        ])
+        refresh_days('payments', [
+            local_date(value)
+            for value in Payment.objects.filter(invoice__in=invoices).values_list('date', flat=True)
+        ])
+    instance.remember_values(field)
+
+
+@receiver([post_save, post_delete], sender=Direction)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=CustomUser)
+def reset_table_facets(sender, update_fields=None, **kwargs):
+    """Новая версия фильтров таблиц: старый кэш и ETag перестают совпадать"""
+    # Вход пользователя обновляет только last_login — имена не меняются
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_facets_version()
+
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=Direction)
+@receiver([post_save, post_delete], sender=Group)
+@receiver(m2m_changed, sender=Group.students.through)
+def reset_analytics(sender, **kwargs):
+    """Новая версия кэша аналитики направлений (доход, ученики, группы)"""
+    bump_analytics_version()
+
+
+# Сводки посещаемости: пересчитываются пары (студент, группа) до и после изменения отметки
+
+@receiver([post_save, post_delete], sender=Attendance)
+def refresh_attendance_summary(sender, instance, **kwargs):
+    previous = (instance.loaded_value('student_id'), instance.loaded_value('lesson_id'))
+    refresh_for_lessons([previous, (instance.student_id, instance.lesson_id)])
+    instance.remember_values('student_id', 'lesson_id')
+
+
+@receiver(post_save, sender=Lesson)
+def refresh_summaries_for_lesson_date(sender, instance, created=False, **kwargs):
+    # Дата урока влияет на окно "за 30 дней" и на порядок серии пропусков
+    if not created and instance.date != instance.loaded_value('date'):
+        refresh_for_lessons(
+            (student_id, instance.id)
+            for student_id in instance.attendances.values_list('student_id', flat=True)
+        )
+    instance.remember_values('date')
+
+
+# Поисковый индекс
+
+@receiver(post_save, sender=CustomUser)
+def index_user_for_search(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    search.index_user(instance)
+
+
+@receiver(post_save, sender=Group)
+def index_group_for_search(sender, instance, **kwargs):
+    search.index_groups([instance])
+
+
+@receiver(post_save, sender=Direction)
+def index_direction_groups_for_search(sender, instance, created=False, **kwargs):
+    # Название направления входит в текст групп
+    if not created:
+        search.index_groups(instance.groups.select_related('direction'))
+
+
+LEAD_SEARCH_FIELDS = ('name', 'phone', 'email', 'course')
+
+
+@receiver(post_save, sender=Lead)
+def index_lead_for_search(sender, instance, created=False, **kwargs):
+    # Смена статуса заявки не меняет текст индекса
+    if created or any(getattr(instance, field) != instance.loaded_value(field) for field in LEAD_SEARCH_FIELDS):
+        search.index_lead(instance)
+        instance.remember_values(*LEAD_SEARCH_FIELDS)
+
+
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Lead)
+def remove_from_search(sender, instance, **kwargs):
+    kinds = {CustomUser: search.USER_KINDS.values(), Group: ['group'], Lead: ['lead']}[sender]
+    search.remove(kinds, [instance.id])
+
+
+@receiver(post_migrate)
+def fill_search_index(sender, **kwargs):
+    """После migrate индексирует данные, которые существовали до поискового индекса"""
+    if sender.name == 'app.administration':
+        search.ensure_index()
+
+
+@receiver(post_migrate)
+def create_cache_table(sender, using='default', verbosity=1, **kwargs):
+    """Таблица DatabaseCache создаётся вместе с migrate, без отдельного createcachetable"""
+    if sender.name == 'app.administration':
+        call_command('createcachetable', database=using, verbosity=verbosity)
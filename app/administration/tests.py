@@ -1,3 +1,2110 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.signals import post_migrate
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from app.administration.caching import FACETS_VERSION_KEY, facets_version
+from app.administration.models import (
+    Attendance, BackgroundJob, Classroom, Course, DailyExpenseRollup, DailyInvoiceRollup, DailyPaymentRollup, Direction,
+    Expense, FinancialReport, Group, HomeworkSubmission, Income, Invoice, Lead, Lesson, Months, Payment,
+    PaymentNotification, Schedule, SearchEntry, AttendanceSummary, Student, Teacher, TeacherPayment
+)
+from app.administration.jobs import HANDLERS, claim_next, enqueue, requeue_stale, run_job
+from app.administration.management.commands.benchmark_endpoints import ENDPOINTS as BENCHMARK_ENDPOINTS
+from app.administration.management.commands.check_query_plans import Command as CheckQueryPlansCommand
+from app.administration.payroll import calculate_teacher_payments
+from app.administration.rollups import period_totals, report_totals
+from app.administration.scheduling import IntervalIndex, parse_schedule_days
+from app.administration.search import ensure_index, normalize
+from app.administration.serializers import FinancialReportSerializer, StudentCreateSerializer, TeacherCreateSerializer
+from app.pdf import IMAGE_CACHE_SIZE, PdfRenderer, render_many
+from app.users.models import CustomUser
+
+
+class SchoolSeedMixin:
+    """
+    Синтетическая школа для тестов: направления, группы, курсы, месяцы, уроки,
+    посещаемость, счета, платежи, расписание, заявки и финансы.
+
+    seed_school() можно вызывать повторно — каждый вызов добавляет новую порцию
+    строк, а объекты первого вызова остаются «основными» (self.ids) для URL.
+    """
+
+    def seed_school(self, directions=2, groups_per_direction=2, students_per_group=3):
+        if not hasattr(self, 'seed_round'):
+            self.seed_round = 0
+            self.ids = {}
+            self.admin = CustomUser.objects.create_user('admin', 'pass', role='Administrator', age=35)
+            self.manager = CustomUser.objects.create_user('manager', 'pass', role='Manager', age=30)
+        self.seed_round += 1
+        tag = self.seed_round
+        now = timezone.now()
+        today = timezone.localdate()
+
+        for d in range(directions):
+            direction = Direction.objects.create(name=f'Direction {tag}-{d}')
+            classroom = Classroom.objects.create(number=f'{tag}{d:02d}', capacity=12)
+
+            for g in range(groups_per_direction):
+                teacher = CustomUser.objects.create_user(
+                    f'teacher{tag}-{d}-{g}', 'pass', role='Teacher',
+                    first_name=f'Teacher{g}', last_name=f'Lastname{d}', age=40
+                )
+                profile = Teacher.objects.create(
+                    user=teacher, payment_type='hourly', payment_amount=500
+                )
+                group = Group.objects.create(
+                    group_name=f'Group {tag}-{d}-{g}', direction=direction, age_group='12-14',
+                    format='offline', duration_months=6, planned_start=today, lessons_per_month=8,
+                    lesson_duration=2, lessons_per_week=2, schedule_days='Пн, Ср', teacher=teacher
+                )
+                profile.groups.add(group)
+                profile.directions.add(direction)
+
+                course = Course.objects.create(group=group, course_number=1)
+                lessons = []
+                for m in range(1, 3):
+                    month = Months.objects.create(
+                        course=course, month_number=m, title=f'Month {m}', description=''
+                    )
+                    for order in range(1, 4):
+                        lessons.append(Lesson.objects.create(
+                            month=month, title=f'Lesson {m}.{order}', description='', order=order,
+                            date=now - datetime.timedelta(days=order + (m - 1) * 7),
+                            homework_description='Homework'
+                        ))
+
+                for hour in (10, 14):
+                    Schedule.objects.create(
+                        classroom=classroom, group=group, teacher=teacher,
+                        start_time=datetime.time(hour + g * 2), end_time=datetime.time(hour + g * 2 + 1),
+                        date=today
+                    )
+
+                students = []
+                for s in range(students_per_group):
+                    student = CustomUser.objects.create_user(
+                        f'student{tag}-{d}-{g}-{s}', 'pass', role='Student',
+                        first_name=f'Student{s}', last_name=f'Family{g}', age=12 + s,
+                        date_joined=now - datetime.timedelta(days=s * 10)
+                    )
+                    Student.objects.create(user=student)
+                    students.append(student)
+
+                # Основной студент записывается и в новые группы, чтобы его история тоже росла
+                if 'student' in self.ids:
+                    students.append(self.ids['student'])
+
+                for student in students:
+                    student_profile = student.student_add
+                    student_profile.groups.add(group)
+                    student_profile.directions.add(direction)
+                    group.students.add(student)
+
+                    for i, lesson in enumerate(lessons):
+                        Attendance.objects.create(lesson=lesson, student=student, status=('1', '0', 'online')[i % 3])
+                        HomeworkSubmission.objects.create(
+                            lesson=lesson, student=student, project_links='https://example.com/p',
+                            files='https://example.com/f', status='orange', score=80
+                        )
+
+                    invoice = Invoice.objects.create(
+                        student=student, course=course, amount=5000, due_date=today
+                    )
+                    Payment.objects.create(invoice=invoice, amount=2000, payment_type='cash')
+                    Payment.objects.create(invoice=invoice, amount=1000, payment_type='online')
+
+                Income.objects.create(
+                    direction=direction, amount=3000, date=today, payment_method='cash',
+                    student=students[0], group=group
+                )
+                Expense.objects.create(
+                    category='salary', description='Salary', amount=1500, date=today, teacher=teacher
+                )
+                TeacherPayment.objects.create(
+                    teacher=teacher, lessons_count=6, rate=500, payment=6000,
+                    date=today - datetime.timedelta(days=tag)
+                )
+                Lead.objects.create(name=f'Lead {tag}-{d}-{g}', phone='+996700000000', course=direction.name)
+
+                self.ids.setdefault('group', group.id)
+                self.ids.setdefault('teacher', teacher)
+                self.ids.setdefault('teacher_profile', profile.id)
+                self.ids.setdefault('student', students[0])
+                self.ids.setdefault('student_profile', students[0].student_add.id)
+                self.ids.setdefault('lesson', lessons[0].id)
+                self.ids.setdefault('month', lessons[0].month_id)
+
+        FinancialReport.objects.create(
+            report_type='monthly', start_date=today.replace(day=1), end_date=today
+        )
+        PaymentNotification.objects.create(
+            recipient_name=f'Recipient {tag}', due_date=today, message_text='Text', amount=5000
+        )
+        BackgroundJob.objects.create(kind='financial_report', payload={'report_type': 'monthly'}, created_by=self.admin)
+
+        # Маршруты, меняющие состояние объекта (ROUTE_OBJECTS), получают свежий объект на каждый прогон
+        self.ids['open_lesson'] = Lesson.objects.create(
+            month_id=self.ids['month'], title=f'Open lesson {tag}', description='', order=10 + tag,
+            homework_description='Homework'
+        ).id
+        self.ids['failed_job'] = BackgroundJob.objects.create(
+            kind='financial_report', payload={'report_type': 'monthly'}, created_by=self.admin,
+            status='failed', error='Timeout'
+        ).id
+
+        # Основные объекты первого прогона — на них строятся detail-URL
+        first = {
+            'attendance': Attendance.objects.order_by('id').first().id,
+            'invoice': Invoice.objects.order_by('id').first().id,
+            'payment': Payment.objects.order_by('id').first().id,
+            'income': Income.objects.order_by('id').first().id,
+            'expense': Expense.objects.order_by('id').first().id,
+            'teacher_payment': TeacherPayment.objects.order_by('id').first().id,
+            'report': FinancialReport.objects.order_by('id').first().id,
+            'classroom': Classroom.objects.order_by('id').first().id,
+            'schedule': Schedule.objects.order_by('id').first().id,
+            'lead': Lead.objects.order_by('id').first().id,
+            'notification': PaymentNotification.objects.order_by('id').first().id,
+            'submission': HomeworkSubmission.objects.order_by('id').first().id,
+            'job': BackgroundJob.objects.order_by('id').first().id,
+        }
+        for key, value in first.items():
+            self.ids.setdefault(key, value)
+
+
+# Кэш в памяти для тестов, считающих запросы: в продакшене DatabaseCache добавляет
+# чтения и записи cache_table, которые зависят от попаданий в кэш, а не от эндпоинта
+QUERY_COUNT_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Бюджет SQL-запросов на маршрут: (роль, метод, максимум запросов) для успешного ответа.
+# Маршрут записан так, как он выглядит в urls.py (router-регэкспы приведены к виду <pk>).
+# Запросы к cache_table в бюджет не входят: тесты с бюджетами работают с QUERY_COUNT_CACHES.
+ENDPOINT_BUDGETS = {
+    '': ('admin', 'get', 0),
+    'table-filters/': ('admin', 'get', 3),
+    'search/': ('admin', 'get', 2),
+    'groups/': ('admin', 'get', 2),
+    'groups/<pk>/': ('admin', 'get', 2),
+    'teachers-add/': ('admin', 'get', 3),
+    'teachers-add/<pk>/': ('admin', 'get', 3),
+    'students-add/': ('admin', 'get', 3),
+    'students-add/<pk>/': ('admin', 'get', 3),
+    'lessons-add/': ('admin', 'get', 1),
+    'lessons-add/<pk>/': ('admin', 'get', 1),
+    'lessons/': ('admin', 'get', 1),
+    'lessons/<pk>/': ('admin', 'get', 1),
+    'attendances/': ('teacher', 'get', 1),
+    'attendances/bulk/': ('teacher', 'post', 8),
+    'attendances/<pk>/': ('teacher', 'get', 1),
+    'months/': ('admin', 'get', 2),
+    'months/<pk>/': ('admin', 'get', 2),
+    'group-table/': ('admin', 'get', 4),  # 3 из них — фильтры при пустом кэше
+    'group-table/<pk>/': ('admin', 'get', 1),
+    'student-table/': ('admin', 'get', 6),  # 3 из них — фильтры при пустом кэше
+    'student-table/<pk>/': ('admin', 'get', 3),
+    'teacher-table/': ('admin', 'get', 4),
+    'teacher-table/<pk>/': ('admin', 'get', 3),
+    'invoices/': ('admin', 'get', 1),
+    'invoices/export/': ('admin', 'get', 1),
+    'invoices/pdf/': ('admin', 'post', 5),
+    'invoices/<pk>/': ('admin', 'get', 1),
+    'notifications/': ('admin', 'get', 1),
+    'notifications/<pk>/': ('admin', 'get', 1),
+    'payments/': ('admin', 'get', 1),
+    'payments/export/': ('admin', 'get', 1),
+    'payments/<pk>/': ('admin', 'get', 1),
+    'financial-reports/': ('admin', 'get', 4),
+    'financial-reports/<pk>/': ('admin', 'get', 4),
+    'financial-reports/<pk>/freeze/': ('admin', 'post', 5),
+    'financial-reports/<pk>/unfreeze/': ('admin', 'post', 5),
+    'incomes/': ('admin', 'get', 1),
+    'incomes/export/': ('admin', 'get', 1),
+    'incomes/<pk>/': ('admin', 'get', 1),
+    'expenses/': ('admin', 'get', 1),
+    'expenses/export/': ('admin', 'get', 1),
+    'expenses/<pk>/': ('admin', 'get', 1),
+    'teacher-payments/': ('admin', 'get', 1),
+    'teacher-payments/export/': ('admin', 'get', 1),
+    'teacher-payments/<pk>/': ('admin', 'get', 1),
+    'classrooms/': ('admin', 'get', 1),
+    'classrooms/<pk>/': ('admin', 'get', 1),
+    'schedule/': ('admin', 'get', 1),
+    'schedule/bulk/': ('admin', 'post', 4),
+    'schedule/<pk>/': ('admin', 'get', 1),
+    'leads/': ('admin', 'get', 1),
+    'leads/stats/': ('admin', 'get', 5),
+    'leads/<pk>/': ('admin', 'get', 1),
+    'leads/<pk>/update_status/': ('admin', 'patch', 2),
+    'groups/<int:id>/dashboard/': ('admin', 'get', 8),
+    'generate-report/': ('admin', 'post', 4),
+    'calculate-teacher-payments/': ('admin', 'post', 4),
+    'daily-schedule/': ('admin', 'get', 2),
+    'active-students/': ('admin', 'get', 5),
+    'monthly-income/': ('admin', 'get', 1),
+    'teacher-workload/': ('admin', 'get', 3),
+    'popular-courses/': ('admin', 'get', 2),
+    'students/<int:student_id>/profile/': ('admin', 'get', 7),
+    'students/<int:student_id>/attendance/': ('admin', 'get', 2),
+    'students/<int:student_id>/payments/': ('admin', 'get', 1),
+    'admin-dashboard/': ('admin', 'get', 6),
+    'homework/': ('student', 'get', 2),
+    'lessons/<int:pk>/': ('student', 'get', 8),
+    'lessons/<int:lesson_id>/submit/': ('student', 'post', 6),
+    'lesson/<int:pk>/': ('student', 'get', 8),
+    'lesson/<int:lesson_id>/submit/': ('student', 'post', 6),
+    'my-submissions/': ('student', 'get', 1),
+    'teacher/homework/': ('teacher', 'get', 1),
+    'teacher/homework/<int:pk>/review/': ('teacher', 'patch', 14),
+    'groups/<int:group_id>/grades/': ('admin', 'get', 12),
+    'progress/<int:pk>/': ('student', 'get', 4),
+    'jobs/': ('admin', 'get', 1),
+    'jobs/<pk>/': ('admin', 'get', 1),
+    'jobs/<pk>/retry/': ('admin', 'post', 2),
+}
+
+# Ожидаемый статус ответа, если он не 200
+EXPECTED_STATUS = {
+    'generate-report/': 201,
+    'invoices/pdf/': 202,
+    'lessons/<int:lesson_id>/submit/': 201,
+    'lesson/<int:lesson_id>/submit/': 201,
+}
+
+# Объект, на который указывает <pk> detail-маршрута, по первому сегменту URL
+DETAIL_OBJECTS = {
+    'groups': 'group', 'teachers-add': 'teacher_profile', 'students-add': 'student_profile',
+    'lessons-add': 'lesson', 'lessons': 'lesson', 'lesson': 'lesson', 'attendances': 'attendance',
+    'months': 'month', 'group-table': 'group', 'student-table': 'student_profile',
+    'teacher-table': 'teacher', 'invoices': 'invoice', 'notifications': 'notification',
+    'payments': 'payment', 'financial-reports': 'report', 'incomes': 'income', 'expenses': 'expense',
+    'teacher-payments': 'teacher_payment', 'classrooms': 'classroom', 'schedule': 'schedule',
+    'leads': 'lead', 'teacher': 'submission', 'progress': 'student', 'jobs': 'job',
+}
+
+# Объект маршрута, который успешный запрос «расходует»: seed_school создаёт новый на каждый прогон
+ROUTE_OBJECTS = {
+    'lessons/<int:lesson_id>/submit/': 'open_lesson',
+    'lesson/<int:lesson_id>/submit/': 'open_lesson',
+    'jobs/<pk>/retry/': 'failed_job',
+}
+
+# Тело запроса: словарь или функция от self.ids для данных, зависящих от объектов
+REQUEST_DATA = {
+    'search/': {'q': 'Studnet Famly'},
+    'lessons/<int:lesson_id>/submit/': {'project_links': 'https://example.com/p', 'files': 'https://example.com/f'},
+    'lesson/<int:lesson_id>/submit/': {'project_links': 'https://example.com/p', 'files': 'https://example.com/f'},
+    'schedule/bulk/': lambda ids: {
+        'group': ids['group'], 'classroom_id': ids['classroom'], 'start_date': '2025-01-06',
+        'end_date': '2025-02-02', 'start_time': '18:00', 'dry_run': True,
+    },
+    'attendances/bulk/': lambda ids: {'lesson': ids['lesson'], 'statuses': {ids['student'].id: 'online'}},
+    'generate-report/': {'report_type': 'monthly'},
+    'invoices/pdf/': lambda ids: {'ids': [ids['invoice']]},
+    'calculate-teacher-payments/': {'dry_run': True},
+    'leads/<pk>/update_status/': {'status': 'in_progress'},
+    'teacher/homework/<int:pk>/review/': {'teacher_comment': 'Хорошо'},
+}
+
+
+def iter_routes(urlpatterns, prefix=''):
+    """Все маршруты urls-модуля в виде строк, без format-suffix дублей роутера"""
+    for entry in urlpatterns:
+        pattern = str(entry.pattern)
+        if 'format>' in pattern:
+            continue
+        pattern = pattern.lstrip('^').rstrip('$').replace('(?P<pk>[^/.]+)', '<pk>')
+        if isinstance(entry, URLResolver):
+            yield from iter_routes(entry.url_patterns, prefix + pattern)
+        else:
+            yield prefix + pattern
+
+
+class EndpointBudgetMixin:
+    """Обходит все маршруты urls-модуля и проверяет бюджет SQL-запросов"""
+
+    urlconf = None
+    url_prefix = None
+
+    def routes(self):
+        return list(iter_routes(importlib.import_module(self.urlconf).urlpatterns))
+
+    def build_url(self, route):
+        def value(match):
+            name = match.group(1).split(':')[-1]
+            if route in ROUTE_OBJECTS:
+                key = ROUTE_OBJECTS[route]
+            elif name == 'pk':
+                key = DETAIL_OBJECTS[route.split('/')[0]]
+            else:
+                key = {'id': 'group', 'group_id': 'group', 'student_id': 'student',
+                       'lesson_id': 'lesson'}[name]
+            obj = self.ids[key]
+            return str(getattr(obj, 'id', obj))
+        return self.url_prefix + re.sub(r'<([^>]+)>', value, route)
+
+    def measure(self, route):
+        role, method, _ = ENDPOINT_BUDGETS[route]
+        user = {
+            'admin': self.admin,
+            'teacher': self.ids['teacher'],
+            'student': self.ids['student'],
+        }[role]
+        self.client.force_authenticate(user)
+        url = self.build_url(route)
+        with CaptureQueriesContext(connection) as ctx:
+            data = REQUEST_DATA.get(route, {})
+            if callable(data):
+                data = data(self.ids)
+            if method == 'get':
+                response = self.client.get(url, data)
+            else:
+                response = getattr(self.client, method)(url, data, format='json')
+            # Потоковые ответы выполняют запросы по мере чтения
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, EXPECTED_STATUS.get(route, 200), f"{url}: {response.status_code}")
+        return len(ctx)
+
+    def test_every_route_has_budget(self):
+        missing = [route for route in self.routes() if route not in ENDPOINT_BUDGETS]
+        self.assertEqual(missing, [])
+
+    def test_query_budgets(self):
+        self.seed_school()
+        baseline = {route: self.measure(route) for route in self.routes()}
+
+        # Удваиваем объём данных: бюджет не должен зависеть от числа строк
+        self.seed_school()
+        for route in self.routes():
+            with self.subTest(route=route):
+                count = self.measure(route)
+                self.assertLessEqual(count, ENDPOINT_BUDGETS[route][2])
+                self.assertEqual(count, baseline[route])
+
+
+@override_settings(CACHES=QUERY_COUNT_CACHES)
+class AdministrationEndpointBudgetTests(SchoolSeedMixin, EndpointBudgetMixin, APITestCase):
+    urlconf = 'app.administration.urls'
+    url_prefix = '/api/v1/administration/'
+
+
+class GroupDashboardQueryCountTests(APITestCase):
+    """Количество запросов дашборда группы не зависит от числа студентов"""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('admin', 'pass', role='Administrator', age=30)
+        self.client.force_authenticate(self.admin)
+
+        direction = Direction.objects.create(name='English')
+        self.group = Group.objects.create(
+            group_name='EN-1', direction=direction, age_group='12-14', format='offline',
+            duration_months=6, planned_start=datetime.date(2025, 1, 1), lessons_per_month=8,
+            lesson_duration=2, lessons_per_week=2, schedule_days='Пн, Ср'
+        )
+        self.course = Course.objects.create(group=self.group, course_number=1)
+        month = Months.objects.create(course=self.course, month_number=1, title='Month 1', description='')
+        self.lessons = [
+            Lesson.objects.create(
+                month=month, title=f'Lesson {i}', description='', order=i,
+                date=timezone.now() - datetime.timedelta(days=i)
+            )
+            for i in range(1, 5)
+        ]
+        self.url = f'/api/v1/administration/groups/{self.group.id}/dashboard/'
+
+    def add_students(self, count):
+        start = self.group.students.count()
+        for i in range(start, start + count):
+            student = CustomUser.objects.create_user(f'student{i}', 'pass', role='Student', age=13)
+            self.group.students.add(student)
+            for lesson in self.lessons:
+                Attendance.objects.create(lesson=lesson, student=student, status='1')
+            invoice = Invoice.objects.create(
+                student=student, course=self.course, amount=1000,
+                due_date=datetime.date(2025, 2, 1)
+            )
+            Payment.objects.create(invoice=invoice, amount=400, payment_type='cash')
+            Payment.objects.create(invoice=invoice, amount=300, payment_type='online')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response
+
+    def test_query_count_is_constant(self):
+        self.add_students(2)
+        small, _ = self.count_queries()
+
+        self.add_students(28)
+        large, response = self.count_queries()
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 12)
+        self.assertEqual(len(response.data['students']), 30)
+
+    def test_students_payload(self):
+        self.add_students(1)
+        _, response = self.count_queries()
+
+        student = response.data['students'][0]
+        self.assertEqual(len(student['attendances']), len(self.lessons))
+        self.assertEqual(len(student['payments']), 2)
+        self.assertEqual(student['payments'][0]['paid_amount'], '700.00')
+        self.assertEqual(student['payments'][0]['balance'], '300.00')
+
+
+@override_settings(CACHES=QUERY_COUNT_CACHES)
+class AdminDashboardCacheTests(SchoolSeedMixin, APITestCase):
+    """Дашборд администратора собирается за несколько запросов и кэшируется до изменения данных"""
+
+    url = '/api/v1/administration/admin-dashboard/'
+
+    def setUp(self):
+        cache.clear()
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.data
+
+    def test_second_load_is_served_from_cache(self):
+        first, data = self.get()
+        second, cached = self.get()
+
+        self.assertLessEqual(first, 6)
+        self.assertEqual(second, 0)
+        self.assertEqual(cached, data)
+
+    def test_payment_invalidates_cache(self):
+        _, data = self.get()
+        Payment.objects.create(invoice_id=self.ids['invoice'], amount=150, payment_type='cash')
+
+        count, fresh = self.get()
+        self.assertGreater(count, 0)
+        self.assertEqual(
+            fresh['payments_today']['amount'] - (data['payments_today']['amount'] or 0), 150
+        )
+
+    def test_new_student_invalidates_cache(self):
+        _, data = self.get()
+        CustomUser.objects.create_user('fresh-student', 'pass', role='Student', age=15)
+
+        _, fresh = self.get()
+        self.assertEqual(fresh['new_students_24h'], data['new_students_24h'] + 1)
+        self.assertEqual(fresh['attendance_stats']['total_students'], data['attendance_stats']['total_students'] + 1)
+
+    def test_login_keeps_cache(self):
+        self.get()
+        self.admin.last_login = timezone.now()
+        self.admin.save(update_fields=['last_login'])
+
+        count, _ = self.get()
+        self.assertEqual(count, 0)
+
+    def test_day_and_time_are_local(self):
+        # 20:00 11 марта в Бишкеке (UTC+6); в UTC ещё 14:00
+        now = datetime.datetime(2025, 3, 11, 14, 0, tzinfo=datetime.timezone.utc)
+        group = Group.objects.get(id=self.ids['group'])
+        classroom = Classroom.objects.get(id=self.ids['classroom'])
+        for hour in (15, 21):
+            Schedule.objects.create(
+                classroom=classroom, group=group, teacher=group.teacher, date=datetime.date(2025, 3, 11),
+                start_time=datetime.time(hour), end_time=datetime.time(hour, 45)
+            )
+        # 01:00 11 марта по местному времени — 10 марта в UTC
+        Payment.objects.create(
+            invoice_id=self.ids['invoice'], amount=150, payment_type='cash',
+            date=datetime.datetime(2025, 3, 10, 19, 0, tzinfo=datetime.timezone.utc)
+        )
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            _, data = self.get()
+        self.assertEqual([item['start_time'] for item in data['upcoming_classes']], [datetime.time(21)])
+        self.assertEqual(data['payments_today']['amount'], 150)
+
+
+class DailyScheduleGridTests(SchoolSeedMixin, APITestCase):
+    """Сетка расписания по кабинетам: шаг слота и режим диапазона дат"""
+
+    url = '/api/v1/administration/daily-schedule/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=1)
+        self.client.force_authenticate(self.admin)
+        Schedule.objects.all().delete()
+
+        self.day = datetime.date(2025, 3, 3)
+        self.room_a = Classroom.objects.get(id=self.ids['classroom'])
+        self.room_b = Classroom.objects.create(number='B1', capacity=10)
+        group = Group.objects.get(id=self.ids['group'])
+        teacher = self.ids['teacher']
+        for room, start, end in ((self.room_a, (10, 0), (12, 0)), (self.room_b, (9, 30), (10, 30))):
+            Schedule.objects.create(
+                classroom=room, group=group, teacher=teacher, date=self.day,
+                start_time=datetime.time(*start), end_time=datetime.time(*end)
+            )
+
+    def rooms(self, data):
+        return {room['id']: room['schedule'] for room in data['classrooms']}
+
+    def test_hourly_grid(self):
+        response = self.client.get(self.url, {'date': '2025-03-03'})
+        self.assertEqual(response.status_code, 200)
+
+        rooms = self.rooms(response.data)
+        self.assertEqual([slot['time'] for slot in rooms[self.room_a.id]][:3], ['9:00', '10:00', '11:00'])
+        self.assertEqual(len(rooms[self.room_a.id]), 12)
+        group_name = Group.objects.get(id=self.ids['group']).group_name
+        busy = [slot['time'] for slot in rooms[self.room_a.id] if slot['lesson']]
+        self.assertEqual(busy, ['10:00', '11:00'])
+        self.assertEqual(rooms[self.room_a.id][1]['lesson']['group'], group_name)
+
+    def test_half_hour_grid(self):
+        response = self.client.get(self.url, {'date': '2025-03-03', 'slot': 30})
+        rooms = self.rooms(response.data)
+
+        self.assertEqual(len(rooms[self.room_b.id]), 24)
+        busy = [slot['time'] for slot in rooms[self.room_b.id] if slot['lesson']]
+        self.assertEqual(busy, ['9:30', '10:00'])
+
+    def test_invalid_slot(self):
+        response = self.client.get(self.url, {'slot': 20})
+        self.assertEqual(response.status_code, 400)
+
+    def test_week_range_uses_two_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'start_date': '2025-03-01', 'end_date': '2025-03-07'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx), 2)
+
+        days = response.data['days']
+        self.assertEqual(len(days), 7)
+        self.assertEqual(days[2]['date'], '2025-03-03')
+        busy = [slot['time'] for slot in self.rooms(days[2])[self.room_a.id] if slot['lesson']]
+        self.assertEqual(busy, ['10:00', '11:00'])
+        self.assertFalse(any(slot['lesson'] for slot in self.rooms(days[0])[self.room_a.id]))
+
+
+class ScheduleBulkTests(SchoolSeedMixin, APITestCase):
+    """Массовое создание повторяющегося расписания с проверкой конфликтов"""
+
+    url = '/api/v1/administration/schedule/bulk/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=1)
+        self.client.force_authenticate(self.admin)
+        self.group = Group.objects.get(id=self.ids['group'])
+        self.group.schedule_days = 'Пн, Ср'
+        self.group.lessons_per_week = 2
+        self.group.lesson_duration = 2
+        self.group.save()
+        self.payload = {
+            'group': self.group.id, 'classroom_id': self.ids['classroom'],
+            'start_date': '2025-03-03', 'end_date': '2025-03-16', 'start_time': '10:00',
+        }
+
+    def test_parse_schedule_days(self):
+        self.assertEqual(parse_schedule_days('Пн, Ср'), [0, 2])
+        self.assertEqual(parse_schedule_days('вторник/четверг/Суббота'), [1, 3, 5])
+        self.assertEqual(parse_schedule_days('Mon Wed Fri, mon'), [0, 2, 4])
+        self.assertEqual(parse_schedule_days('по договорённости'), [])
+
+    def test_interval_index(self):
+        index = IntervalIndex()
+        index.add('room', datetime.time(9), datetime.time(13), 1)
+        index.add('room', datetime.time(14), datetime.time(15), 2)
+
+        self.assertEqual(index.overlaps('room', datetime.time(12), datetime.time(14)), [1])
+        self.assertEqual(index.overlaps('room', datetime.time(13), datetime.time(14)), [])
+        self.assertEqual(sorted(index.overlaps('room', datetime.time(10), datetime.time(16))), [1, 2])
+        self.assertEqual(index.overlaps('other', datetime.time(10), datetime.time(16)), [])
+
+    def test_creates_recurring_lessons(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertLessEqual(len(ctx), 5)
+
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(response.data['conflicts'], [])
+        dates = sorted(
+            Schedule.objects.filter(group=self.group, date__range=('2025-03-03', '2025-03-16'))
+            .values_list('date', flat=True)
+        )
+        self.assertEqual([d.isoformat() for d in dates], ['2025-03-03', '2025-03-05', '2025-03-10', '2025-03-12'])
+        self.assertEqual(response.data['schedule'][0]['end_time'], '12:00:00')
+
+    def test_reports_all_conflicts(self):
+        other_room = Classroom.objects.create(number='X1', capacity=5)
+        busy = Schedule.objects.create(
+            classroom_id=self.ids['classroom'], group=self.group, teacher=self.group.teacher,
+            date=datetime.date(2025, 3, 5), start_time=datetime.time(11), end_time=datetime.time(12)
+        )
+        teacher_busy = Schedule.objects.create(
+            classroom=other_room, group=self.group, teacher=self.group.teacher,
+            date=datetime.date(2025, 3, 10), start_time=datetime.time(9), end_time=datetime.time(10, 30)
+        )
+
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+
+        conflicts = {item['date'].isoformat(): item['conflicts'] for item in response.data['conflicts']}
+        self.assertEqual(set(conflicts), {'2025-03-05', '2025-03-10'})
+        self.assertEqual(conflicts['2025-03-05'][0]['schedule_ids'], [busy.id])
+        self.assertEqual(len(conflicts['2025-03-05']), 2)
+        self.assertEqual(conflicts['2025-03-10'], [
+            {'reason': "Преподаватель уже занят в это время", 'schedule_ids': [teacher_busy.id]}
+        ])
+
+    def test_dry_run_and_full_conflict(self):
+        response = self.client.post(self.url, {**self.payload, 'dry_run': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['schedule']), 4)
+        self.assertFalse(Schedule.objects.filter(date='2025-03-03').exists())
+
+        self.client.post(self.url, self.payload, format='json')
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data['conflicts']), 4)
+
+
+class FinanceRollupTests(SchoolSeedMixin, APITestCase):
+    """Дневные агрегаты совпадают с сырыми данными после любых изменений"""
+
+    def setUp(self):
+        self.seed_school(directions=2, groups_per_direction=1, students_per_group=2)
+        self.start = datetime.date(2000, 1, 1)
+        self.end = timezone.localdate() + datetime.timedelta(days=365)
+
+    def raw_totals(self):
+        payments = Payment.objects.filter(date__date__range=[self.start, self.end])
+        expenses = Expense.objects.filter(date__range=[self.start, self.end])
+        invoices = Invoice.objects.filter(date_created__date__range=[self.start, self.end])
+        return {
+            'income_by_type': {
+                p['payment_type']: float(p['total'])
+                for p in payments.values('payment_type').annotate(total=Sum('amount'))
+            },
+            'expenses_by_category': {
+                e['category']: float(e['total'])
+                for e in expenses.values('category').annotate(total=Sum('amount'))
+            },
+            'top_courses': {
+                c['course__group__direction__name']: float(c['total'])
+                for c in invoices.values('course__group__direction__name').annotate(
+                    total=Sum('amount')).order_by('-total')[:5]
+            },
+        }
+
+    def assertRollupsMatch(self):
+        totals = report_totals(self.start, self.end)
+        self.assertEqual(period_totals({'report': (self.start, self.end)}), {'report': totals})
+        raw = self.raw_totals()
+        for key in raw:
+            self.assertEqual(totals[key], raw[key], key)
+        self.assertEqual(totals['net_profit'], totals['total_income'] - totals['total_expenses'])
+
+    def test_rollups_follow_writes(self):
+        self.assertRollupsMatch()
+
+        payment = Payment.objects.create(invoice_id=self.ids['invoice'], amount=250, payment_type='transfer')
+        self.assertRollupsMatch()
+
+        payment.date = payment.date - datetime.timedelta(days=40)
+        payment.payment_type = 'online'
+        payment.save()
+        self.assertRollupsMatch()
+
+        payment.delete()
+        self.assertRollupsMatch()
+
+        expense = Expense.objects.create(category='rent', description='Аренда', amount=900, date=datetime.date(2025, 5, 5))
+        expense.date = datetime.date(2025, 6, 6)
+        expense.save()
+        self.assertRollupsMatch()
+
+        # Перенос счёта на курс другого направления переносит и его платежи
+        invoice = Invoice.objects.get(id=self.ids['invoice'])
+        invoice.course = Course.objects.exclude(group__direction=invoice.course.group.direction).first()
+        invoice.save()
+        self.assertRollupsMatch()
+
+    def test_rollups_follow_direction_changes(self):
+        def payment_directions():
+            rollups = DailyPaymentRollup.objects.values('direction').annotate(total=Sum('total'))
+            raw = Payment.objects.values('invoice__course__group__direction').annotate(total=Sum('amount'))
+            self.assertEqual(
+                {row['direction']: row['total'] for row in rollups if row['total']},
+                {row['invoice__course__group__direction']: row['total'] for row in raw},
+            )
+
+        group = Group.objects.get(id=self.ids['group'])
+        other = Group.objects.exclude(direction=group.direction).first()
+        course = Course.objects.filter(group=other).first()
+        course.group = group
+        course.course_number = 99
+        course.save()
+        self.assertRollupsMatch()
+        payment_directions()
+
+        group.direction = other.direction
+        group.save()
+        self.assertRollupsMatch()
+        payment_directions()
+
+    def test_loading_rows_does_not_touch_rollups(self):
+        with mock.patch('app.administration.signals.local_date') as convert:
+            list(Payment.objects.all())
+            list(Invoice.objects.all())
+            list(Expense.objects.all())
+        convert.assert_not_called()
+
+    def test_rebuild_command(self):
+        DailyPaymentRollup.objects.all().delete()
+        DailyExpenseRollup.objects.all().delete()
+        DailyInvoiceRollup.objects.all().delete()
+        Payment.objects.filter(id=self.ids['payment']).update(amount=12345)
+
+        call_command('rebuild_finance_rollups', stdout=io.StringIO())
+        self.assertRollupsMatch()
+
+    def test_report_serializer_uses_three_queries(self):
+        report = FinancialReport.objects.get(id=self.ids['report'])
+        with CaptureQueriesContext(connection) as ctx:
+            data = FinancialReportSerializer(report).data
+        self.assertEqual(len(ctx), 3)
+        self.assertEqual(data['net_profit'], data['total_income'] - data['total_expenses'])
+
+
+class FrozenFinancialReportTests(SchoolSeedMixin, APITestCase):
+    """Замороженный отчёт отдаёт зафиксированные показатели без агрегатов"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+
+    def generate(self, **extra):
+        response = self.client.post(
+            '/api/v1/administration/generate-report/',
+            {'report_type': 'custom', 'start_date': '2000-01-01', 'end_date': '2100-01-01', **extra},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_frozen_report_ignores_later_payments(self):
+        live = self.generate()
+        frozen = self.generate(freeze=True)
+        self.assertTrue(live['is_live'])
+        self.assertFalse(frozen['is_live'])
+        self.assertEqual(frozen['total_income'], live['total_income'])
+
+        Payment.objects.create(invoice_id=self.ids['invoice'], amount=500, payment_type='cash')
+
+        live_after = self.client.get(f"/api/v1/administration/financial-reports/{live['id']}/").data
+        frozen_after = self.client.get(f"/api/v1/administration/financial-reports/{frozen['id']}/").data
+        self.assertEqual(live_after['total_income'], live['total_income'] + 500)
+        self.assertEqual(frozen_after['total_income'], frozen['total_income'])
+        self.assertEqual(frozen_after['income_by_type'], frozen['income_by_type'])
+
+    def test_frozen_list_is_one_query(self):
+        for _ in range(3):
+            self.generate(freeze=True)
+        FinancialReport.objects.filter(is_live=True).delete()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/administration/financial-reports/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(ctx), 1)
+
+    def test_freeze_and_unfreeze_actions(self):
+        report = self.generate()
+        url = f"/api/v1/administration/financial-reports/{report['id']}/"
+
+        response = self.client.post(url + 'freeze/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_live'])
+        self.assertIsNotNone(response.data['frozen_at'])
+
+        response = self.client.post(url + 'unfreeze/')
+        self.assertTrue(response.data['is_live'])
+        self.assertIsNone(FinancialReport.objects.get(id=report['id']).snapshot)
+
+
+class TeacherPayrollTests(APITestCase):
+    """Расчёт выплат преподавателям: ставки, повторный расчёт, диапазон месяцев"""
+
+    def setUp(self):
+        self.direction = Direction.objects.create(name='Programming')
+        self.hourly = self.create_teacher('hourly', payment_type='hourly', payment_amount=500)
+        self.monthly = self.create_teacher('monthly', payment_type='fixed', payment_amount=20000, payment_period='month')
+        self.per_lesson = self.create_teacher('per-lesson', payment_type='fixed', payment_amount=300,
+                                              payment_period='per_lesson')
+
+        tz = timezone.get_current_timezone()
+        for teacher, dates in (
+            (self.hourly, [(2025, 1, 10, 10), (2025, 1, 17, 10), (2025, 1, 31, 23), (2025, 2, 1, 0)]),
+            (self.monthly, [(2025, 1, 12, 15), (2025, 1, 19, 15)]),
+            (self.per_lesson, [(2025, 1, 5, 9), (2025, 2, 5, 9), (2025, 2, 12, 9)]),
+        ):
+            month = Months.objects.create(course=teacher.course, month_number=1, title='Month 1', description='')
+            for order, (year, month_number, day, hour) in enumerate(dates, start=1):
+                Lesson.objects.create(
+                    month=month, title=f'Lesson {order}', description='', order=order,
+                    date=datetime.datetime(year, month_number, day, hour, 30, tzinfo=tz)
+                )
+
+    def create_teacher(self, username, **rates):
+        teacher = CustomUser.objects.create_user(username, 'pass', role='Teacher', age=40)
+        Teacher.objects.create(user=teacher, **rates)
+        group = Group.objects.create(
+            group_name=f'Group {username}', direction=self.direction, age_group='12-14', format='offline',
+            duration_months=6, planned_start=datetime.date(2025, 1, 1), lessons_per_month=8,
+            lesson_duration=2, lessons_per_week=2, schedule_days='Пн, Ср', teacher=teacher
+        )
+        teacher.course = Course.objects.create(group=group, course_number=1)
+        return teacher
+
+    def payments(self):
+        return {
+            (payment.teacher_id, payment.date): (payment.lessons_count, payment.payment)
+            for payment in TeacherPayment.objects.all()
+        }
+
+    def test_rates_per_payment_type(self):
+        report, = calculate_teacher_payments(2025, 1)
+        statuses = {row['teacher_id']: row['status'] for row in report['results']}
+        self.assertEqual(set(statuses.values()), {'created'})
+
+        end = datetime.date(2025, 1, 31)
+        self.assertEqual(self.payments(), {
+            # Занятие 31.01 в 23:30 по местному времени относится к январю, 01.02 в 00:30 — к февралю
+            (self.hourly.id, end): (3, Decimal('3000')),  # 500 × 3 занятия × 2 часа
+            (self.monthly.id, end): (2, Decimal('20000')),
+            (self.per_lesson.id, end): (1, Decimal('300')),
+        })
+
+    def test_rerun_updates_existing_month(self):
+        calculate_teacher_payments(2025, 1)
+        Lesson.objects.filter(month__course__group__teacher=self.hourly, date__day=10).delete()
+
+        report, = calculate_teacher_payments(2025, 1)
+        self.assertEqual({row['status'] for row in report['results']}, {'updated'})
+        self.assertEqual(TeacherPayment.objects.count(), 3)
+        self.assertEqual(self.payments()[(self.hourly.id, datetime.date(2025, 1, 31))], (2, Decimal('2000')))
+
+    def test_month_range(self):
+        reports = calculate_teacher_payments(2024, 12, 2025, 2)
+        self.assertEqual([report['period'] for report in reports], [
+            '2024-12-01 - 2024-12-31', '2025-01-01 - 2025-01-31', '2025-02-01 - 2025-02-28',
+        ])
+        payments = self.payments()
+        self.assertEqual(len(payments), 9)
+        self.assertEqual(payments[(self.hourly.id, datetime.date(2024, 12, 31))], (0, Decimal('0')))
+        self.assertEqual(payments[(self.hourly.id, datetime.date(2025, 2, 28))], (1, Decimal('1000')))
+        # Помесячная ставка начисляется и в месяц без занятий
+        self.assertEqual(payments[(self.monthly.id, datetime.date(2025, 2, 28))], (0, Decimal('20000')))
+        self.assertEqual(payments[(self.per_lesson.id, datetime.date(2025, 2, 28))], (2, Decimal('600')))
+
+        with self.assertRaises(ValueError):
+            calculate_teacher_payments(2025, 2, 2025, 1)
+
+    def test_dry_run_writes_nothing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            reports = calculate_teacher_payments(2025, 1, 2025, 2, dry_run=True)
+        self.assertFalse(TeacherPayment.objects.exists())
+        self.assertFalse([query for query in ctx if not query['sql'].startswith('SELECT')])
+        self.assertEqual(
+            {row['teacher_id']: row['payment'] for row in reports[1]['results']},
+            {self.hourly.id: Decimal('1000'), self.monthly.id: Decimal('20000'), self.per_lesson.id: Decimal('600')},
+        )
+
+
+class TeacherTableTests(SchoolSeedMixin, APITestCase):
+    """Таблица преподавателей строится из предзагруженных данных"""
+
+    url = '/api/v1/administration/teacher-table/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=2, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+
+    def test_row_content(self):
+        profile = Teacher.objects.get(id=self.ids['teacher_profile'])
+        other_group = Group.objects.exclude(id=self.ids['group']).first()
+        profile.groups.add(other_group)
+        # Ученик в двух группах одного преподавателя считается один раз
+        other_group.students.add(Group.objects.get(id=self.ids['group']).students.first())
+        expected = CustomUser.objects.filter(
+            student_groups__teachers=profile
+        ).distinct().count()
+
+        response = self.client.get(f"{self.url}{self.ids['teacher'].id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['student_count'], expected)
+        self.assertIn(other_group.group_name, response.data['groups'])
+
+    def test_teacher_without_profile(self):
+        bare = CustomUser.objects.create_user('bare-teacher', 'pass', role='Teacher', age=40)
+        response = self.client.get(f'{self.url}{bare.id}/')
+        self.assertEqual(response.data['groups'], '-')
+        self.assertEqual(response.data['directions'], '-')
+        self.assertEqual(response.data['student_count'], 0)
+
+
+class GroupTableTests(SchoolSeedMixin, APITestCase):
+    """Текущий курс и последний урок таблицы групп считаются подзапросами"""
+
+    url = '/api/v1/administration/group-table/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=1)
+        self.client.force_authenticate(self.admin)
+        self.group = Group.objects.get(id=self.ids['group'])
+
+    def row(self, group):
+        response = self.client.get(f'{self.url}{group.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['course'], response.data['lesson']
+
+    def test_current_course_and_lesson(self):
+        # Последний по дате урок первого курса — Lesson 1.1; урок без даты не считается
+        self.assertEqual(self.row(self.group), (1, 1))
+
+        month = Months.objects.create(
+            course=Course.objects.create(group=self.group, course_number=2), month_number=1, title='Month 1',
+            description=''
+        )
+        lesson = Lesson.objects.create(month=month, title='Lesson 2.5', description='', order=5)
+        self.assertEqual(self.row(self.group), (1, 1))
+
+        lesson.date = timezone.now()
+        lesson.save()
+        self.assertEqual(self.row(self.group), (2, 5))
+
+    def test_group_without_courses(self):
+        empty = Group.objects.create(
+            group_name='Empty', direction=self.group.direction, age_group='12-14', format='offline',
+            duration_months=6, planned_start=datetime.date(2025, 1, 1), lessons_per_month=8,
+            lesson_duration=2, lessons_per_week=2, schedule_days='Пн, Ср'
+        )
+        self.assertEqual(self.row(empty), (1, 0))
+
+        Course.objects.create(group=empty, course_number=3)
+        self.assertEqual(self.row(empty), (3, 0))
+
+        rows = {row['id']: (row['course'], row['lesson']) for row in self.client.get(self.url).data['groups']}
+        self.assertEqual(rows, {self.group.id: (1, 1), empty.id: (3, 0)})
+
+
+class TeacherWorkloadTests(SchoolSeedMixin, APITestCase):
+    """Нагрузка преподавателей из сгруппированных запросов"""
+
+    url = '/api/v1/administration/teacher-workload/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=2, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+
+    def test_matches_per_teacher_counts(self):
+        teacher = self.ids['teacher']
+        # Ученик во второй группе того же преподавателя считается один раз
+        other_group = Group.objects.exclude(id=self.ids['group']).first()
+        other_group.teacher = teacher
+        other_group.save()
+        Schedule.objects.filter(teacher=teacher).update(date=timezone.localdate() - datetime.timedelta(days=40))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # Без занятий в периоде преподаватель в отчёт не попадает
+        self.assertNotIn(teacher.get_full_name(), [row['teacher'] for row in response.data])
+
+        response = self.client.get(self.url, {
+            'period': 'custom',
+            'start_date': (timezone.localdate() - datetime.timedelta(days=45)).isoformat(),
+            'end_date': timezone.localdate().isoformat(),
+        })
+        row, = [row for row in response.data if row['teacher'] == teacher.get_full_name()]
+        groups = Group.objects.filter(teacher=teacher)
+        self.assertEqual(row['lessons_count'], Schedule.objects.filter(teacher=teacher).count())
+        self.assertEqual(
+            row['students_count'],
+            CustomUser.objects.filter(student_groups__in=groups).distinct().count()
+        )
+        self.assertEqual(
+            row['group_income'],
+            float(Payment.objects.filter(invoice__course__group__in=groups).aggregate(total=Sum('amount'))['total'])
+        )
+
+    def test_custom_period_validation(self):
+        response = self.client.get(self.url, {'period': 'custom', 'start_date': '2025-02-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {
+            'period': 'custom', 'start_date': '2025-02-01', 'end_date': '2025-01-01'
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class ActiveStudentsAnalyticsTests(SchoolSeedMixin, APITestCase):
+    """Активность учеников: окна по Lesson.date и отток через NOT EXISTS"""
+
+    url = '/api/v1/administration/active-students/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=3)
+        self.client.force_authenticate(self.admin)
+        self.lessons = list(Lesson.objects.order_by('id'))
+        Attendance.objects.all().delete()
+
+    def attend(self, student, lesson, days_ago, status='1'):
+        lesson.date = timezone.now() - datetime.timedelta(days=days_ago)
+        lesson.save()
+        Attendance.objects.create(lesson=lesson, student=student, status=status)
+
+    def test_churn_and_active_today(self):
+        stays, leaves, absent = Group.objects.get(id=self.ids['group']).students.order_by('id')[:3]
+        # Прошлая неделя: все трое; текущая — только stays (и absent, но с пропуском)
+        self.attend(stays, self.lessons[0], 10)
+        self.attend(leaves, self.lessons[0], 10)
+        self.attend(absent, self.lessons[0], 10)
+        self.attend(stays, self.lessons[1], 0, status='online')
+        self.attend(absent, self.lessons[1], 0, status='0')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['active_today'], 1)
+        self.assertEqual(response.data['left_this_week'], 2)
+
+    def test_average_age_is_numeric(self):
+        ages = list(CustomUser.objects.filter(role='Student', is_active=True).values_list('age', flat=True))
+        CustomUser.objects.create_user('older', 'pass', role='Student', age=9)
+        ages.append(9)
+        response = self.client.get(self.url)
+        self.assertAlmostEqual(response.data['avg_age'], round(sum(ages) / len(ages), 1))
+
+    def test_today_is_local_date(self):
+        student = Group.objects.get(id=self.ids['group']).students.first()
+        # 01:30 11 марта в Бишкеке, в UTC ещё 10 марта
+        now = datetime.datetime(2025, 3, 10, 19, 30, tzinfo=datetime.timezone.utc)
+        lesson = self.lessons[0]
+        lesson.date = now - datetime.timedelta(minutes=30)
+        lesson.save()
+        Attendance.objects.create(lesson=lesson, student=student, status='1')
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['active_today'], 1)
+
+
+class NormalizeAgesTests(APITestCase):
+    """Текстовый возраст приводится к числу до миграции; новые значения проверяются сериализаторами"""
+
+    def setUp(self):
+        self.teen = CustomUser.objects.create_user('teen', 'pass', role='Student', age=1)
+        self.adult = CustomUser.objects.create_user('adult', 'pass', role='Teacher', age=35)
+
+    def set_raw_age(self, user, value):
+        # Колонка ещё текстовая: пишем в обход модели
+        table = connection.ops.quote_name(CustomUser._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {table} SET age = %s WHERE id = %s', [value, user.id])
+
+    def raw_age(self, user):
+        table = connection.ops.quote_name(CustomUser._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT age FROM {table} WHERE id = %s', [user.id])
+            return cursor.fetchone()[0]
+
+    def test_text_age_becomes_number(self):
+        self.set_raw_age(self.teen, '14 лет')
+        output = io.StringIO()
+        call_command('normalize_ages', stdout=output)
+        self.assertEqual(self.raw_age(self.teen), 14)
+        self.assertEqual(self.raw_age(self.adult), 35)
+        self.assertIn('Исправлено значений: 1', output.getvalue())
+
+    def test_value_without_number_needs_default(self):
+        self.set_raw_age(self.teen, 'не указан')
+        with self.assertRaisesMessage(CommandError, '--default'):
+            call_command('normalize_ages', stdout=io.StringIO())
+        self.assertEqual(self.raw_age(self.teen), 'не указан')
+
+        call_command('normalize_ages', default=18, stdout=io.StringIO())
+        self.assertEqual(self.raw_age(self.teen), 18)
+
+    def test_dry_run_writes_nothing(self):
+        self.set_raw_age(self.teen, '14 лет')
+        output = io.StringIO()
+        call_command('normalize_ages', dry_run=True, stdout=output)
+        self.assertIn(f'Пользователь #{self.teen.id}: 14', output.getvalue())
+        self.assertEqual(self.raw_age(self.teen), '14 лет')
+
+    def test_create_serializers_validate_age(self):
+        data = {'username': 'new-user', 'password': 'pass', 'first_name': 'Имя', 'last_name': 'Фамилия'}
+        for serializer_class in (TeacherCreateSerializer, StudentCreateSerializer):
+            for age, valid in ((14, True), (0, False), (121, False), ('14 лет', False)):
+                with self.subTest(serializer=serializer_class.__name__, age=age):
+                    serializer = serializer_class(data={**data, 'age': age})
+                    self.assertEqual(serializer.is_valid(), valid, serializer.errors)
+                    if not valid:
+                        self.assertIn('age', serializer.errors)
+
+
+@override_settings(CACHES=QUERY_COUNT_CACHES)
+class PopularCoursesTests(SchoolSeedMixin, APITestCase):
+    """Рейтинг направлений: доход одним запросом, кэш до записи платежа"""
+
+    url = '/api/v1/administration/popular-courses/'
+
+    def setUp(self):
+        cache.clear()
+        self.seed_school(directions=3, groups_per_direction=1, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+
+    def get(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.data
+
+    def test_income_per_direction_and_cache(self):
+        count, data = self.get()
+        self.assertEqual(count, 2)
+        self.assertEqual(len(data), Direction.objects.count())
+        for row in data:
+            expected = Payment.objects.filter(
+                invoice__course__group__direction__name=row['course']
+            ).aggregate(total=Sum('amount'))['total']
+            self.assertEqual(row['income'], float(expected))
+
+        count, cached = self.get()
+        self.assertEqual(count, 0)
+        self.assertEqual(cached, data)
+
+        invoice = Invoice.objects.get(id=self.ids['invoice'])
+        Payment.objects.create(invoice=invoice, amount=150, payment_type='cash')
+        count, fresh = self.get()
+        self.assertEqual(count, 2)
+        row, = [row for row in fresh if row['course'] == invoice.course.group.direction.name]
+        old, = [old for old in data if old['course'] == row['course']]
+        self.assertEqual(row['income'] - old['income'], 150)
+
+    def test_top_and_date_range(self):
+        _, data = self.get({'top': 2})
+        self.assertEqual([row['rank'] for row in data], [1, 2])
+
+        Payment.objects.update(date=timezone.now() - datetime.timedelta(days=60))
+        Payment.objects.create(invoice_id=self.ids['invoice'], amount=150, payment_type='cash')
+        today = timezone.localdate().isoformat()
+        _, data = self.get({'start_date': today, 'end_date': today})
+        self.assertEqual(sum(row['income'] for row in data), 150)
+
+        response = self.client.get(self.url, {'top': 0})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'start_date': '01.02.2025'})
+        self.assertEqual(response.status_code, 400)
+
+
+class StudentTableTests(SchoolSeedMixin, APITestCase):
+    """Таблица учеников: группы, направления и преподаватели из одного prefetch"""
+
+    url = '/api/v1/administration/student-table/'
+
+    def setUp(self):
+        self.seed_school(directions=2, groups_per_direction=1, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+
+    def test_student_in_several_groups(self):
+        # Основной ученик записан во все группы
+        response = self.client.get(f"{self.url}{self.ids['student_profile']}/")
+        self.assertEqual(response.status_code, 200)
+
+        profile = Student.objects.get(id=self.ids['student_profile'])
+        groups = list(profile.groups.select_related('direction', 'teacher'))
+        self.assertEqual(response.data['group'], ", ".join(g.group_name for g in groups))
+        self.assertEqual(
+            set(response.data['direction'].split(", ")), {g.direction.name for g in groups}
+        )
+        self.assertEqual(
+            set(response.data['teacher'].split(", ")),
+            {f"{g.teacher.last_name} {g.teacher.first_name}" for g in groups}
+        )
+
+    def test_filters_keep_single_row_per_student(self):
+        response = self.client.get(self.url, {'group': 'Group'})
+        ids = [row['id'] for row in response.data['students']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertIn('directions', response.data['filters'])
+
+
+@override_settings(CACHES=QUERY_COUNT_CACHES)
+class TableFiltersTests(SchoolSeedMixin, APITestCase):
+    """Фильтры таблиц кэшируются по версии и отдаются с ETag"""
+
+    url = '/api/v1/administration/table-filters/'
+
+    def setUp(self):
+        cache.clear()
+        self.seed_school(directions=1, groups_per_direction=2, students_per_group=1)
+        self.client.force_authenticate(self.admin)
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn(Group.objects.first().group_name, response.data['groups'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx), 0)
+
+    def test_writes_change_version(self):
+        etag = self.client.get(self.url)['ETag']
+        Direction.objects.create(name='Робототехника')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Робототехника', response.data['directions'])
+
+    def test_tables_use_cached_facets(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/administration/student-table/')
+        self.assertEqual(len(ctx), 3)
+        self.assertIn('teachers', response.data['filters'])
+
+        response = self.client.get('/api/v1/administration/student-table/', {'facets': '0'})
+        self.assertNotIn('filters', response.data)
+        response = self.client.get('/api/v1/administration/group-table/', {'facets': 'false'})
+        self.assertNotIn('directions', response.data)
+
+    def test_version_is_shared_through_database_cache(self):
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache_table'}}
+        with override_settings(CACHES=shared):
+            call_command('createcachetable', verbosity=0)
+            etag = self.client.get(self.url)['ETag']
+            # Кэш другого процесса видит версию, увеличенную сигналом в этом
+            other = DatabaseCache('cache_table', {})
+            Direction.objects.create(name='Робототехника')
+            self.assertEqual(other.get(FACETS_VERSION_KEY), facets_version())
+            self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+
+class SearchIndexTests(SchoolSeedMixin, APITestCase):
+    """Триграммный индекс: синхронизация сигналами, транслитерация и опечатки"""
+
+    url = '/api/v1/administration/search/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=1)
+        self.client.force_authenticate(self.admin)
+        self.ivanov = CustomUser.objects.create_user(
+            'alexey14', 'pass', role='Student', first_name='Алексей', last_name='Иванов', age=14
+        )
+        Student.objects.create(user=self.ivanov)
+        self.lead = Lead.objects.create(name='Пётр Смирнов', phone='+996 555 123 456', course='English')
+
+    def results(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(item['kind'], item['id']) for item in response.data['results']]
+
+    def test_normalize(self):
+        self.assertEqual(normalize('Пётр  ИВАНОВ-Сидоров'), ['petr', 'ivanov', 'sidorov'])
+        self.assertEqual(normalize('Үмөт Жээнбеков'), ['umot', 'zheenbekov'])
+
+    def test_transliteration_prefix_and_typos(self):
+        self.assertEqual(self.results('Иванов')[0], ('student', self.ivanov.id))
+        self.assertEqual(self.results('ivanov')[0], ('student', self.ivanov.id))
+        self.assertEqual(self.results('Ивнов')[0], ('student', self.ivanov.id))
+        self.assertEqual(self.results('алек')[0], ('student', self.ivanov.id))
+        self.assertEqual(self.results('Петр', kinds='lead'), [('lead', self.lead.id)])
+
+    def test_index_follows_writes(self):
+        self.ivanov.last_name = 'Кузнецов'
+        self.ivanov.save()
+        self.assertNotIn(('student', self.ivanov.id), self.results('Иванов'))
+        self.assertEqual(self.results('Кузнецов')[0], ('student', self.ivanov.id))
+
+        self.ivanov.role = 'Teacher'
+        self.ivanov.save()
+        self.assertEqual(self.results('Кузнецов')[0], ('teacher', self.ivanov.id))
+
+        self.lead.delete()
+        self.assertEqual(self.results('Смирнов', kinds='lead'), [])
+
+        group = Group.objects.get(id=self.ids['group'])
+        group.direction.name = 'Робототехника'
+        group.direction.save()
+        self.assertIn(('group', group.id), self.results('робототехника', kinds='group'))
+
+    def test_tables_use_index(self):
+        response = self.client.get('/api/v1/administration/student-table/', {'search': 'ivanov'})
+        self.assertEqual([row['full_name'] for row in response.data['students']], ['Алексей Иванов'])
+
+        response = self.client.get('/api/v1/administration/leads/', {'search': '555123'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.lead.id])
+
+        # Короткий запрос идёт через icontains
+        response = self.client.get('/api/v1/administration/leads/', {'search': '55'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.lead.id])
+
+    def test_limit_validation(self):
+        for limit in (-1, 0, 'abc'):
+            with self.subTest(limit=limit):
+                response = self.client.get(self.url, {'q': 'Иванов', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.client.get(self.url, {'q': 'Student', 'limit': 1}).data['results']), 1)
+
+    def test_lead_reindexed_only_when_text_changes(self):
+        lead = Lead.objects.get(id=self.lead.id)
+        with mock.patch('app.administration.signals.search.index_lead') as index_lead:
+            lead.status = 'in_progress'
+            lead.save()
+            index_lead.assert_not_called()
+
+            lead.phone = '+996 700 000 001'
+            lead.save()
+            index_lead.assert_called_once_with(lead)
+            lead.save()
+            index_lead.assert_called_once_with(lead)
+
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(self.results('Иванов'), [])
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.results('Иванов')[0], ('student', self.ivanov.id))
+
+    def test_rows_created_before_index_are_indexed_after_migrate(self):
+        # Данные, существовавшие до появления индекса: таблиц SearchEntry ещё нет в базе
+        SearchEntry.objects.all().delete()
+        url = '/api/v1/administration/student-table/'
+        self.assertEqual(self.client.get(url, {'search': 'Алексей'}).data['students'], [])
+
+        config = apps.get_app_config('administration')
+        post_migrate.send(sender=config, app_config=config, verbosity=0,
+                          interactive=False, using='default', apps=apps, plan=[])
+        response = self.client.get(url, {'search': 'Алексей'})
+        self.assertEqual([row['full_name'] for row in response.data['students']], ['Алексей Иванов'])
+
+        # Непустой индекс повторно не перестраивается
+        self.assertEqual(ensure_index(), 0)
+
+
+@override_settings(CACHES=QUERY_COUNT_CACHES)
+class AttendanceBulkTests(SchoolSeedMixin, APITestCase):
+    """Отметка посещаемости всей группы за урок одним запросом"""
+
+    url = '/api/v1/administration/attendances/bulk/'
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=3)
+        self.client.force_authenticate(self.ids['teacher'])
+        self.lesson = Lesson.objects.select_related('month__course__group').get(id=self.ids['lesson'])
+        self.roster = list(self.lesson.month.course.group.students.values_list('id', flat=True))
+        self.newcomer = CustomUser.objects.create_user('newcomer', 'pass', role='Student', age=13)
+        self.lesson.month.course.group.students.add(self.newcomer)
+
+    def test_upserts_whole_roster(self):
+        statuses = {student_id: 'online' for student_id in self.roster}
+        statuses[self.newcomer.id] = '1'
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'lesson': self.lesson.id, 'statuses': statuses}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx), 8)
+
+        self.assertEqual(response.data['updated'], len(statuses))
+        self.assertEqual(response.data['month_number'], self.lesson.month.month_number)
+        self.assertEqual(
+            {row['student_id']: row['status'] for row in response.data['students']}, statuses
+        )
+        self.assertEqual(
+            dict(Attendance.objects.filter(lesson=self.lesson).values_list('student_id', 'status')), statuses
+        )
+
+    def test_rejects_students_outside_group(self):
+        outsider = CustomUser.objects.create_user('outsider', 'pass', role='Student', age=13)
+        response = self.client.post(self.url, {
+            'lesson': self.lesson.id, 'statuses': {self.roster[0]: '0', outsider.id: '1'},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(outsider.id), str(response.data['statuses']))
+        self.assertFalse(Attendance.objects.filter(student=outsider).exists())
+
+        response = self.client.post(self.url, {
+            'lesson': self.lesson.id, 'statuses': {self.roster[0]: 'late'},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AttendanceSummaryTests(SchoolSeedMixin, APITestCase):
+    """Сводки посещаемости обновляются при изменении отметок и отдаются таблицами"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+        self.student = self.ids['student']
+        self.group = Group.objects.get(id=self.ids['group'])
+
+    def summary(self):
+        return AttendanceSummary.objects.get(student=self.student, group=self.group)
+
+    def expected(self):
+        rows = list(Attendance.objects.filter(
+            student=self.student, lesson__month__course__group=self.group
+        ).order_by('lesson__date').values_list('status', flat=True))
+        streak = 0
+        for status in rows:
+            streak = streak + 1 if status == '0' else 0
+        return len(rows), sum(status in ('1', 'online') for status in rows), streak
+
+    def test_incremental_updates_match_history(self):
+        summary = self.summary()
+        self.assertEqual(
+            (summary.total_lessons, summary.attended_lessons, summary.absence_streak), self.expected()
+        )
+
+        # Последние уроки пропущены — серия растёт, процент падает
+        latest = Attendance.objects.filter(
+            student=self.student, lesson__month__course__group=self.group
+        ).order_by('-lesson__date')[:2]
+        for attendance in latest:
+            attendance.status = '0'
+            attendance.save()
+        summary = self.summary()
+        self.assertGreaterEqual(summary.absence_streak, 2)
+        self.assertEqual(
+            (summary.total_lessons, summary.attended_lessons, summary.absence_streak), self.expected()
+        )
+        self.assertEqual(summary.recent_lessons, summary.total_lessons)
+
+        Attendance.objects.filter(student=self.student, lesson__month__course__group=self.group).delete()
+        self.assertFalse(AttendanceSummary.objects.filter(student=self.student, group=self.group).exists())
+
+    def test_bulk_marking_and_rebuild(self):
+        lesson = Lesson.objects.filter(month__course__group=self.group).order_by('-date').first()
+        self.client.force_authenticate(self.ids['teacher'])
+        response = self.client.post('/api/v1/administration/attendances/bulk/', {
+            'lesson': lesson.id, 'statuses': {self.student.id: '1'},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.summary().absence_streak, 0)
+        self.assertEqual(self.summary().attended_lessons, self.expected()[1])
+
+        before = list(AttendanceSummary.objects.order_by('id').values_list(
+            'student_id', 'group_id', 'total_lessons', 'attended_lessons', 'recent_lessons', 'absence_streak'
+        ))
+        AttendanceSummary.objects.all().delete()
+        call_command('rebuild_attendance_summaries', stdout=io.StringIO())
+        after = list(AttendanceSummary.objects.order_by('id').values_list(
+            'student_id', 'group_id', 'total_lessons', 'attended_lessons', 'recent_lessons', 'absence_streak'
+        ))
+        self.assertEqual(sorted(after), sorted(before))
+
+    def test_exposed_on_student_table_and_group_dashboard(self):
+        summary = self.summary()
+        response = self.client.get(f"/api/v1/administration/student-table/{self.student.student_add.id}/")
+        self.assertEqual(response.status_code, 200)
+        row = next(item for item in response.data['attendance'] if item['group'] == self.group.id)
+        self.assertEqual(row['attendance_percent'], summary.attendance_percent)
+        self.assertEqual(row['absence_streak'], summary.absence_streak)
+
+        response = self.client.get(f"/api/v1/administration/groups/{self.group.id}/dashboard/")
+        student = next(item for item in response.data['students'] if item['id'] == self.student.id)
+        self.assertEqual(student['attendance_summary']['total_lessons'], summary.total_lessons)
+
+
+class StudentAttendanceHistoryTests(SchoolSeedMixin, APITestCase):
+    """История посещаемости: расписание одним запросом и постраничная выдача"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=2, students_per_group=1)
+        self.client.force_authenticate(self.admin)
+        self.student = self.ids['student']
+        self.url = f"/api/v1/administration/students/{self.student.id}/attendance/"
+
+    def test_schedule_matched_by_local_date(self):
+        attendance = Attendance.objects.filter(student=self.student).select_related(
+            'lesson__month__course__group'
+        ).order_by('-lesson__date', '-id').first()
+        substitute = CustomUser.objects.create_user(
+            'substitute', 'pass', role='Teacher', first_name='Замена', last_name='Петрова', age=30
+        )
+        Schedule.objects.create(
+            classroom_id=self.ids['classroom'], group=attendance.lesson.month.course.group, teacher=substitute,
+            start_time=datetime.time(8), end_time=datetime.time(9),
+            date=timezone.localdate(attendance.lesson.date)
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx), 2)
+        self.assertEqual(len(response.data), Attendance.objects.filter(student=self.student).count())
+
+        row = next(item for item in response.data if item['id'] == attendance.id)
+        self.assertEqual(row['teacher'], 'Петрова З.')
+        self.assertEqual(row['date'], timezone.localdate(attendance.lesson.date).strftime('%d.%m.%Y'))
+
+    def test_pagination_is_opt_in(self):
+        total = Attendance.objects.filter(student=self.student).count()
+        seen = []
+        page = 1
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(self.url, {'page': page, 'page_size': 5})
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(ctx), 3)
+            self.assertEqual(response.data['count'], total)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            page += 1
+
+        self.assertEqual(len(seen), total)
+        self.assertEqual(seen, [item['id'] for item in self.client.get(self.url).data])
+
+    def test_invalid_page_is_not_found(self):
+        for page in (999, 'abc'):
+            with self.subTest(page=page):
+                response = self.client.get(self.url, {'page': page})
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.data)
+
+
+class LedgerCursorPaginationTests(SchoolSeedMixin, APITestCase):
+    """Журналы отдаются курсорными страницами одинаковой стоимости"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+        invoice_id = Invoice.objects.order_by('id').first().id
+        # Одинаковые даты проверяют, что id разбивает ничьи без пропусков и повторов
+        same_day = timezone.now() - datetime.timedelta(days=3)
+        for i in range(12):
+            Payment.objects.create(
+                invoice_id=invoice_id, amount=10 + i, payment_type='cash',
+                date=same_day if i % 2 else same_day - datetime.timedelta(hours=i)
+            )
+
+    def walk(self, url, page_size):
+        ids, counts = [], []
+        params = {'page_size': page_size}
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx))
+            ids.extend(row['id'] for row in response.data['results'])
+            url, params = response.data['next'], {}
+        return ids, counts
+
+    def test_pages_follow_ordering_without_gaps(self):
+        ids, counts = self.walk('/api/v1/administration/expenses/', 2)
+        self.assertEqual(ids, list(Expense.objects.order_by('-date', '-id').values_list('id', flat=True)))
+
+        ids, counts = self.walk('/api/v1/administration/invoices/', 2)
+        self.assertEqual(ids, list(Invoice.objects.order_by('-date_created', '-id').values_list('id', flat=True)))
+        self.assertEqual(len(set(counts)), 1)
+
+        ids, counts = self.walk('/api/v1/administration/leads/', 1)
+        self.assertEqual(ids, list(Lead.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_payment_pages_with_equal_dates(self):
+        expected = list(Payment.objects.order_by('-date', '-id').values_list('id', flat=True))
+        ids, counts = self.walk('/api/v1/administration/payments/', 4)
+        self.assertEqual(ids, expected)
+        self.assertGreater(len(counts), 3)
+
+        response = self.client.get('/api/v1/administration/payments/')
+        self.assertEqual(len(response.data['results']), min(len(expected), 50))
+        self.assertIsNone(response.data['previous'])
+
+
+class InvoiceBalanceTests(SchoolSeedMixin, APITestCase):
+    """Invoice.paid_total и статус поддерживаются платежами и сверяются командой"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+        # У каждого счёта 5000 и платежи 2000 + 1000
+        self.first, self.second = Invoice.objects.order_by('id')
+
+    def assertBalance(self, invoice, paid_total, status):
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.paid_total, invoice.status), (Decimal(paid_total), status))
+
+    def test_moving_payment_recomputes_both_invoices(self):
+        payment = self.first.payments.get(amount=2000)
+        payment.invoice = self.second
+        payment.save()
+        self.assertBalance(self.first, 1000, 'partial')
+        self.assertBalance(self.second, 5000, 'paid')
+
+        payment.invoice = self.first
+        payment.amount = 4000
+        payment.save()
+        self.assertBalance(self.first, 5000, 'paid')
+        self.assertBalance(self.second, 3000, 'partial')
+
+    def test_deleting_payments(self):
+        for payment in self.first.payments.all():
+            payment.delete()
+        self.assertBalance(self.first, 0, 'pending')
+        self.assertBalance(self.second, 3000, 'partial')
+
+    def test_reconcile_command(self):
+        Invoice.objects.filter(id=self.second.id).update(discount=2000)
+        Invoice.objects.update(paid_total=0, status='pending')
+
+        output = io.StringIO()
+        call_command('reconcile_invoice_balances', dry_run=True, stdout=output)
+        self.assertIn('Счетов с расхождением: 2', output.getvalue())
+        self.assertBalance(self.first, 0, 'pending')
+
+        call_command('reconcile_invoice_balances', stdout=io.StringIO())
+        self.assertBalance(self.first, 3000, 'partial')
+        # Скидка учитывается: 5000 - 2000 оплачено полностью
+        self.assertBalance(self.second, 3000, 'paid')
+
+        output = io.StringIO()
+        call_command('reconcile_invoice_balances', dry_run=True, stdout=output)
+        self.assertIn('Счетов с расхождением: 0', output.getvalue())
+
+
+class HomeworkSubmitTests(SchoolSeedMixin, APITestCase):
+    """Студент отправляет работу по уроку и видит её статус в списке ДЗ"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=1)
+        self.student = self.ids['student']
+        self.client.force_authenticate(self.student)
+        self.url = f"/api/v1/student/lesson/{self.ids['open_lesson']}/submit/"
+
+    def statuses(self):
+        response = self.client.get('/api/v1/student/homework/')
+        self.assertEqual(response.status_code, 200)
+        return {row['id']: (row['has_submission'], row['submission_status']) for row in response.data}
+
+    def test_submit_once(self):
+        self.assertEqual(self.statuses()[self.ids['open_lesson']], (False, 'not_submitted'))
+        self.assertEqual(self.statuses()[self.ids['lesson']], (True, 'orange'))
+
+        data = {'project_links': 'https://example.com/p', 'files': 'https://example.com/f'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['student'], response.data['lesson']), (self.student.id, self.ids['open_lesson']))
+        self.assertEqual(self.statuses()[self.ids['open_lesson']], (True, 'submitted'))
+
+        self.assertEqual(self.client.post(self.url, data, format='json').status_code, 400)
+        self.assertEqual(HomeworkSubmission.objects.filter(lesson_id=self.ids['open_lesson']).count(), 1)
+
+
+class CsvExportTests(SchoolSeedMixin, APITestCase):
+    """Потоковые CSV-выгрузки журналов с фильтрами списков"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+        self.client.force_authenticate(self.admin)
+
+    def export(self, route, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/v1/administration/{route}/export/', params or {})
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx), 1)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        return list(csv.reader(io.StringIO(content.lstrip('\ufeff'))))
+
+    def test_invoices_use_stored_balance(self):
+        rows = self.export('invoices')
+        header, rows = rows[0], rows[1:]
+        self.assertEqual(len(rows), Invoice.objects.count())
+
+        invoice = Invoice.objects.get(id=rows[0][0])
+        row = dict(zip(header, rows[0]))
+        self.assertEqual(Decimal(row['Оплачено']), invoice.paid_total)
+        self.assertEqual(Decimal(row['Остаток']), invoice.balance)
+        self.assertEqual(row['Статус'], invoice.get_status_display())
+
+    def test_filters_and_ordering_match_list(self):
+        rows = self.export('payments', {'payment_type': 'online'})[1:]
+        expected = Payment.objects.filter(payment_type='online').order_by('-date', '-id')
+        self.assertEqual([int(row[0]) for row in rows], list(expected.values_list('id', flat=True)))
+        self.assertTrue(all(row[5] == 'Онлайн' for row in rows))
+
+        for route, model in (('incomes', Income), ('expenses', Expense), ('teacher-payments', TeacherPayment)):
+            self.assertEqual(len(self.export(route)) - 1, model.objects.count())
+
+    def test_streams_in_chunks(self):
+        invoice_id = Invoice.objects.order_by('id').first().id
+        Payment.objects.bulk_create([
+            Payment(invoice_id=invoice_id, amount=1, payment_type='cash') for _ in range(1200)
+        ])
+        response = self.client.get('/api/v1/administration/payments/export/')
+        chunks = list(response.streaming_content)
+        self.assertGreaterEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode('utf-8').count('\n'), Payment.objects.count() + 1)
+
+    def test_formulas_are_escaped(self):
+        payment = Payment.objects.get(id=self.ids['payment'])
+        Payment.objects.filter(id=payment.id).update(comment='=HYPERLINK("http://evil","x")')
+        Payment.objects.create(invoice_id=payment.invoice_id, amount=1, payment_type='cash', comment='-2+3')
+        comments = {int(row[0]): row[6] for row in self.export('payments')[1:]}
+        self.assertEqual(comments[payment.id], '\'=HYPERLINK("http://evil","x")')
+        self.assertIn("'-2+3", comments.values())
+
+
+class BackgroundJobTests(SchoolSeedMixin, APITestCase):
+    """Очередь фоновых задач: постановка, идемпотентность, воркер, повторы"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+        BackgroundJob.objects.all().delete()
+        self.client.force_authenticate(self.admin)
+
+    def run_jobs(self):
+        call_command('run_jobs', '--once', stdout=io.StringIO())
+
+    def test_async_report_runs_in_worker(self):
+        reports = FinancialReport.objects.count()
+        response = self.client.post(
+            '/api/v1/administration/generate-report/',
+            {'report_type': 'monthly', 'async': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(FinancialReport.objects.count(), reports)
+        self.assertTrue(response.data['status_url'].endswith(f"/administration/jobs/{response.data['job_id']}/"))
+
+        self.run_jobs()
+        job = self.client.get(f"/api/v1/administration/jobs/{response.data['job_id']}/").data
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['progress'], 100)
+        self.assertEqual(FinancialReport.objects.count(), reports + 1)
+        self.assertEqual(job['result']['id'], FinancialReport.objects.latest('id').id)
+
+    def test_invoice_pdf_runs_in_worker(self):
+        invoice = Invoice.objects.get(id=self.ids['invoice'])
+        response = self.client.post(
+            '/api/v1/administration/invoices/pdf/', {'ids': [invoice.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.data['status_url'].endswith(f"/administration/jobs/{response.data['job_id']}/"))
+        job = BackgroundJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(job.kind, 'pdf_batch')
+        [[name, template, context]] = job.payload['documents']
+        self.assertEqual((name, template), (f'invoice-{invoice.id}.pdf', 'pdf/invoice.html'))
+        self.assertEqual(context['amount'], str(invoice.final_amount))
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media), \
+                mock.patch('app.pdf.render_many', return_value=b'zip') as render_many:
+            self.run_jobs()
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'succeeded')
+            self.assertEqual(job.result['size'], 3)
+            self.assertTrue(os.path.exists(os.path.join(media, job.result['file'])))
+        self.assertEqual(render_many.call_args.args[0], [(name, template, context)])
+
+    def test_invoice_pdf_rejects_unknown_ids(self):
+        response = self.client.post('/api/v1/administration/invoices/pdf/', {'ids': [0]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_idempotency_key_returns_same_job(self):
+        url = '/api/v1/administration/calculate-teacher-payments/'
+        data = {'async': 'true', 'dry_run': True}
+        first = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='payroll-1')
+        second = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='payroll-1')
+        self.assertEqual(first.status_code, 202)
+        self.assertTrue(first.data['created'])
+        self.assertFalse(second.data['created'])
+        self.assertEqual(first.data['job_id'], second.data['job_id'])
+        self.assertEqual(BackgroundJob.objects.count(), 1)
+
+        self.run_jobs()
+        job = BackgroundJob.objects.get()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertTrue(job.result['dry_run'])
+
+    def test_idempotency_key_is_scoped_and_checks_payload(self):
+        url = '/api/v1/administration/calculate-teacher-payments/'
+        data = {'async': 'true', 'dry_run': True, 'year': 2025, 'month': 1}
+        first = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='payroll-1')
+
+        # Тот же ключ с другими параметрами — конфликт, а не чужая задача
+        response = self.client.post(url, {**data, 'month': 2}, format='json', HTTP_IDEMPOTENCY_KEY='payroll-1')
+        self.assertEqual(response.status_code, 422)
+
+        # Другой пользователь с тем же ключом получает свою задачу
+        self.client.force_authenticate(self.manager)
+        other = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='payroll-1')
+        self.assertEqual(other.status_code, 202)
+        self.assertTrue(other.data['created'])
+        self.assertNotEqual(other.data['job_id'], first.data['job_id'])
+        self.assertEqual(self.client.get(f"/api/v1/manager/jobs/{other.data['job_id']}/").status_code, 200)
+
+    def test_async_payroll_validates_period(self):
+        url = '/api/v1/administration/calculate-teacher-payments/'
+        for data in ({'month': 13}, {'year': 2025, 'month': 5, 'end_year': 2025, 'end_month': 1}):
+            with self.subTest(data=data):
+                response = self.client.post(url, {'async': True, **data}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_failed_job_retries_then_fails(self):
+        job, _ = enqueue('financial_report', {'report_type': 'custom'}, user=self.admin, max_attempts=2)
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_after, timezone.now())
+
+        # Повтор ещё не наступил — воркер задачу не берёт
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+
+        BackgroundJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('ValueError', job.error)
+
+        response = self.client.post(f'/api/v1/administration/jobs/{job.id}/retry/')
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(response.data['attempts'], 0)
+
+    def test_claim_is_exclusive(self):
+        job, _ = enqueue('teacher_payments', {'year': 2025, 'month': 1, 'dry_run': True})
+        self.assertEqual(claim_next('worker-1'), job.id)
+        self.assertIsNone(claim_next('worker-2'))
+
+    def test_progress_extends_lock(self):
+        job, _ = enqueue('teacher_payments', {'year': 2025, 'month': 1, 'dry_run': True})
+        claim_next('worker-1')
+        BackgroundJob.objects.filter(id=job.id).update(locked_at=timezone.now() - datetime.timedelta(hours=2))
+        job.refresh_from_db()
+        job.set_progress(50, 'Половина')
+        self.assertEqual(requeue_stale(), 0)
+        self.assertEqual(BackgroundJob.objects.get(id=job.id).status, 'running')
+
+        # Перехваченную задачу старый воркер не продлевает
+        BackgroundJob.objects.filter(id=job.id).update(locked_by='worker-2')
+        self.assertFalse(job.heartbeat())
+
+    def test_stale_requeue_counts_attempts(self):
+        job, _ = enqueue('teacher_payments', {'year': 2025, 'month': 1}, max_attempts=2)
+        for expected in ('queued', 'failed'):
+            claim_next('worker-1')
+            BackgroundJob.objects.filter(id=job.id).update(locked_at=timezone.now() - datetime.timedelta(hours=2))
+            self.assertEqual(requeue_stale(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, expected)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(claim_next('worker-1'))
+
+    def test_lost_lock_does_not_overwrite(self):
+        def handler(job, payload):
+            # Пока обработчик работал, задачу признали брошенной и захватил другой воркер
+            BackgroundJob.objects.filter(id=job.id).update(locked_by='worker-2')
+            return {'done': True}
+
+        job, _ = enqueue('financial_report', {'report_type': 'monthly'})
+        claim_next('worker-1')
+        with mock.patch.dict(HANDLERS, {'financial_report': handler}):
+            result = run_job(job.id)
+        self.assertEqual((result.status, result.locked_by, result.result), ('running', 'worker-2', None))
+
+    def test_manager_sees_only_own_jobs(self):
+        enqueue('teacher_payments', {'year': 2025, 'month': 1}, user=self.admin)
+        own, _ = enqueue('teacher_payments', {'year': 2025, 'month': 2}, user=self.manager)
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/v1/manager/jobs/')
+        self.assertEqual([job['id'] for job in response.data], [own.id])
+
+
+class QueryPlanCheckTests(SchoolSeedMixin, APITestCase):
+    """check_query_plans проходит горячие эндпоинты и находит полные сканы"""
+
+    def setUp(self):
+        self.seed_school(directions=1, groups_per_direction=1, students_per_group=2)
+
+    def test_hot_endpoints_pass(self):
+        out = io.StringIO()
+        call_command('check_query_plans', min_rows=0, stdout=out, stderr=out)
+        self.assertIn('Полных сканов больших таблиц нет', out.getvalue())
+
+    def test_detects_scan_through_alias(self):
+        command = CheckQueryPlansCommand()
+        sql = 'SELECT 1 FROM "administration_payment" U0 WHERE U0."comment" = %s'
+        plan = command.explain(sql, ['x'])
+        self.assertEqual(list(command.full_scans(sql, plan)), ['administration_payment'])
+
+        sql = 'SELECT 1 FROM "administration_payment" WHERE "administration_payment"."id" = %s'
+        self.assertEqual(list(command.full_scans(sql, command.explain(sql, [1]))), [])
+
+
+class GenerateSchoolTests(APITestCase):
+    """generate_school создаёт данные без пересечений расписания, benchmark_endpoints их замеряет"""
+
+    def generate(self, **options):
+        options = {
+            'directions': 2, 'groups': 6, 'students': 12, 'years': 1, 'classrooms': 2, 'leads': 5,
+            'prefix': 'tst', **options,
+        }
+        call_command('generate_school', stdout=io.StringIO(), **options)
+
+    def test_generated_school(self):
+        self.generate()
+
+        self.assertEqual(
+            sorted(Direction.objects.values_list('name', flat=True)), ['tst Направление 0', 'tst Направление 1']
+        )
+        self.assertTrue(all(name.startswith('tst ') for name in Group.objects.values_list('group_name', flat=True)))
+        self.assertTrue(Schedule.objects.exists())
+        for fields in (('classroom', 'date', 'start_time'), ('teacher', 'date', 'start_time')):
+            clashes = Schedule.objects.values(*fields).annotate(total=Count('id')).filter(total__gt=1)
+            self.assertFalse(clashes.exists(), fields)
+        self.assertTrue(SearchEntry.objects.exists())
+
+    def test_not_enough_classrooms(self):
+        with self.assertRaises(CommandError):
+            self.generate(groups=20, classrooms=1)
+
+    def test_benchmark_on_generated_school(self):
+        self.generate()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark_endpoints', iterations=1, warmup=0, output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+
+        self.assertEqual(report['iterations'], 1)
+        self.assertEqual(set(report['endpoints']), set(BENCHMARK_ENDPOINTS))
+        for result in report['endpoints'].values():
+            self.assertGreater(result['queries'], 0)
+
+
+try:
+    import weasyprint  # noqa: F401
+    WEASYPRINT_AVAILABLE = True
+except OSError:
+    # Нет системных pango/cairo
+    WEASYPRINT_AVAILABLE = False
+
+
+PDF_TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {'loaders': [('django.template.loaders.locmem.Loader', {
+        'pdf/invoice.html': '<h1>Счёт №{{ number }}</h1><p>{{ student }}</p>',
+    })]},
+}]
+
+
+@override_settings(TEMPLATES=PDF_TEMPLATES)
+class PdfBatchTests(SimpleTestCase):
+    """render_many с подменённым рендерером: работает и без WeasyPrint"""
+
+    def setUp(self):
+        self.renderer = mock.Mock()
+        self.renderer.render_html.side_effect = lambda html: b'%PDF ' + html.encode()
+        self.renderer.combine_html.side_effect = lambda htmls: b'%PDF ' + '|'.join(htmls).encode()
+        patcher = mock.patch('app.pdf.get_renderer', return_value=self.renderer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def documents(self, count):
+        return [
+            (f'invoice-{i}.pdf', 'pdf/invoice.html', {'number': i, 'student': f'Студент {i}'})
+            for i in range(count)
+        ]
+
+    def assertArchive(self, content, count):
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        self.assertEqual(archive.namelist(), [f'invoice-{i}.pdf' for i in range(count)])
+        for i in range(count):
+            self.assertIn(f'Счёт №{i}'.encode(), archive.read(f'invoice-{i}.pdf'))
+
+    def test_zip_in_process(self):
+        self.assertArchive(render_many(self.documents(3), workers=1), 3)
+        self.assertEqual(self.renderer.render_html.call_count, 3)
+
+    def test_zip_in_pool(self):
+        # Потоки вместо процессов: подменённый рендерер виден воркерам
+        with mock.patch('app.pdf.ProcessPoolExecutor', ThreadPoolExecutor):
+            self.assertArchive(render_many(self.documents(4), workers=2), 4)
+        self.assertEqual(self.renderer.render_html.call_count, 4)
+
+    def test_combined(self):
+        content = render_many(self.documents(3), combine=True)
+        self.renderer.combine_html.assert_called_once()
+        self.renderer.render_html.assert_not_called()
+        self.assertEqual(content.count('Счёт №'.encode()), 3)
+
+    def test_image_cache_is_bounded(self):
+        renderer = PdfRenderer.__new__(PdfRenderer)
+        renderer.image_cache = {f'image-{i}': i for i in range(IMAGE_CACHE_SIZE - 1)}
+        self.assertEqual(len(renderer._image_cache()), IMAGE_CACHE_SIZE - 1)
+        renderer.image_cache['image-last'] = 0
+        self.assertEqual(renderer._image_cache(), {})
+
+
+@unittest.skipUnless(WEASYPRINT_AVAILABLE, "WeasyPrint недоступен в этом окружении")
+@override_settings(TEMPLATES=PDF_TEMPLATES)
+class PdfRenderingTests(SimpleTestCase):
+    """Рендеринг PDF в память и пакетный режим"""
+
+    def documents(self, count):
+        return [
+            (f'invoice-{i}.pdf', 'pdf/invoice.html', {'number': i, 'student': f'Студент {i}'})
+            for i in range(count)
+        ]
+
+    def test_render_to_pdf_returns_buffer(self):
+        from app.utils import render_to_pdf
+
+        result = render_to_pdf('pdf/invoice.html', {'number': 1, 'student': 'Иванов'})
+        self.assertTrue(result.read().startswith(b'%PDF'))
+
+    def test_render_many_zip_and_combined(self):
+        from app.pdf import render_many
+
+        archive = zipfile.ZipFile(io.BytesIO(render_many(self.documents(4), workers=2)))
+        self.assertEqual(sorted(archive.namelist()), [f'invoice-{i}.pdf' for i in range(4)])
+        self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+
+        combined = render_many(self.documents(3), combine=True)
+        self.assertTrue(combined.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type\s*/Page\b', combined)), 3)
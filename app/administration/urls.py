@@ -10,7 +10,8 @@ from app.administration.views import (
     ActiveStudentsAnalytics, MonthlyIncomeAnalytics, TeacherWorkloadAnalytics, PopularCoursesAnalytics,
     StudentProfileView, StudentAttendanceView, StudentPaymentsView, LeadViewSet, AdminDashboardView, 
     HomeworkListView, LessonDetailView, HomeworkSubmissionView, MyHomeworkSubmissionsView, TeacherHomeworkListView,
-    HomeworkReviewView, StudentGradesView, PaymentNotificationViewSet
+    HomeworkReviewView, StudentGradesView, PaymentNotificationViewSet, TableFiltersView, GlobalSearchView,
+    BackgroundJobViewSet
     )
 
 router = DefaultRouter()
@@ -38,9 +39,12 @@ router.register(r'teacher-payments', TeacherPaymentViewSet, basename='teacher-pa
 router.register(r'classrooms', ClassroomViewSet, basename='classroom')
 router.register(r'schedule', ScheduleViewSet, basename='schedule')
 router.register(r'leads', LeadViewSet, basename='lead')
+router.register(r'jobs', BackgroundJobViewSet, basename='background-job')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('table-filters/', TableFiltersView.as_view(), name='table-filters'),
+    path('search/', GlobalSearchView.as_view(), name='global-search'),
     path('groups/<int:id>/dashboard/', GroupDashboardView.as_view(), name='group-dashboard'),
     path('generate-report/', GenerateFinancialReport.as_view(), name='generate-report'),
     # path('send-reminders/', SendPaymentReminders.as_view(), name='send-reminders'),
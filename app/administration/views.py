@@ -1,29 +1,48 @@
 import calendar
 from django.http import Http404
-from rest_framework import viewsets, generics, status, permissions
+from rest_framework import viewsets, generics, status, permissions, serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db.models import Sum, Count
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models.functions import Concat
+from django.utils.dateparse import parse_date
+from django.db.models.functions import Coalesce, Concat
 from rest_framework.decorators import action
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 import datetime
-from django.db.models import Count, Sum, Avg, Q
+from django.db.models import Count, Sum, Avg, Exists, Q, OuterRef, Prefetch, Subquery
 from app.administration.models import (
     Direction, Group, Teacher, Student, Lesson, Attendance, Payment, Months, Income, Expense, 
     TeacherPayment, Invoice, FinancialReport, Schedule, Classroom, Lead, HomeworkSubmission,
-    PaymentNotification
+    PaymentNotification, SearchEntry, BackgroundJob, Course
     )
 from app.administration.serializers import (
-    DirectionSerializer, GroupSerializer, GroupCreateSerializer, TeacherCreateSerializer, TeacherSerializer, StudentCreateSerializer, StudentSerializer, LessonSerializer, AttendanceSerializer, 
+    DirectionSerializer, GroupSerializer, GroupCreateSerializer, TeacherCreateSerializer, TeacherSerializer, StudentCreateSerializer, StudentSerializer, LessonSerializer, AttendanceSerializer, AttendanceBulkSerializer, 
     PaymentSerializer, GroupDashboardSerializer, MonthsSerializer, GroupTableSerializer, StudentTableSerializer, TeacherTableSerializer, TeacherPaymentSerializer, ExpenseSerializer, IncomeSerializer, FinancialReportSerializer, InvoiceSerializer,
-    ScheduleSerializer, ClassroomSerializer, DailyScheduleSerializer, ScheduleListSerializer, ActiveStudentsSerializer, PopularCoursesSerializer,
+    ScheduleSerializer, ClassroomSerializer, DailyScheduleSerializer, ScheduleRangeSerializer, ScheduleBulkSerializer, ScheduleListSerializer, ActiveStudentsSerializer, PopularCoursesSerializer,
     TeacherWorkloadSerializer, MonthlyIncomeSerializer, StudentProfileSerializer, StudentAttendanceSerializer, PaymentHistorySerializer, LeadSerializer, LeadStatusUpdateSerializer, DashboardStatsSerializer,
-    LessonSerializer, LessonDetailSerializer, HomeworkListSerializer, HomeworkSubmissionSerializer, PaymentNotificationSerializer
+    LessonSerializer, LessonDetailSerializer, HomeworkListSerializer, HomeworkSubmissionSerializer, PaymentNotificationSerializer,
+    BackgroundJobSerializer, InvoicePdfSerializer
     )
+from app.administration.attendance_summaries import ATTENDED_STATUSES, refresh_summaries
+from app.administration.payroll import calculate_teacher_payments, month_range
+from app.administration.rollups import create_report, day_bounds, freeze_report, local_date, report_period
+from app.administration.caching import (
+    ANALYTICS_CACHE_TIMEOUT, DASHBOARD_CACHE_TIMEOUT, analytics_version, dashboard_cache_key, facets_version,
+    invalidate_dashboard, popular_courses_cache_key
+)
+from app.administration.exports import CsvExportMixin
+from app.administration.facets import facets_requested, get_facets
+from app.administration.jobs import IdempotencyConflict, enqueue
+from app.administration.search import is_indexed_query, matching_ids, search as search_index
+from app.administration.pagination import HistoryPagination, LedgerCursorPagination
+from app.administration.scheduling import (
+    SLOT_CHOICES, plan_recurring_schedule, recurring_dates, schedules_by_group_day
+)
 from app.users.models import CustomUser
 from app.users.permissions import (
     IsAdminOrManager, IsAdmin, IsTeacher, IsStudent, IsAdminOrTeacher, IsAdminOrReadOnlyForOthers, IsAdminOrReadOnlyForManagersAndTeachers, 
@@ -33,7 +52,7 @@ from app.users.permissions import (
 
 class GroupViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
-    queryset = Group.objects.all().select_related('direction')
+    queryset = Group.objects.all().select_related('direction', 'teacher').prefetch_related('students')
     
 
     
@@ -251,14 +270,53 @@ class LessonViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrTeacherFullAccessOthersReadOnly]
 
 class AttendanceViewSet(viewsets.ModelViewSet):
-    queryset = Attendance.objects.all()
+    # Номера курса и месяца в ответе берутся из урока
+    queryset = Attendance.objects.select_related('lesson__month__course')
     serializer_class = AttendanceSerializer
     permission_classes = [IsTeacher]
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Отметка посещаемости всей группы за урок одним upsert"""
+        serializer = AttendanceBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lesson = serializer.validated_data['lesson']
+        statuses = serializer.validated_data['statuses']
+
+        with transaction.atomic():
+            Attendance.objects.bulk_create(
+                [
+                    Attendance(lesson=lesson, student_id=student_id, status=value)
+                    for student_id, value in statuses.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['lesson', 'student'],
+                update_fields=['status'],
+            )
+            refresh_summaries((student_id, lesson.month.course.group_id) for student_id in statuses)
+        # bulk_create не вызывает сигналы
+        invalidate_dashboard()
+
+        marked = dict(Attendance.objects.filter(lesson=lesson).values_list('student_id', 'status'))
+        return Response({
+            'lesson': lesson.id,
+            'course_number': lesson.month.course.course_number,
+            'month_number': lesson.month.month_number,
+            'updated': len(statuses),
+            'students': [
+                {
+                    'student_id': student['id'],
+                    'full_name': f"{student['first_name']} {student['last_name']}".strip(),
+                    'status': marked.get(student['id']),
+                }
+                for student in serializer.validated_data['roster']
+            ],
+        })
+
 
 
 class MonthsViewSet(viewsets.ModelViewSet):
-    queryset = Months.objects.all()
+    queryset = Months.objects.prefetch_related('lessons')
     serializer_class = MonthsSerializer
     permission_classes = [IsAdmin]
 
@@ -272,7 +330,7 @@ class GroupDashboardView(generics.RetrieveAPIView):
         'courses',
         'courses__months',
         'courses__months__lessons',
-        'courses__months__lessons__attendances',
+        'attendance_summaries',
     )
     serializer_class = GroupDashboardSerializer
     lookup_field = 'id'
@@ -292,12 +350,13 @@ class GroupDashboardView(generics.RetrieveAPIView):
                 {
                     'id': course.id,
                     'course_number': course.course_number,
+                    # months уже упорядочены по month_number (Meta.ordering) и предзагружены
                     'months': MonthsSerializer(
-                        course.months.all().order_by('month_number'),
+                        course.months.all(),
                         many=True
                     ).data
                 }
-                for course in instance.courses.all().order_by('course_number')
+                for course in sorted(instance.courses.all(), key=lambda c: c.course_number)
             ],
             'students': serializer.data['students'],
             'tabs': {
@@ -320,16 +379,32 @@ class GroupDashboardView(generics.RetrieveAPIView):
 # views.py
 class GroupTableViewSet(viewsets.ReadOnlyModelViewSet):
     """Viewset for displaying group table with month of study"""
-    queryset = Group.objects.all().select_related('direction')
     serializer_class = GroupTableSerializer
     filterset_fields = ['direction__name', 'group_name']
     permission_classes = [IsAdmin]
 
+    def get_queryset(self):
+        # Текущий курс и последний урок считаются подзапросами, а не запросами на каждую группу
+        courses = Course.objects.filter(group=OuterRef('pk'))
+        return Group.objects.select_related('direction').annotate(
+            first_course=Subquery(courses.order_by('course_number').values('course_number')[:1]),
+            last_dated_course=Subquery(
+                courses.filter(months__lessons__date__isnull=False)
+                .order_by('-course_number').values('course_number')[:1]
+            ),
+            last_lesson_order=Subquery(
+                Lesson.objects.filter(month__course__group=OuterRef('pk'))
+                .order_by('-date', '-order').values('order')[:1]
+            ),
+        )
+
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
         
         search_query = request.query_params.get('search')
-        if search_query:
+        if search_query and is_indexed_query(search_query):
+            queryset = queryset.filter(id__in=matching_ids('group', search_query))
+        elif search_query:
             queryset = queryset.filter(
                 Q(group_name__icontains=search_query) |
                 Q(direction__name__icontains=search_query))
@@ -344,14 +419,14 @@ class GroupTableViewSet(viewsets.ReadOnlyModelViewSet):
             
         serializer = self.get_serializer(queryset, many=True)
         
-        directions = Direction.objects.values_list('name', flat=True).distinct()
-        
         response_data = {
-            'directions': list(directions),
             'groups': serializer.data,
             'selected_direction': direction,
             'search_query': search_query
         }
+        # Фильтры берутся из кэша; клиент с table-filters/ может отключить их через ?facets=0
+        if facets_requested(request):
+            response_data['directions'] = get_facets()[0]['directions']
         
         return Response(response_data)
     
@@ -365,13 +440,19 @@ class StudentTableViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = StudentTableSerializer
 
     def get_queryset(self):
-        return Student.objects.select_related('user').prefetch_related('groups', 'directions')
+        # Направление и преподаватель каждой группы приходят вместе с группами
+        return Student.objects.select_related('user').prefetch_related(
+            Prefetch('groups', queryset=Group.objects.select_related('direction', 'teacher')),
+            'user__attendance_summaries',
+        )
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
         search_query = request.query_params.get('search')
-        if search_query:
+        if search_query and is_indexed_query(search_query):
+            queryset = queryset.filter(user_id__in=matching_ids('student', search_query))
+        elif search_query:
             queryset = queryset.filter(
                 Q(user__first_name__icontains=search_query) |
                 Q(user__last_name__icontains=search_query)
@@ -398,25 +479,8 @@ class StudentTableViewSet(viewsets.ReadOnlyModelViewSet):
 
         serializer = self.get_serializer(queryset, many=True)
 
-        directions = Direction.objects.values_list('name', flat=True).distinct()
-        groups = Group.objects.values_list('group_name', flat=True).distinct()
-
-        teachers = CustomUser.objects.filter(
-            role='Teacher'
-        ).exclude(
-            Q(last_name__isnull=True) | Q(last_name='') |
-            Q(first_name__isnull=True) | Q(first_name='')
-        ).values_list('last_name', 'first_name').distinct()
-
-        teacher_names = [f"{last} {first}" for last, first in teachers]
-
         response_data = {
             'students': serializer.data,
-            'filters': {
-                'directions': list(directions),
-                'groups': list(groups),
-                'teachers': teacher_names,
-            },
             'selected_filters': {
                 'search': search_query,
                 'direction': direction,
@@ -424,6 +488,8 @@ class StudentTableViewSet(viewsets.ReadOnlyModelViewSet):
                 'teacher': teacher
             }
         }
+        if facets_requested(request):
+            response_data['filters'] = get_facets()[0]
 
         return Response(response_data)
 
@@ -431,14 +497,77 @@ class StudentTableViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 
+class TableFiltersView(APIView):
+    """
+    Фильтры таблиц учеников, преподавателей и групп с поддержкой ETag.
+
+    ETag — версия кэша фильтров; при совпадении If-None-Match отдаётся 304
+    без обращения к базе.
+    """
+    permission_classes = [IsAdminOrReadOnlyForManagersAndTeachers]
+
+    def get(self, request):
+        etag = f'"facets-{facets_version()}"'
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            facets, version = get_facets()
+            etag = f'"facets-{version}"'
+            response = Response(facets)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class GlobalSearchView(APIView):
+    """Ранжированный поиск по ученикам, преподавателям, группам и заявкам"""
+    permission_classes = [IsAdminOrManager]
+    max_limit = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Параметр q обязателен'}, status=status.HTTP_400_BAD_REQUEST)
+
+        kinds = [kind for kind in request.query_params.get('kinds', '').split(',') if kind]
+        allowed = {kind for kind, _ in SearchEntry.KINDS}
+        if set(kinds) - allowed:
+            return Response(
+                {'error': f'Допустимые типы: {", ".join(sorted(allowed))}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.max_limit)
+        except ValueError:
+            return Response({'error': 'limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit должен быть больше нуля'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'query': query, 'results': search_index(query, kinds or None, limit)})
+
+
 # views.py
 class TeacherTableViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAdmin]
     serializer_class = TeacherTableSerializer
     
     def get_queryset(self):
-        # Получаем только пользователей с ролью Teacher
-        return CustomUser.objects.filter(role='Teacher')
+        # Получаем только пользователей с ролью Teacher; группы, направления
+        # и число учеников загружаются сразу, чтобы сериализатор не ходил в базу
+        student_count = Group.students.through.objects.filter(
+            group__teachers=OuterRef('teacher_add')
+        ).order_by().values('group__teachers').annotate(
+            total=Count('customuser', distinct=True)
+        ).values('total')
+
+        return CustomUser.objects.filter(role='Teacher').select_related(
+            'teacher_add'
+        ).prefetch_related(
+            'teacher_add__groups', 'teacher_add__directions'
+        ).annotate(
+            student_count=Coalesce(Subquery(student_count), 0)
+        )
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
@@ -447,11 +576,13 @@ class TeacherTableViewSet(viewsets.ReadOnlyModelViewSet):
         direction = request.query_params.get('direction')
         if direction:
             queryset = queryset.filter(
-                teacher_add__directions__name__icontains=direction)
+                teacher_add__directions__name__icontains=direction).distinct()
             
         # Поиск по имени
         search_query = request.query_params.get('search')
-        if search_query:
+        if search_query and is_indexed_query(search_query):
+            queryset = queryset.filter(id__in=matching_ids('teacher', search_query))
+        elif search_query:
             queryset = queryset.filter(
                 Q(first_name__icontains=search_query) |
                 Q(last_name__icontains=search_query))
@@ -463,20 +594,16 @@ class TeacherTableViewSet(viewsets.ReadOnlyModelViewSet):
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(queryset, many=True)
-        
-        # Получаем доступные направления для фильтра
-        directions = Direction.objects.values_list('name', flat=True).distinct()
 
         response_data = {
             'teachers': serializer.data,
-            'filters': {
-                'directions': list(directions),
-            },
             'selected_filters': {
                 'direction': direction,
                 'search': search_query
             }
         }
+        if facets_requested(request):
+            response_data['filters'] = {'directions': get_facets()[0]['directions']}
         
         return Response(response_data)
     
@@ -487,11 +614,14 @@ class TeacherTableViewSet(viewsets.ReadOnlyModelViewSet):
 
 # Добавляем к существующим представлениям
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(CsvExportMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdminOrManager]
     queryset = Invoice.objects.all().select_related('student', 'course')
     serializer_class = InvoiceSerializer
     filterset_fields = ['student', 'course', 'status', 'due_date']
+    pagination_class = LedgerCursorPagination
+    cursor_ordering = ('-date_created', '-id')
+    export_name = 'invoices'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -526,11 +656,46 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             
         return queryset.order_by('-date_created')
 
-class PaymentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def pdf(self, request):
+        """PDF счетов рендерит воркер run_jobs: ответ 202 с id задачи pdf_batch"""
+        serializer = InvoicePdfSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data['ids'])
+        invoices = list(
+            Invoice.objects.filter(id__in=ids).select_related('student', 'course__group').order_by('id')
+        )
+        missing = ids - {invoice.id for invoice in invoices}
+        if missing:
+            return Response(
+                {'ids': f"Счета не найдены: {', '.join(map(str, sorted(missing)))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Контекст шаблона хранится в payload задачи, поэтому только JSON-типы
+        documents = [
+            [f'invoice-{invoice.id}.pdf', 'pdf/invoice.html', {
+                'number': invoice.id,
+                'student': invoice.student.get_full_name(),
+                'course': str(invoice.course),
+                'amount': str(invoice.final_amount),
+                'due_date': invoice.due_date.isoformat(),
+                'status': invoice.get_status_display(),
+            }]
+            for invoice in invoices
+        ]
+        return enqueue_response(request, 'pdf_batch', {
+            'documents': documents, 'combine': serializer.validated_data['combine'],
+        }, up='../../')
+
+class PaymentViewSet(CsvExportMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdminOrManager]
-    queryset = Payment.objects.all().select_related('invoice')
+    queryset = Payment.objects.all().select_related('invoice__student')
     serializer_class = PaymentSerializer
     filterset_fields = ['payment_type', 'date', 'invoice']
+    pagination_class = LedgerCursorPagination
+    cursor_ordering = ('-date', '-id')
+    export_name = 'payments'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -570,66 +735,101 @@ class PaymentViewSet(viewsets.ModelViewSet):
             
 #         return queryset.order_by('reminder_date')
 
-class IncomeViewSet(viewsets.ModelViewSet):
+class IncomeViewSet(CsvExportMixin, viewsets.ModelViewSet):
     queryset = Income.objects.all().select_related('direction', 'student', 'group')
     serializer_class = IncomeSerializer
     filterset_fields = ['direction', 'payment_method', 'date', 'is_full_payment']
     permission_classes = [IsAdminOrManager]
+    pagination_class = LedgerCursorPagination
+    cursor_ordering = ('-date', '-id')
+    export_name = 'incomes'
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(CsvExportMixin, viewsets.ModelViewSet):
     queryset = Expense.objects.all().select_related('teacher')
     serializer_class = ExpenseSerializer
     filterset_fields = ['category', 'date']
     permission_classes = [IsAdminOrManager]
+    pagination_class = LedgerCursorPagination
+    cursor_ordering = ('-date', '-id')
+    export_name = 'expenses'
 
-class TeacherPaymentViewSet(viewsets.ModelViewSet):
+class TeacherPaymentViewSet(CsvExportMixin, viewsets.ModelViewSet):
     queryset = TeacherPayment.objects.all().select_related('teacher')
     serializer_class = TeacherPaymentSerializer
     filterset_fields = ['teacher', 'date', 'is_paid']
     permission_classes = [IsAdminOrManager]
+    export_name = 'teacher-payments'
 
 class FinancialReportViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = FinancialReport.objects.all()
     serializer_class = FinancialReportSerializer
-    filterset_fields = ['report_type', 'start_date', 'end_date']
+    filterset_fields = ['report_type', 'start_date', 'end_date', 'is_live']
     permission_classes = [IsAdminOrManager]
 
+    @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
+    def freeze(self, request, pk=None):
+        """Фиксирует показатели отчёта (повторный вызов обновляет snapshot)"""
+        report = freeze_report(self.get_object())
+        return Response(self.get_serializer(report).data)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
+    def unfreeze(self, request, pk=None):
+        """Возвращает отчёт в живой режим"""
+        report = self.get_object()
+        report.is_live = True
+        report.snapshot = None
+        report.frozen_at = None
+        report.save(update_fields=['is_live', 'snapshot', 'frozen_at'])
+        return Response(self.get_serializer(report).data)
+
 # views.py
+def wants_async(request):
+    return str(request.data.get('async', '')).lower() in ('1', 'true', 'yes')
+
+
+def enqueue_response(request, kind, payload, up='../'):
+    """
+    Ставит задачу в очередь и сразу отвечает 202 с id задачи.
+    up — путь от URL запроса к корню urls-модуля ('../../' для invoices/pdf/)
+    """
+    key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+    try:
+        job, created = enqueue(kind, payload, user=request.user, idempotency_key=key)
+    except IdempotencyConflict as e:
+        return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response({
+        'job_id': job.id,
+        'status': job.status,
+        'created': created,
+        # jobs/ зарегистрирован рядом с эндпоинтом, поставившим задачу
+        'status_url': request.build_absolute_uri(f'{up}jobs/{job.id}/'),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
 class GenerateFinancialReport(APIView):
     permission_classes = [IsAdmin]
     def post(self, request, format=None):
         try:
             report_type = request.data.get('report_type', 'monthly')
-            today = timezone.now().date()
-            
-            # Логика определения дат остается прежней
-            if report_type == 'daily':
-                start_date = end_date = today
-            elif report_type == 'weekly':
-                start_date = today - timedelta(days=today.weekday())
-                end_date = start_date + timedelta(days=6)
-            elif report_type == 'monthly':
-                start_date = today.replace(day=1)
-                end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            elif report_type == 'yearly':
-                start_date = today.replace(month=1, day=1)
-                end_date = today.replace(month=12, day=31)
-            elif report_type == 'custom':
-                start_date = request.data.get('start_date')
-                end_date = request.data.get('end_date')
-                if not start_date or not end_date:
-                    return Response(
-                        {'error': 'Для custom отчета нужны start_date и end_date'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-            # Создаем отчет без финансовых показателей (они будут рассчитываться динамически)
-            report = FinancialReport.objects.create(
-                report_type=report_type,
-                start_date=start_date,
-                end_date=end_date
-            )
-            
+            start_date = request.data.get('start_date')
+            end_date = request.data.get('end_date')
+            # По умолчанию отчёт живой: показатели считаются при каждом чтении.
+            # freeze=true фиксирует их в snapshot на момент генерации.
+            freeze = str(request.data.get('freeze', '')).lower() in ('1', 'true', 'yes')
+
+            try:
+                report_period(report_type, timezone.localdate(), start_date, end_date)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            # async=true: отчёт собирает воркер run_jobs, клиент опрашивает jobs/<id>/
+            if wants_async(request):
+                return enqueue_response(request, 'financial_report', {
+                    'report_type': report_type, 'start_date': start_date,
+                    'end_date': end_date, 'freeze': freeze,
+                })
+
+            report = create_report(report_type, start_date, end_date, freeze=freeze)
             serializer = FinancialReportSerializer(report)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
@@ -670,80 +870,54 @@ class GenerateFinancialReport(APIView):
 class CalculateTeacherPayments(APIView):
     permission_classes = [IsAdminOrManager]
     def post(self, request, format=None):
-        from datetime import datetime
-        import calendar
-        from django.utils import timezone
-        
-        month = request.data.get('month', timezone.now().month)
-        year = request.data.get('year', timezone.now().year)
-        
-        start_date = timezone.make_aware(datetime(year, month, 1))
-        end_date = timezone.make_aware(datetime(year, month, calendar.monthrange(year, month)[1]))
-        
-        teachers = CustomUser.objects.filter(role='Teacher', is_active=True)
-        results = []
-        
-        for teacher in teachers:
-            try:
-                # Получаем профиль преподавателя
-                teacher_profile = Teacher.objects.get(user=teacher)
-                
-                # Получаем группы, где преподаватель является teacher
-                groups = Group.objects.filter(teacher=teacher)
-                
-                total_lessons = 0
-                total_payment = 0
-                
-                for group in groups:
-                    lessons_count = Lesson.objects.filter(
-                        month__course__group=group,
-                        date__range=[start_date, end_date]
-                    ).count()
-                    
-                    if teacher_profile.payment_type == 'fixed':
-                        if teacher_profile.payment_period == 'month':
-                            payment = teacher_profile.payment_amount
-                        else:  # per_lesson
-                            payment = teacher_profile.payment_amount * lessons_count
-                    else:  # hourly
-                        payment = teacher_profile.payment_amount * lessons_count * group.lesson_duration
-                    
-                    total_lessons += lessons_count
-                    total_payment += payment
-                
-                # Создаем или обновляем запись о выплате
-                payment, created = TeacherPayment.objects.update_or_create(
-                    teacher=teacher,
-                    date=end_date,
-                    defaults={
-                        'lessons_count': total_lessons,
-                        'rate': teacher_profile.payment_amount,
-                        'payment': total_payment,
-                        'bonus': 0,
-                        'is_paid': False
-                    }
-                )
-                
-                results.append({
-                    'teacher_id': teacher.id,
-                    'teacher_name': teacher.get_full_name(),
-                    'lessons_count': total_lessons,
-                    'payment': total_payment,
-                    'status': 'created' if created else 'updated'
-                })
-                
-            except Teacher.DoesNotExist:
-                results.append({
-                    'teacher_id': teacher.id,
-                    'error': 'Teacher profile not found'
-                })
-                continue
-        
+        now = timezone.now()
+
+        try:
+            month = int(request.data.get('month', now.month))
+            year = int(request.data.get('year', now.year))
+            end_month = request.data.get('end_month')
+            end_year = request.data.get('end_year')
+            end_month = int(end_month) if end_month else None
+            end_year = int(end_year) if end_year else None
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'month, year, end_month и end_year должны быть числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        # Период проверяется до постановки в очередь: ошибка ввода — 400, а не упавшая задача
+        try:
+            month_range(year, month, end_year, end_month)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if wants_async(request):
+            return enqueue_response(request, 'teacher_payments', {
+                'year': year, 'month': month, 'end_year': end_year,
+                'end_month': end_month, 'dry_run': dry_run,
+            })
+
+        try:
+            reports = calculate_teacher_payments(
+                year, month, end_year=end_year, end_month=end_month, dry_run=dry_run
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Для одного месяца сохраняем прежний формат ответа
+        if len(reports) == 1:
+            return Response({
+                'status': 'success',
+                'dry_run': dry_run,
+                **reports[0]
+            }, status=status.HTTP_200_OK)
+
         return Response({
             'status': 'success',
-            'period': f"{start_date.date()} - {end_date.date()}",
-            'teachers_processed': len(results),
-            'results': results
+            'dry_run': dry_run,
+            'periods': reports
         }, status=status.HTTP_200_OK)
     
 
@@ -774,89 +948,152 @@ class ScheduleViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(date=date)
             
         return queryset.order_by('classroom', 'start_time')
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Создание повторяющихся занятий группы с проверкой конфликтов за один запрос"""
+        serializer = ScheduleBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        dates = recurring_dates(data['start_date'], data['end_date'], data['weekdays'])
+        planned, conflicts = plan_recurring_schedule(
+            data['group'], data['classroom'], data['teacher'], dates,
+            data['start_time'], data['end_time'], data['note']
+        )
+
+        if not data['dry_run'] and planned:
+            planned = Schedule.objects.bulk_create(planned)
+
+        if data['dry_run']:
+            response_status = status.HTTP_200_OK
+        elif planned:
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_409_CONFLICT
+
+        return Response({
+            'dry_run': data['dry_run'],
+            'created': 0 if data['dry_run'] else len(planned),
+            'schedule': ScheduleSerializer(planned, many=True).data,
+            'conflicts': conflicts,
+        }, status=response_status)
     
 
 class DailyScheduleView(APIView):
     permission_classes = [IsAdmin]
+    max_range_days = 31
+
     def get(self, request, format=None):
-        date_str = request.query_params.get('date')
-        
-        if not date_str:
-            date = timezone.now().date()
-        else:
-            try:
-                date = datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
-            except ValueError:
+        try:
+            slot = int(request.query_params.get('slot', 60))
+        except ValueError:
+            slot = None
+        if slot not in SLOT_CHOICES:
+            return Response(
+                {'error': f'Недопустимый шаг сетки. Допустимые значения: {", ".join(map(str, SLOT_CHOICES))}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            date = self.parse_date(request.query_params.get('date'))
+            start_date = self.parse_date(request.query_params.get('start_date'))
+            end_date = self.parse_date(request.query_params.get('end_date'))
+        except ValueError:
+            return Response(
+                {'error': 'Неверный формат даты. Используйте YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Режим диапазона: сетка по всем кабинетам на несколько дней
+        if start_date or end_date:
+            start_date = start_date or end_date
+            end_date = end_date or start_date
+            if end_date < start_date:
                 return Response(
-                    {'error': 'Неверный формат даты. Используйте YYYY-MM-DD'},
+                    {'error': 'end_date не может быть раньше start_date'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-        
-        serializer = DailyScheduleSerializer({'date': date})
+            if (end_date - start_date).days >= self.max_range_days:
+                return Response(
+                    {'error': f'Диапазон не может превышать {self.max_range_days} дней'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = ScheduleRangeSerializer({'start_date': start_date, 'end_date': end_date, 'slot': slot})
+            return Response(serializer.data)
+
+        serializer = DailyScheduleSerializer({'date': date or timezone.localdate(), 'slot': slot})
         return Response(serializer.data)
+
+    @staticmethod
+    def parse_date(value):
+        if not value:
+            return None
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
     
 
 
 class ActiveStudentsAnalytics(APIView):
+    """
+    Активность учеников. Все окна — полуоткрытые диапазоны по Lesson.date
+    (индекс), без приведения datetime к дате в SQL.
+
+    Ушедшие: были на занятиях на прошлой неделе (7 дней до текущей) и ни разу
+    на текущей — один запрос с NOT EXISTS вместо списка id в IN.
+    """
     permission_classes = [IsAdmin]
+
     def get(self, request):
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
-        
+        today = timezone.localdate()
+        today_start, today_end = day_bounds(today, today)
+        week_start = today_start - timedelta(days=6)
+        last_week_start = week_start - timedelta(days=7)
+        attended = Attendance.objects.filter(status__in=ATTENDED_STATUSES)
+
         # 1. Активные сегодня
-        active_today = Attendance.objects.filter(
-            lesson__date__date=today,
-            status__in=['1', 'online']
+        active_today = attended.filter(
+            lesson__date__gte=today_start, lesson__date__lt=today_end
         ).values('student').distinct().count()
-        
+
         # 2. Ушедшие на этой неделе
-        active_last_week = Attendance.objects.filter(
-            lesson__date__date__range=[week_ago, today - timedelta(days=1)],
-            status__in=['1', 'online']
-        ).values_list('student_id', flat=True).distinct()
-        
-        left_this_week = 0
-        if active_last_week:
-            still_active = Attendance.objects.filter(
-                lesson__date__date__range=[today - timedelta(days=6), today],
-                status__in=['1', 'online'],
-                student_id__in=active_last_week
-            ).distinct().count()
-            
-            left_this_week = len(active_last_week) - still_active
-        
-        # 3. Новые ученики (используем date_joined или created_at)
-        date_field = 'date_joined' if hasattr(CustomUser, 'date_joined') else 'created_at'
+        attended_this_week = attended.filter(
+            student=OuterRef('student'),
+            lesson__date__gte=week_start, lesson__date__lt=today_end
+        )
+        left_this_week = attended.filter(
+            lesson__date__gte=last_week_start, lesson__date__lt=week_start
+        ).filter(~Exists(attended_this_week)).values('student').distinct().count()
+
+        # 3. Новые ученики
         new_this_week = CustomUser.objects.filter(
-            role='Student',
-            **{f'{date_field}__gte': week_ago}
+            role='Student', date_joined__gte=week_start
         ).count()
-        
+
         # 4. Средний возраст
         avg_age = CustomUser.objects.filter(
             role='Student',
             is_active=True
         ).aggregate(avg_age=Avg('age'))['avg_age'] or 0
-        
+
         # 5. Распределение по направлениям
         directions = Direction.objects.annotate(
             student_count=Count('groups__students', distinct=True)
         ).filter(student_count__gt=0)
-        
+
         total_students = sum(d.student_count for d in directions)
         directions_distribution = {
             d.name: round(d.student_count / total_students * 100, 1)
             for d in directions
         } if total_students > 0 else {}
-        
+
         return Response({
             'active_today': active_today,
             'left_this_week': left_this_week,
             'new_this_week': new_this_week,
-            'avg_age': avg_age,
+            'avg_age': round(avg_age, 1),
             'directions_distribution': directions_distribution
         })
-    
+
 
 class MonthlyIncomeAnalytics(APIView):
     permission_classes = [IsAdmin]
@@ -897,99 +1134,157 @@ class MonthlyIncomeAnalytics(APIView):
         return Response(result)
 
 class TeacherWorkloadAnalytics(APIView):
+    """
+    Нагрузка преподавателей за период: три сгруппированных по преподавателю
+    запроса (занятия, ученики, доход), склеенные в Python. Число запросов не
+    зависит от числа преподавателей.
+
+    period: week (по умолчанию) | month | custom; для custom нужны start_date и end_date.
+    """
     permission_classes = [IsAdmin]
+
     def get(self, request):
         try:
-            period = request.query_params.get('period', 'week')
-            
-            if period == 'week':
-                start_date = timezone.now().date() - timedelta(days=7)
-                end_date = timezone.now().date()
-            else:  # month
-                start_date = timezone.now().date().replace(day=1)
-                end_date = timezone.now().date()
-
-            # Получаем всех активных преподавателей
-            teachers = CustomUser.objects.filter(
-                role='Teacher',
-                is_active=True
-            )
-
-            result = []
-            
-            for teacher in teachers:
-                # 1. Количество занятий через расписание
-                lessons_count = Schedule.objects.filter(
-                    teacher=teacher,
-                    date__range=[start_date, end_date]
-                ).count()
-
-                # 2. Группы преподавателя
-                teacher_groups = Group.objects.filter(teacher=teacher)
-                
-                # 3. Количество учеников в группах преподавателя
-                students_count = CustomUser.objects.filter(
-                    student_groups__in=teacher_groups
-                ).distinct().count()
-
-                # 4. Доход по платежам студентов этих групп
-                group_income = Payment.objects.filter(
-                    invoice__course__group__in=teacher_groups,
-                    date__range=[start_date, end_date]
-                ).aggregate(total=Sum('amount'))['total'] or 0
-
-                if lessons_count > 0:  # Добавляем только преподавателей с занятиями
-                    result.append({
-                        'teacher': teacher.get_full_name(),
-                        'lessons_count': lessons_count,
-                        'students_count': students_count,
-                        'group_income': float(group_income)
-                    })
-
-            # Сортируем по количеству занятий (по убыванию)
-            result.sort(key=lambda x: x['lessons_count'], reverse=True)
+            start_date, end_date = self.get_period(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 1. Занятия по расписанию; в отчёт попадают только преподаватели с занятиями
+        lessons = Schedule.objects.filter(
+            date__range=[start_date, end_date],
+            teacher__role='Teacher',
+            teacher__is_active=True,
+        ).values('teacher_id', 'teacher__first_name', 'teacher__last_name').annotate(
+            lessons_count=Count('id')
+        )
+        lessons = {row['teacher_id']: row for row in lessons}
+        if not lessons:
+            return Response([])
+
+        # 2. Уникальные ученики групп преподавателя — через промежуточную таблицу Group.students
+        students = dict(Group.students.through.objects.filter(
+            group__teacher_id__in=lessons
+        ).values('group__teacher_id').annotate(
+            count=Count('customuser_id', distinct=True)
+        ).values_list('group__teacher_id', 'count'))
+
+        # 3. Доход по платежам студентов этих групп
+        lower, upper = day_bounds(start_date, end_date)
+        income = dict(Payment.objects.filter(
+            invoice__course__group__teacher_id__in=lessons,
+            date__gte=lower, date__lt=upper,
+        ).values('invoice__course__group__teacher_id').annotate(
+            total=Sum('amount')
+        ).values_list('invoice__course__group__teacher_id', 'total'))
+
+        result = [
+            {
+                'teacher': f"{row['teacher__first_name']} {row['teacher__last_name']}".strip(),
+                'lessons_count': row['lessons_count'],
+                'students_count': students.get(teacher_id, 0),
+                'group_income': float(income.get(teacher_id) or 0),
+            }
+            for teacher_id, row in lessons.items()
+        ]
+        # Сортируем по количеству занятий (по убыванию)
+        result.sort(key=lambda x: x['lessons_count'], reverse=True)
+        return Response(result)
 
-            return Response(result)
+    @staticmethod
+    def get_period(params):
+        today = timezone.localdate()
+        period = params.get('period', 'week')
+        if period == 'week':
+            return today - timedelta(days=7), today
+        if period == 'month':
+            return today.replace(day=1), today
+        if period != 'custom':
+            raise ValueError('period должен быть week, month или custom')
 
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=500
-            )
+        try:
+            start_date = datetime.datetime.strptime(params.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.datetime.strptime(params.get('end_date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Для custom укажите start_date и end_date в формате YYYY-MM-DD')
+        if end_date < start_date:
+            raise ValueError('end_date не может быть раньше start_date')
+        return start_date, end_date
 
 class PopularCoursesAnalytics(APIView):
+    """
+    Рейтинг направлений по числу учеников с доходом за период.
+
+    Доход считается одним запросом, сгруппированным по направлению, и
+    кэшируется по версии, которую сигналы поднимают при записи платежей.
+    Параметры: start_date/end_date (YYYY-MM-DD) — период дохода, top — размер рейтинга.
+    """
     permission_classes = [IsAdmin]
+
     def get(self, request):
+        params = request.query_params
         try:
-            # Получаем направления с подсчетом студентов и групп
-            directions = Direction.objects.annotate(
-                num_students=Count('groups__students', distinct=True),
-                num_groups=Count('groups', distinct=True)
-            ).filter(num_students__gt=0).order_by('-num_students')
-            
-            result = []
-            for rank, direction in enumerate(directions, start=1):
-                # Для каждого направления отдельно считаем доход
-                income = Payment.objects.filter(
-                    invoice__course__group__direction=direction
-                ).aggregate(total=Sum('amount'))['total'] or 0
-                
-                result.append({
-                    'rank': rank,
-                    'course': direction.name,
-                    'students_count': direction.num_students,
-                    'groups_count': direction.num_groups,
-                    'income': float(income)
-                })
-            
-            return Response(result)
-            
-        except Exception as e:
+            start_date = self.parse_date(params.get('start_date'))
+            end_date = self.parse_date(params.get('end_date'))
+            top = int(params['top']) if params.get('top') else None
+        except ValueError:
             return Response(
-                {'error': str(e)},
-                status=500
+                {'error': 'Неверные параметры: даты в формате YYYY-MM-DD, top — целое число'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        
+        if top is not None and top < 1:
+            return Response({'error': 'top должен быть больше нуля'}, status=status.HTTP_400_BAD_REQUEST)
+        if start_date and end_date and end_date < start_date:
+            return Response(
+                {'error': 'end_date не может быть раньше start_date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = popular_courses_cache_key(analytics_version(), start_date, end_date, top)
+        result = cache.get(cache_key)
+        if result is None:
+            result = self.build(start_date, end_date, top)
+            cache.set(cache_key, result, ANALYTICS_CACHE_TIMEOUT)
+        return Response(result)
+
+    @staticmethod
+    def build(start_date, end_date, top):
+        # Направления с подсчетом студентов и групп
+        directions = Direction.objects.annotate(
+            num_students=Count('groups__students', distinct=True),
+            num_groups=Count('groups', distinct=True)
+        ).filter(num_students__gt=0).order_by('-num_students', 'id')
+        if top:
+            directions = directions[:top]
+        directions = list(directions)
+
+        # Доход всех направлений рейтинга одним сгруппированным запросом
+        payments = Payment.objects.filter(
+            invoice__course__group__direction__in=[direction.id for direction in directions]
+        )
+        if start_date:
+            payments = payments.filter(date__gte=day_bounds(start_date, start_date)[0])
+        if end_date:
+            payments = payments.filter(date__lt=day_bounds(end_date, end_date)[1])
+        income = dict(payments.values('invoice__course__group__direction').annotate(
+            total=Sum('amount')
+        ).values_list('invoice__course__group__direction', 'total'))
+
+        return [
+            {
+                'rank': rank,
+                'course': direction.name,
+                'students_count': direction.num_students,
+                'groups_count': direction.num_groups,
+                'income': float(income.get(direction.id) or 0)
+            }
+            for rank, direction in enumerate(directions, start=1)
+        ]
+
+    @staticmethod
+    def parse_date(value):
+        if not value:
+            return None
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
 
 
 
@@ -1005,56 +1300,69 @@ class StudentProfileView(generics.RetrieveUpdateAPIView):
 
 class StudentAttendanceView(APIView):
     permission_classes = [IsAdminOrReadOnlyForManagersAndTeachers]
+    pagination_class = HistoryPagination
+
     def get(self, request, student_id):
+        # Получаем все посещения студента с предзагрузкой связанных данных
+        attendances = Attendance.objects.filter(
+            student_id=student_id
+        ).select_related(
+            'lesson__month__course__group__direction',
+            'lesson__month__course__group__teacher'
+        ).order_by('-lesson__date', '-id')
+
+        # Вне try: несуществующая страница — это NotFound (404) от DRF, а не 500
+        paginator = None
+        if self.pagination_class.requested(request):
+            paginator = self.pagination_class()
+            attendances = paginator.paginate_queryset(attendances, request, view=self)
+
         try:
-            # Получаем все посещения студента с предзагрузкой связанных данных
-            attendances = Attendance.objects.filter(
-                student_id=student_id
-            ).select_related(
-                'lesson__month__course__group__direction',
-                'lesson__month__course__group__teacher'
-            ).order_by('-lesson__date')
-            
-            if not attendances.exists():
+            if paginator is None:
+                attendances = list(attendances)
+
+            if not attendances and paginator is None:
                 return Response([])
-            
+
+            # Расписание групп за даты уроков страницы — одним запросом.
+            # Lesson.date — DateTimeField, Schedule.date — DateField, поэтому сравниваем локальные даты
+            schedules = schedules_by_group_day(
+                (att.lesson.month.course.group_id, local_date(att.lesson.date))
+                for att in attendances
+            )
+
             result = []
             for att in attendances:
-                if not att.lesson:
-                    continue
-                
+                group = att.lesson.month.course.group
+
                 # Основные данные
                 attendance_data = {
                     'id': att.id,
                     'status': att.status,
                     'status_display': att.get_status_display(),
-                    'group': att.lesson.month.course.group.group_name,
-                    'subject': att.lesson.month.course.group.direction.name
+                    'group': group.group_name,
+                    'subject': group.direction.name
                 }
-                
+
                 # 1. Пытаемся получить дату из расписания
-                schedule = Schedule.objects.filter(
-                    group=att.lesson.month.course.group,
-                    date=att.lesson.date
-                ).first()
-                
+                schedule = schedules.get((group.id, local_date(att.lesson.date)))
+
                 if schedule:
                     attendance_data['date'] = schedule.date.strftime('%d.%m.%Y')
                     attendance_data['teacher'] = schedule.get_teacher_name()
                 else:
                     # 2. Если нет расписания, берем дату из урока
-                    attendance_data['date'] = att.lesson.date.strftime('%d.%m.%Y') if att.lesson.date else None
-                    
+                    attendance_data['date'] = local_date(att.lesson.date).strftime('%d.%m.%Y') if att.lesson.date else None
+
                     # 3. Преподавателя берем из группы
-                    if att.lesson.month.course.group.teacher:
-                        attendance_data['teacher'] = att.lesson.month.course.group.teacher.get_full_name()
-                    else:
-                        attendance_data['teacher'] = None
-                
+                    attendance_data['teacher'] = group.teacher.get_full_name() if group.teacher else None
+
                 result.append(attendance_data)
-            
+
+            if paginator is not None:
+                return paginator.get_paginated_response(result)
             return Response(result)
-            
+
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -1085,24 +1393,27 @@ class LeadViewSet(viewsets.ModelViewSet):
     serializer_class = LeadSerializer
     permission_classes = [IsAdminOrManager]
     filterset_fields = ['status', 'source']
+    pagination_class = LedgerCursorPagination
+    cursor_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         queryset = super().get_queryset()
         
         # Фильтр по дате
-        date_from = self.request.query_params.get('date_from')
-        date_to = self.request.query_params.get('date_to')
-        
-        if date_from and date_to:
-            queryset = queryset.filter(created_at__date__range=[date_from, date_to])
-        elif date_from:
-            queryset = queryset.filter(created_at__date__gte=date_from)
-        elif date_to:
-            queryset = queryset.filter(created_at__date__lte=date_to)
+        # Границы дней, а не created_at__date: так работает индекс по created_at
+        date_from = parse_date(self.request.query_params.get('date_from') or '')
+        date_to = parse_date(self.request.query_params.get('date_to') or '')
+
+        if date_from:
+            queryset = queryset.filter(created_at__gte=day_bounds(date_from, date_from)[0])
+        if date_to:
+            queryset = queryset.filter(created_at__lt=day_bounds(date_to, date_to)[1])
             
         # Поиск по имени, телефону или курсу
         search = self.request.query_params.get('search')
-        if search:
+        if search and is_indexed_query(search):
+            queryset = queryset.filter(id__in=matching_ids('lead', search))
+        elif search:
             queryset = queryset.filter(
                 Q(name__icontains=search) |
                 Q(phone__icontains=search) |
@@ -1138,81 +1449,70 @@ class AdminDashboardView(APIView):
     
     def get(self, request):
         now = timezone.now()
-        today = now.date()
-        
-        # 1. Новые ученики
-        new_students_data = {
-            'new_students_24h': CustomUser.objects.filter(
-                role='Student',
-                date_joined__gte=now - timedelta(hours=24))
-                .count(),
-            'new_students_week': CustomUser.objects.filter(
-                role='Student',
-                date_joined__gte=today - timedelta(days=7))
-                .count(),
-            'new_students_month': CustomUser.objects.filter(
-                role='Student',
-                date_joined__gte=today - timedelta(days=30))
-                .count(),
-            'new_students_year': CustomUser.objects.filter(
-                role='Student',
-                date_joined__gte=today - timedelta(days=365))
-                .count(),
-        }
+        today = timezone.localdate(now)
+
+        cache_key = dashboard_cache_key(today)
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.build_stats(now, today)
+            cache.set(cache_key, data, DASHBOARD_CACHE_TIMEOUT)
+        return Response(data)
+
+    def build_stats(self, now, today):
+        # Границы дня вместо date__date: приведение колонки к дате отключает индексы
+        today_start, today_end = day_bounds(today, today)
+
+        # 1. Новые ученики и всего активных учеников — один запрос
+        students = CustomUser.objects.filter(role='Student').aggregate(
+            new_students_24h=Count('id', filter=Q(date_joined__gte=now - timedelta(hours=24))),
+            new_students_week=Count('id', filter=Q(date_joined__gte=today_start - timedelta(days=7))),
+            new_students_month=Count('id', filter=Q(date_joined__gte=today_start - timedelta(days=30))),
+            new_students_year=Count('id', filter=Q(date_joined__gte=today_start - timedelta(days=365))),
+            total_students=Count('id', filter=Q(is_active=True)),
+        )
         
         # 2. Последние лиды
         recent_invoices = Invoice.objects.order_by('-date_created')[:2].values(
             'student__first_name', 'student__last_name', 'date_created', 'course__group__group_name', 'status', 'comment'
         )
         
-        # 3. Оплаты
-        payments_today = Payment.objects.filter(
-            date__date=today
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        payments_by_method = Payment.objects.filter(
-            date__date=today
-        ).values('payment_type').annotate(
-            total=Sum('amount')
-        )
-        
-        payments_data = {
-            'payments_today': {'amount': payments_today},
-            'payments_by_method': {
-                method['payment_type']: method['total'] 
-                for method in payments_by_method
-            }
+        # 3. Оплаты: общая сумма считается из разбивки по способам оплаты
+        payments_by_method = {
+            method['payment_type']: method['total']
+            for method in Payment.objects.filter(
+                date__gte=today_start, date__lt=today_end
+            ).values('payment_type').annotate(
+                total=Sum('amount')
+            ).order_by()
         }
+        payments_today = sum(payments_by_method.values()) or 0
         
         # 4. Предстоящие занятия
         upcoming_classes = Schedule.objects.filter(
             date=today,
-            start_time__gte=now.time()
-        ).order_by('start_time').select_related(
-            'group', 'teacher'
-        )[:3].values(
+            # Расписание хранит местное время
+            start_time__gte=timezone.localtime(now).time()
+        ).order_by('start_time').values(
             'group__direction__name',
             'group__group_name',
             'teacher__first_name',
             'teacher__last_name',
             'start_time'
-        )
+        )[:3]
         
-        # 5. Посещаемость (обновленная логика)
-        attendances_today = Attendance.objects.filter(
-            lesson__date__date=today
+        # 5. Посещаемость: все статусы одним запросом
+        attendance_stats = Attendance.objects.filter(
+            lesson__date__gte=today_start, lesson__date__lt=today_end
+        ).aggregate(
+            present=Count('id', filter=Q(status='1')),
+            online=Count('id', filter=Q(status='online')),
+            absent=Count('id', filter=Q(status='0')),
         )
         
         total_lessons = Lesson.objects.filter(
-            date__date=today
+            date__gte=today_start, date__lt=today_end
         ).count()
         
-        attendance_stats = {
-            'present': attendances_today.filter(status='1').count(),
-            'online': attendances_today.filter(status='online').count(),
-            'absent': attendances_today.filter(status='0').count(),
-        }
-        
         total_attendances = sum(attendance_stats.values())
         
         attendance_data = {
@@ -1223,35 +1523,39 @@ class AdminDashboardView(APIView):
             'online_percent': round(attendance_stats['online'] / total_attendances * 100) if total_attendances else 0,
             'absent': attendance_stats['absent'],
             'absent_percent': round(attendance_stats['absent'] / total_attendances * 100) if total_attendances else 0,
-            'total_students': CustomUser.objects.filter(role='Student', is_active=True).count()
+            'total_students': students['total_students']
         }
         
         data = {
-            'new_students_24h': new_students_data['new_students_24h'],
-            'new_students_week': new_students_data['new_students_week'],
-            'new_students_month': new_students_data['new_students_month'],
-            'new_students_year': new_students_data['new_students_year'],
+            'new_students_24h': students['new_students_24h'],
+            'new_students_week': students['new_students_week'],
+            'new_students_month': students['new_students_month'],
+            'new_students_year': students['new_students_year'],
             'recent_invoices': recent_invoices,
-            'payments_today': payments_data['payments_today'],
-            'payments_by_method': payments_data['payments_by_method'],
+            'payments_today': {'amount': payments_today},
+            'payments_by_method': payments_by_method,
             'upcoming_classes': upcoming_classes,
             'attendance_stats': attendance_data
         }
         
-        serializer = DashboardStatsSerializer(data)
-        return Response(serializer.data)
+        return dict(DashboardStatsSerializer(data).data)
     
 
 
 
-
 class HomeworkListView(generics.ListAPIView):
     serializer_class = HomeworkListSerializer
     permission_classes = [IsTeacherFullAccessStudentReadOnly]
     
     def get_queryset(self):
-        # Получаем уроки, где есть домашние задания
-        return Lesson.objects.exclude(homework_description='').order_by('-date')
+        # Получаем уроки, где есть домашние задания, вместе с работами текущего пользователя
+        return Lesson.objects.exclude(homework_description='').prefetch_related(
+            Prefetch(
+                'homework_submissions',
+                queryset=HomeworkSubmission.objects.filter(student=self.request.user),
+                to_attr='user_submissions'
+            )
+        ).order_by('-date')
 
 class LessonDetailView(generics.RetrieveAPIView):
     queryset = Lesson.objects.all()
@@ -1265,6 +1569,8 @@ class HomeworkSubmissionView(generics.CreateAPIView):
     def perform_create(self, serializer):
         lesson_id = self.kwargs.get('lesson_id')
         lesson = generics.get_object_or_404(Lesson, pk=lesson_id)
+        if HomeworkSubmission.objects.filter(lesson=lesson, student=self.request.user).exists():
+            raise serializers.ValidationError({'lesson': "Работа по этому уроку уже отправлена"})
         serializer.save(student=self.request.user, lesson=lesson)
     
     def create(self, request, *args, **kwargs):
@@ -1281,10 +1587,14 @@ class HomeworkSubmissionView(generics.CreateAPIView):
 class MyHomeworkSubmissionsView(generics.ListAPIView):
     serializer_class = HomeworkSubmissionSerializer
     permission_classes = [IsTeacherFullAccessStudentReadOnly]
+    pagination_class = LedgerCursorPagination
+    cursor_ordering = ('-submitted_at', '-id')
     
     def get_queryset(self):
         return HomeworkSubmission.objects.filter(
             student=self.request.user
+        ).select_related(
+            'student', 'lesson__month__course__group'
         ).order_by('-submitted_at')
     
 
@@ -1294,6 +1604,8 @@ class MyHomeworkSubmissionsView(generics.ListAPIView):
 class TeacherHomeworkListView(generics.ListAPIView):
     serializer_class = HomeworkSubmissionSerializer
     permission_classes = [IsTeacherFullAccessStudentReadOnly]
+    pagination_class = LedgerCursorPagination
+    cursor_ordering = ('-submitted_at', '-id')
     
     def get_queryset(self):
         # Получаем группы, где текущий пользователь является преподавателем
@@ -1413,4 +1725,33 @@ class StudentGradesView(APIView):
 class PaymentNotificationViewSet(viewsets.ModelViewSet):
     queryset = PaymentNotification.objects.all()
     serializer_class = PaymentNotificationSerializer
-    permission_classes = [IsAdminOrReadOnlyForManagersAndTeachers]
\ No newline at end of file
+    permission_classes = [IsAdminOrReadOnlyForManagersAndTeachers]
+
+
+class BackgroundJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Статус и прогресс фоновых задач; менеджер видит только свои"""
+    serializer_class = BackgroundJobSerializer
+    permission_classes = [IsAdminOrManager]
+    filterset_fields = ['kind', 'status']
+
+    def get_queryset(self):
+        queryset = BackgroundJob.objects.all()
+        if self.request.user.role != 'Administrator':
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """Повторный запуск задачи, исчерпавшей попытки"""
+        job = self.get_object()
+        if job.status != 'failed':
+            return Response(
+                {'error': 'Повторить можно только задачу со статусом failed'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        job.status = 'queued'
+        job.attempts = 0
+        job.run_after = timezone.now()
+        job.finished_at = None
+        job.save(update_fields=['status', 'attempts', 'run_after', 'finished_at'])
+        return Response(self.get_serializer(job).data)
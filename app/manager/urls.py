@@ -7,7 +7,8 @@ from app.administration.views import (
     InvoiceViewSet, FinancialReportViewSet, 
     ClassroomViewSet, ScheduleViewSet, DailyScheduleView,
     ActiveStudentsAnalytics, TeacherWorkloadAnalytics, PopularCoursesAnalytics,
-    StudentProfileView, StudentAttendanceView, StudentPaymentsView, LeadViewSet, AdminDashboardView
+    StudentProfileView, StudentAttendanceView, StudentPaymentsView, LeadViewSet, AdminDashboardView, TableFiltersView, GlobalSearchView,
+    BackgroundJobViewSet
     )
 
 router = DefaultRouter()
@@ -26,9 +27,12 @@ router.register(r'teacher-payments', TeacherPaymentViewSet, basename='teacher-pa
 router.register(r'classrooms', ClassroomViewSet, basename='classroom')
 router.register(r'schedule', ScheduleViewSet, basename='schedule')
 router.register(r'leads', LeadViewSet, basename='lead')
+router.register(r'jobs', BackgroundJobViewSet, basename='background-job')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('table-filters/', TableFiltersView.as_view(), name='table-filters'),
+    path('search/', GlobalSearchView.as_view(), name='global-search'),
     path('groups/<int:id>/dashboard/', GroupDashboardView.as_view(), name='group-dashboard'),
     path('daily-schedule/', DailyScheduleView.as_view(), name='daily-schedule'),
     path('active-students/', ActiveStudentsAnalytics.as_view(), name='active-students'),
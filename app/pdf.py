@@ -0,0 +1,123 @@
+"""
+Рендеринг PDF через WeasyPrint.
+
+PdfRenderer держит разобранные таблицы стилей и FontConfiguration между
+вызовами и пишет PDF в память, без временных файлов. render_many рендерит
+пачку документов (счета, квитанции, страницы отчётов) в пуле процессов и
+собирает ZIP или один общий PDF.
+
+weasyprint импортируется лениво: ему нужны системные pango/cairo, а остальное
+приложение должно запускаться и без них.
+"""
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+
+# Картинок в кэше рендерера процесса: повторяющиеся (логотип, печать) остаются
+# тёплыми, а уникальные для документа (QR-коды, фото) не копятся бесконечно
+IMAGE_CACHE_SIZE = 64
+
+
+class PdfRenderer:
+    """Рендерер с "тёплыми" стилями и шрифтами; один экземпляр на процесс"""
+
+    def __init__(self, stylesheets=(), base_url=None):
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.base_url = str(base_url or settings.BASE_DIR)
+        self.font_config = FontConfiguration()
+        # Картинки (логотип, печать) кэшируются WeasyPrint между документами
+        self.image_cache = {}
+        self.stylesheets = [
+            CSS(filename=os.path.join(self.base_url, path), font_config=self.font_config)
+            for path in stylesheets
+        ]
+
+    def _image_cache(self):
+        if len(self.image_cache) >= IMAGE_CACHE_SIZE:
+            self.image_cache.clear()
+        return self.image_cache
+
+    def _html(self, html_string):
+        from weasyprint import HTML
+        return HTML(string=html_string, base_url=self.base_url)
+
+    def render_html(self, html_string):
+        """PDF из готовой HTML-строки в виде bytes"""
+        return self._html(html_string).write_pdf(
+            stylesheets=self.stylesheets, font_config=self.font_config, cache=self._image_cache()
+        )
+
+    def render(self, template_src, context):
+        return self.render_html(render_to_string(template_src, context))
+
+    def combine_html(self, html_strings):
+        """Один PDF из нескольких документов: страницы идут подряд"""
+        documents = [
+            self._html(html_string).render(
+                stylesheets=self.stylesheets, font_config=self.font_config, cache=self._image_cache()
+            )
+            for html_string in html_strings
+        ]
+        if not documents:
+            return b''
+        pages = [page for document in documents for page in document.pages]
+        return documents[0].copy(pages).write_pdf()
+
+
+_renderer = None
+
+
+def get_renderer():
+    """Общий рендерер процесса со стилями из settings.PDF_STYLESHEETS"""
+    global _renderer
+    if _renderer is None:
+        _renderer = PdfRenderer(getattr(settings, 'PDF_STYLESHEETS', ()))
+    return _renderer
+
+
+def _init_worker():
+    # Каждый процесс пула один раз разбирает стили и шрифты
+    get_renderer()
+
+
+def _render_in_worker(html_string):
+    return get_renderer().render_html(html_string)
+
+
+def render_many(documents, combine=False, workers=None):
+    """
+    Рендерит пачку документов.
+
+    documents — список (имя файла, шаблон, контекст). Шаблоны рендерятся в
+    текущем процессе (им может понадобиться база), а вёрстка HTML в PDF —
+    самая дорогая часть — идёт в пуле процессов. Возвращает bytes ZIP-архива
+    с отдельными PDF или, при combine=True, один PDF со всеми страницами.
+
+    Общий PDF собирается из Document'ов WeasyPrint, которые нельзя передать
+    между процессами, поэтому combine рендерит в текущем процессе.
+    """
+    names = [name for name, _, _ in documents]
+    html_strings = [render_to_string(template_src, context) for _, template_src, context in documents]
+
+    if combine:
+        return get_renderer().combine_html(html_strings)
+
+    workers = workers or getattr(settings, 'PDF_WORKERS', None) or os.cpu_count() or 1
+    if workers == 1 or len(html_strings) < 2:
+        pdfs = [get_renderer().render_html(html_string) for html_string in html_strings]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pdfs = list(pool.map(_render_in_worker, html_strings, chunksize=8))
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, pdf in zip(names, pdfs):
+            archive.writestr(name, pdf)
+    return buffer.getvalue()
@@ -1,3 +1,8 @@
-from django.test import TestCase
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from app.administration.tests import EndpointBudgetMixin, SchoolSeedMixin
+
+
+class StudentEndpointBudgetTests(SchoolSeedMixin, EndpointBudgetMixin, APITestCase):
+    urlconf = 'app.student.urls'
+    url_prefix = '/api/v1/student/'
@@ -1,3 +1,10 @@
-from django.test import TestCase
+from django.test import override_settings
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from app.administration.tests import QUERY_COUNT_CACHES, EndpointBudgetMixin, SchoolSeedMixin
+
+
+@override_settings(CACHES=QUERY_COUNT_CACHES)
+class TeacherEndpointBudgetTests(SchoolSeedMixin, EndpointBudgetMixin, APITestCase):
+    urlconf = 'app.teacher.urls'
+    url_prefix = '/api/v1/teacher/'
@@ -9,7 +9,7 @@ from app.administration.views import (
     CalculateTeacherPayments, ClassroomViewSet, ScheduleViewSet, DailyScheduleView,
     ActiveStudentsAnalytics, MonthlyIncomeAnalytics, TeacherWorkloadAnalytics, PopularCoursesAnalytics,
     StudentProfileView, StudentAttendanceView, StudentPaymentsView, LeadViewSet, AdminDashboardView,
-    MyHomeworkSubmissionsView, TeacherHomeworkListView, HomeworkReviewView
+    MyHomeworkSubmissionsView, TeacherHomeworkListView, HomeworkReviewView, TableFiltersView
     )
 
 router = DefaultRouter()
@@ -24,6 +24,7 @@ router.register(r'schedule', ScheduleViewSet, basename='schedule')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('table-filters/', TableFiltersView.as_view(), name='table-filters'),
     path('groups/<int:id>/dashboard/', GroupDashboardView.as_view(), name='group-dashboard'),
     path('daily-schedule/', DailyScheduleView.as_view(), name='daily-schedule'),
     path('students/<int:student_id>/profile/', StudentProfileView.as_view(), name='student-profile'),
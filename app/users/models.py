@@ -34,7 +34,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     role = models.CharField(max_length=20, choices=ROLE, default="Student", verbose_name="Роль")
     is_active = models.BooleanField(default=True, verbose_name="Активен")
     is_staff = models.BooleanField(default=False, verbose_name="Сотрудник")
-    age = models.CharField(max_length=3, verbose_name="Возраст")
+    age = models.PositiveSmallIntegerField(verbose_name="Возраст")
     date_joined = models.DateTimeField(default=timezone.now, verbose_name="Дата регистрации")
     profile_picture = models.ImageField(
         upload_to='profile_pictures/',
@@ -52,6 +52,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        # Выборки по роли: новые ученики за период, списки преподавателей
+        indexes = [models.Index(fields=['role', 'date_joined'], name='user_role_joined_idx')]
 
     def __str__(self):
         return f"{self.last_name} {self.first_name} ({self.role})"
@@ -1,23 +1,19 @@
 import calendar
-from django.template.loader import render_to_string
-from weasyprint import HTML
+import io
 from django.conf import settings
 from datetime import datetime, timedelta
 from django.utils import timezone
-import tempfile
 import datetime
 from django.db.models import Sum, Count
 
 from app.administration.models import Lesson, TeacherPayment, Teacher, Invoice, Payment
+from app.pdf import get_renderer
 from app.users.models import CustomUser
 
+
 def render_to_pdf(template_src, context_dict):
-    html_string = render_to_string(template_src, context_dict)
-    html = HTML(string=html_string, base_url=settings.BASE_DIR)
-    result = tempfile.NamedTemporaryFile(delete=True, suffix=".pdf")
-    html.write_pdf(target=result.name)
-    result.seek(0)
-    return result
+    # Стили и шрифты разбираются один раз на процесс, PDF пишется в память
+    return io.BytesIO(get_renderer().render(template_src, context_dict))
 
 
 # # Добавляем в models.py или создаем utils.py